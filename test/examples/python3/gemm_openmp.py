@@ -13,7 +13,7 @@ def dgemm(a: st.ndarray[2, np.double, (100, 100)],
     c = np.zeros((y_max, x_max), np.double)
     # : st.ndarray[2, np.double, (100, 100)]
 
-    #pragma omp for
+    #pragma omp parallel for
     for y in range(y_max):  # type: np.int32
         for i in range(i_max):  # type: np.int32
             for x in range(x_max):  # type: np.int32
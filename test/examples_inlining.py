@@ -78,5 +78,17 @@ def inline_oneliner_inlined(value1=0, value2=0):
     return 'at least one of the values is nonzero'
 
 
+def swapped_difference(x=0, y=0):
+    return difference(y, x)
+
+
+def difference(x=0, y=0):
+    return x - y
+
+
+def swapped_difference_inlined(x=0, y=0):
+    return (y - x)
+
+
 # '''def do_work_3d(array):\n    do_work(array, 1)\n    do_work(array, 2)\n''':
 # '''def do_work(array, dim):\n    if dim == 1:\n        array[:, 4] = 2\n    if dim == 2:\n'''
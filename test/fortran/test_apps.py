@@ -3,16 +3,20 @@
 import logging
 import os
 import pathlib
+import tracemalloc
 import unittest
 import xml.etree.ElementTree as ET
 
+from encrypted_config.json_io import json_to_file
+import horast
 import static_typing as st
 import typed_ast.ast3 as typed_ast3
 import typed_astunparse
+import timing
 
 from transpyle.general import Language, CodeReader, Parser, AstGeneralizer, Unparser, CodeWriter
 from transpyle.python.transformations import inline_syntax
-from transpyle.pair import replace_scope
+from transpyle.pair import replace_scope, compact, dotted_name
 
 from test.common import \
     RESULTS_ROOT, APPS_RESULTS_ROOT, basic_check_fortran_code, basic_check_fortran_ast, \
@@ -20,6 +24,8 @@ from test.common import \
 
 _LOG = logging.getLogger(__name__)
 
+_TIME = timing.get_timing_group(__name__)
+
 _HERE = pathlib.Path(__file__).resolve().parent
 
 _ROOT = _HERE.parent.parent
@@ -174,6 +180,69 @@ class Tests(unittest.TestCase):
         self._test_app('FLASH-SUBSET-hydro', _prepare_roundtrip(self, Language.find('Fortran')),
                        _roundtrip_fortran)
 
+    @unittest.skipUnless(os.environ.get('TEST_FLASH'), 'skipping test on FLASH code')
+    def test_memory_flash_subset(self):
+        app_name = 'FLASH-SUBSET'
+        if app_name not in _APPS_ROOT_PATHS and app_name in _APPS_OPTIONAL:
+            self.skipTest('{} directory not found'.format(app_name))
+        language = Language.find('Fortran')
+        parser = Parser.find(language)()
+        ast_generalizer = AstGeneralizer.find(language)()
+        fortran_asts = [parser.parse('', path) for path in _APPS_CODE_FILEPATHS[app_name]]
+
+        results = {}
+        for variant, retain in (('typed_ast', lambda tree: tree), ('compact', compact)):
+            tracemalloc.start()
+            try:
+                retained = [retain(ast_generalizer.generalize(fortran_ast))
+                            for fortran_ast in fortran_asts]
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            self.assertEqual(len(retained), len(fortran_asts))
+            del retained
+            results[variant] = {'current': current, 'peak': peak}
+            _LOG.warning('%s: %s memory current=%i peak=%i', app_name, variant, current, peak)
+        for measure in ('current', 'peak'):
+            with self.subTest(measure=measure):
+                self.assertLess(results['compact'][measure], results['typed_ast'][measure])
+
+        results_path = pathlib.Path(RESULTS_ROOT, 'performance')
+        results_path.mkdir(parents=True, exist_ok=True)
+        json_to_file(results, results_path.joinpath('{}_memory.json'.format(app_name.lower())))
+
+    @unittest.skipUnless(os.environ.get('TEST_FLASH'), 'skipping test on FLASH code')
+    def test_unparse_timing_flash_subset_hydro(self):
+        app_name = 'FLASH-SUBSET-hydro'
+        if app_name not in _APPS_ROOT_PATHS and app_name in _APPS_OPTIONAL:
+            self.skipTest('{} directory not found'.format(app_name))
+        parser, ast_generalizer, unparser = _prepare_roundtrip(self, Language.find('Fortran'))
+        trees = [ast_generalizer.generalize(parser.parse('', path))
+                 for path in _APPS_CODE_FILEPATHS[app_name]]
+        names = [node.func if isinstance(node, typed_ast3.Call) else node.value
+                 for tree in trees for node in typed_ast3.walk(tree)
+                 if isinstance(node, (typed_ast3.Call, typed_ast3.Subscript))]
+
+        for _ in _TIME.measure_many('names.unparsed', 10):
+            unparsed_names = [horast.unparse(name).strip() for name in names]
+        for _ in _TIME.measure_many('names.resolved', 10):
+            resolved_names = [dotted_name(name) for name in names]
+        for _ in _TIME.measure_many('unparse', 10):
+            for tree in trees:
+                unparser.unparse(tree)
+        for unparsed_name, resolved_name in zip(unparsed_names, resolved_names):
+            if resolved_name is not None:
+                self.assertEqual(unparsed_name, resolved_name)
+
+        summary = timing.query_cache('.'.join([__name__, 'names'])).summary
+        _LOG.warning('%s: name resolution %s, unparsing %s', app_name, summary,
+                     timing.query_cache(__name__).summary)
+        self.assertLess(summary['resolved']['median'], summary['unparsed']['median'])
+        results_path = pathlib.Path(RESULTS_ROOT, 'performance')
+        results_path.mkdir(parents=True, exist_ok=True)
+        json_to_file(summary, results_path.joinpath(
+            '{}_name_resolution.json'.format(app_name.lower())))
+
     @unittest.skipUnless(os.environ.get('TEST_FLASH'), 'skipping test on FLASH code')
     def test_inline_flash_subset_hydro(self):
         app_name = 'FLASH-SUBSET'
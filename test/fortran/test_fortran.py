@@ -6,12 +6,16 @@ import datetime
 import pathlib
 import types
 import unittest
+import xml.etree.ElementTree as ET
 
+import horast
+import static_typing as st
+import typed_ast.ast3 as typed_ast3
 # import typed_astunparse
 
 from transpyle.fortran.parser import FortranParser
 from transpyle.fortran.ast_generalizer import FortranAstGeneralizer
-from transpyle.fortran.unparser import Fortran77Unparser
+from transpyle.fortran.unparser import Fortran77Unparser, Fortran2008Unparser
 from transpyle.fortran.compiler import F2PyCompiler
 from transpyle.fortran.binder import F2PyBinder
 
@@ -21,6 +25,22 @@ from test.common import \
 
 # _LOG = logging.getLogger(__name__)
 
+INTRINSICS_SUBROUTINE = '''<subroutine name="f"><header/><body><specification>
+<declaration type="variable">
+<type name="real" type="intrinsic" hasLength="false" hasKind="false"/>
+<variables count="2"><variable name="x"/><variable name="a"><dimensions count="1">
+<dimension type="simple"><literal type="int" value="10"/></dimension>
+</dimensions></variable></variables>
+</declaration></specification>{}</body></subroutine>'''
+
+
+def _name_xml(name: str, *subscripts: str) -> str:
+    if not subscripts:
+        return '<name id="{}"/>'.format(name)
+    return '<name id="{}" type="variable"><subscripts count="{}">{}</subscripts></name>'.format(
+        name, len(subscripts),
+        ''.join('<subscript type="simple">{}</subscript>'.format(_) for _ in subscripts))
+
 
 class Tests(unittest.TestCase):
 
@@ -39,6 +59,42 @@ class Tests(unittest.TestCase):
                 tree = generalizer.generalize(parser.parse('', input_path))
                 basic_check_python_ast(self, input_path, tree)
 
+    def test_generalize_intrinsics(self):
+        element = _name_xml('a', '<literal type="int" value="1"/>')
+        for call, expected in [
+                (_name_xml('sqrt', _name_xml('x')), 'math.sqrt(x)'),
+                (_name_xml('SIN', element), 'math.sin(a[1])'),
+                (_name_xml('max', _name_xml('x'), element), 'max(x, a[1])'),
+                (_name_xml('sqrt', _name_xml('a')), 'np.sqrt(a)'),
+                (_name_xml('exp', _name_xml('y')), 'np.exp(y)'),
+                (_name_xml('min', _name_xml('x'), _name_xml('a'), _name_xml('y')),
+                 'np.minimum(np.minimum(x, a), y)')]:
+            with self.subTest(call=call):
+                generalizer = FortranAstGeneralizer()
+                function = generalizer.transform_one(
+                    ET.fromstring(INTRINSICS_SUBROUTINE.format(call)))
+                self.assertEqual(horast.unparse(function.body[-1]).strip(), expected)
+                self.assertEqual(len(generalizer.import_statements),
+                                 2 if expected.startswith('math.') else 1)
+
+    def test_generalize_allocations(self):
+        generalizer = FortranAstGeneralizer()
+        allocation, _ = generalizer.transform_one(ET.fromstring(
+            '<allocate><expressions count="1">{}</expressions></allocate>'.format(_name_xml(
+                'a', _name_xml('n'), '<literal type="int" value="3"/>'))))
+        self.assertEqual(horast.unparse(allocation).strip(),
+                         "a = np.empty((n, 3), dtype=t.Any, order='F')")
+        self.assertIn('allocate(a(n, 3))', Fortran2008Unparser().unparse(allocation))
+        declaration, _ = generalizer.transform_one(ET.fromstring(
+            '<declaration type="variable">'
+            '<type name="real" type="intrinsic" hasLength="false" hasKind="false"/>'
+            '<variables count="1"><variable name="a"><dimensions count="1">'
+            '<dimension type="simple"><literal type="int" value="10"/></dimension></dimensions>'
+            '<initial-value><name id="v"/></initial-value></variable></variables>'
+            '</declaration>'))
+        self.assertEqual(horast.unparse(declaration).strip(),
+                         "a: st.ndarray[(1, float, (10,))] = np.array(v, dtype=float, order='F')")
+
     @unittest.skip('not ready yet')
     def test_unparse(self):
         parser = FortranParser()
@@ -51,6 +107,67 @@ class Tests(unittest.TestCase):
                 code = unparser.unparse(tree)
                 basic_check_fortran_code(self, input_path, code)
 
+    def test_unparse_names(self):
+        code = '''def f(a: st.ndarray[1, np.double, (10,)], s: str, n: np.int32) -> None:
+    k: np.int32 = 0
+    x: np.double = 0.0
+    t = s.rstrip()
+    k = a.sum()
+    x = np.sqrt(a[n]) + np.maximum(a[np.minimum(k, n)], x)
+    x = math.sqrt(x) + np.exp(a[k]) + math.copysign(x, a[n])
+    print(t, k, x)
+'''
+        tree = st.augment(typed_ast3.parse(code), eval_=False)
+        fortran_code = Fortran2008Unparser().unparse(tree)
+        for fragment in ('integer*4, intent(in) :: n', 'integer*4 :: k = 0', 'real*8 :: x = 0.0',
+                         't = trim(s)', 'k = count(a)', 'x = (sqrt(a(n)) + max(a(min(k, n)), x))',
+                         'x = ((sqrt(x) + exp(a(k))) + sign(x, a(n)))', 'print *, t, k, x'):
+            with self.subTest(fragment=fragment):
+                self.assertIn(fragment, fortran_code)
+
+    def test_unparse_local_declarations(self):
+        code = '''def f(a: st.ndarray[1, np.double, (10,)], n: int) -> np.double:
+    total: np.double = 0.0
+    for i in range(n):  # type: int
+        for j in range(i):  # type: np.int64
+            total = total + a[i] * a[j]
+    for i in range(n):  # type: np.int32
+        total = total - a[i]
+    return total
+'''
+        tree = st.augment(typed_ast3.parse(code), eval_=False)
+        unparser = Fortran2008Unparser()
+        fortran_code = unparser.unparse(tree)
+        for fragment in ('integer :: i\n', 'integer*8 :: j\n', 'real*8 :: total = 0.0', 'f = total'):
+            with self.subTest(fragment=fragment):
+                self.assertIn(fragment, fortran_code)
+        self.assertNotIn('integer*4 :: i', fortran_code)
+        self.assertEqual(unparser.unparse(tree), fortran_code)
+
+    def test_unparse_line_wrapping(self):
+        terms = ' + '.join('a[{}, i] * very_long_variable_name_{}'.format(_, _) for _ in range(30))
+        code = '''def f(a: st.ndarray[2, np.double, (10, 10)], n: int) -> None:
+    x: np.double = 0.0
+    for i in range(n):  # type: int
+        x = {}
+'''.format(terms)
+        tree = st.augment(typed_ast3.parse(code), eval_=False)
+        fixed_form_code = Fortran77Unparser().unparse(tree)
+        free_form_code = Fortran2008Unparser().unparse(tree)
+        for fortran_code, max_line_len, continued in (
+                (fixed_form_code, 72, lambda prev, line: line.startswith('      +')),
+                (free_form_code, 100 + len(' &'), lambda prev, line: prev.endswith(' &'))):
+            lines = fortran_code.splitlines()
+            with self.subTest(max_line_len=max_line_len):
+                self.assertTrue(all(len(line) <= max_line_len for line in lines),
+                                msg=fortran_code)
+                continuations = [line for prev, line in zip(lines, lines[1:])
+                                 if continued(prev, line)]
+                self.assertGreater(len(continuations), 5, msg=fortran_code)
+                self.assertEqual(''.join(_.strip().lstrip('+').strip().rstrip('&').strip()
+                                         for _ in lines if 'very_long_variable_name' in _)
+                                 .count('very_long_variable_name'), 30)
+
     def test_compile(self):
         compiler = F2PyCompiler()
         for input_path in [_ for _ in EXAMPLES_F77_FILES + EXAMPLES_F95_FILES
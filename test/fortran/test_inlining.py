@@ -0,0 +1,206 @@
+"""Unit tests for project-wide inlining of Fortran subroutines."""
+
+import pathlib
+import unittest
+import xml.etree.ElementTree as ET
+
+import transpyle.fortran  # noqa: F401, pylint: disable=unused-import
+from transpyle.fortran.inlining import \
+    statement_line_end, FortranCallIndex, FortranProjectInliner
+
+INC_PATH = pathlib.Path('inc.f90')
+
+INC_CODE = '''subroutine inc(x, y)
+  x = x + y
+end subroutine inc
+'''
+
+INC_XML = '''<file path="inc.f90">
+<subroutine name="inc" line_begin="1" line_end="3">
+<header><arguments count="2"><argument name="x"/><argument name="y"/></arguments></header>
+<body><statement line_begin="2" line_end="2"><assignment>
+<target><name id="x"/></target>
+<value><operation type="multiary"><operand><name id="x"/></operand><operator operator="+"/>
+<operand><name id="y"/></operand></operation></value>
+</assignment></statement></body>
+</subroutine>
+</file>'''
+
+MAIN_PATH = pathlib.Path('main.f90')
+
+MAIN_CODE = '''subroutine main(a, n)
+  call inc(a(1), 1)
+  do i = 1, n
+    call inc(a(i), &
+             2)
+  end do
+end subroutine main
+'''
+
+CALL_XML = '''<call line_begin="{line}" line_end="{line}">
+<name id="inc" type="procedure"><subscripts count="2">
+<subscript type="simple"><name id="a" type="variable"><subscripts count="1">
+<subscript type="simple">{index}</subscript></subscripts></name></subscript>
+<subscript type="simple"><literal type="int" value="{value}"/></subscript>
+</subscripts></name></call>'''
+
+MAIN_XML = '''<file path="main.f90">
+<subroutine name="main" line_begin="1" line_end="7">
+<header><arguments count="2"><argument name="a"/><argument name="n"/></arguments></header>
+<body>
+<statement>{}</statement>
+<loop type="do" line_begin="3" line_end="6"><body><statement>{}</statement></body></loop>
+</body>
+</subroutine>
+</file>'''.format(
+    CALL_XML.format(line=2, index='<literal type="int" value="1"/>', value=1),
+    CALL_XML.format(line=4, index='<name id="i"/>', value=2))
+
+MIXED_PATH = pathlib.Path('mixed.f90')
+
+MIXED_CODE = '''subroutine mixed(a, c)
+  if (c) call inc(a(1), 1)
+10 call inc(a(2), 1)
+  a(3) = 0; call inc(a(3), 1)
+  call inc(a(4), 1)
+end subroutine mixed
+'''
+
+MIXED_XML = '''<file path="mixed.f90">
+<subroutine name="mixed" line_begin="1" line_end="6">
+<header><arguments count="2"><argument name="a"/><argument name="c"/></arguments></header>
+<body>
+<if line_begin="2" line_end="2"><header><name id="c"/></header><body>{}</body></if>
+<statement>{}</statement>
+<statement>{}</statement>
+<statement line_begin="5" line_end="5">{}</statement>
+</body>
+</subroutine>
+</file>'''.format(*[
+    CALL_XML.format(line=line, index='<literal type="int" value="{}"/>'.format(index), value=1)
+    for line, index in [(2, 1), (3, 2), (4, 3)]], CALL_XML.replace(
+        ' line_begin="{line}" line_end="{line}"', '').format(
+            index='<literal type="int" value="4"/>', value=1))
+
+SWAP_PATH = pathlib.Path('swap.f90')
+
+SWAP_CODE = '''subroutine swap(x, y)
+  real, intent(inout) :: x, y
+  real :: i
+  i = x
+  x = y
+  y = i
+end subroutine swap
+subroutine swap_main(a, i)
+  call swap(a, i)
+end subroutine swap_main
+'''
+
+DECLARATION_XML = '''<declaration type="variable" line_begin="{line}" line_end="{line}">
+<type name="real" type="intrinsic" hasLength="false" hasKind="false"/>{intent}
+<variables count="{count}">{variables}</variables></declaration>'''
+
+ASSIGNMENT_XML = '''<statement line_begin="{line}" line_end="{line}"><assignment>
+<target><name id="{target}"/></target><value><name id="{value}"/></value>
+</assignment></statement>'''
+
+SWAP_XML = '''<file path="swap.f90">
+<subroutine name="swap" line_begin="1" line_end="7">
+<header><arguments count="2"><argument name="x"/><argument name="y"/></arguments></header>
+<body><specification>{}{}</specification>{}{}{}</body>
+</subroutine>
+<subroutine name="swap_main" line_begin="8" line_end="10">
+<header><arguments count="2"><argument name="a"/><argument name="i"/></arguments></header>
+<body><statement><call line_begin="9" line_end="9">
+<name id="swap" type="procedure"><subscripts count="2">
+<subscript type="simple"><name id="a"/></subscript>
+<subscript type="simple"><name id="i"/></subscript>
+</subscripts></name></call></statement></body>
+</subroutine>
+</file>'''.format(
+    DECLARATION_XML.format(line=2, intent='<intent type="inout"/>', count=2,
+                           variables='<variable name="x"/><variable name="y"/>'),
+    DECLARATION_XML.format(line=3, intent='', count=1, variables='<variable name="i"/>'),
+    ASSIGNMENT_XML.format(line=4, target='i', value='x'),
+    ASSIGNMENT_XML.format(line=5, target='x', value='y'),
+    ASSIGNMENT_XML.format(line=6, target='y', value='i'))
+
+
+def _create_index() -> FortranCallIndex:
+    index = FortranCallIndex()
+    index.add_file(INC_PATH, INC_CODE, ET.fromstring(INC_XML))
+    index.add_file(MAIN_PATH, MAIN_CODE, ET.fromstring(MAIN_XML))
+    index.add_file(SWAP_PATH, SWAP_CODE, ET.fromstring(SWAP_XML))
+    return index
+
+
+class Tests(unittest.TestCase):
+
+    def test_statement_line_end(self):
+        lines = ['call f(a, & ! comment', '', '! comment', '  b)', "x = '&'", 'y = 1 &', '  + 2']
+        for line_begin, line_end in [(1, 4), (4, 4), (5, 5), (6, 7)]:
+            with self.subTest(line_begin=line_begin):
+                self.assertEqual(statement_line_end(lines, line_begin, line_begin), line_end)
+        lines = ['      call f(a,', 'c comment', '     &  b)', '      x = 1', '     0  + 2']
+        self.assertEqual(statement_line_end(lines, 1, 1, fixed_form=True), 3)
+        self.assertEqual(statement_line_end(lines, 4, 4, fixed_form=True), 4)
+
+    def test_index(self):
+        index = _create_index()
+        self.assertEqual(sorted(index.routines), ['inc', 'main', 'swap', 'swap_main'])
+        self.assertEqual(index.routines['inc'].lines_count, 3)
+        spans = [(_.name, _.caller, _.line_begin, _.line_end, _.loop_depth)
+                 for _ in index.calls_to('INC')]
+        self.assertEqual(spans, [('inc', 'main', 2, 2, 0), ('inc', 'main', 4, 5, 1)])
+
+    def test_index_only_call_statements(self):
+        index = FortranCallIndex()
+        index.add_file(INC_PATH, INC_CODE, ET.fromstring(INC_XML))
+        index.add_file(MIXED_PATH, MIXED_CODE, ET.fromstring(MIXED_XML))
+        self.assertEqual(index.calls_to('inc'), [])
+        lines = ['      subroutine f(a)', '   10 call inc(a, 1)', '      call inc(a, 2)',
+                 '      end']
+        index.add_file(pathlib.Path('f.f'), '\n'.join(lines) + '\n', ET.fromstring(
+            '<file path="f.f"><subroutine name="f" line_begin="1" line_end="4"><body>'
+            '<statement>{}</statement><statement>{}</statement></body></subroutine>'
+            '</file>'.format(*[CALL_XML.format(line=line, index='<name id="i"/>', value=value)
+                               for line, value in [(2, 1), (3, 2)]])))
+        self.assertEqual([_.line_begin for _ in index.calls_to('inc')], [3])
+
+    def test_select_call_sites(self):
+        index = _create_index()
+        self.assertEqual(len(index.select_call_sites(['Inc'])), 2)
+        self.assertEqual(len(index.select_call_sites(max_lines=3)), 2)
+        self.assertEqual(len(index.select_call_sites(max_lines=2)), 0)
+        hot_call_sites = index.select_call_sites(max_lines=3, min_loop_depth=1)
+        self.assertEqual([_.line_begin for _ in hot_call_sites], [4])
+        with self.assertRaises(KeyError):
+            index.select_call_sites(['no_such_routine'])
+
+    def test_inline(self):
+        inliner = FortranProjectInliner(_create_index(), verbose=False)
+        codes = inliner.inline_routines(['inc'])
+        self.assertEqual(list(codes), [MAIN_PATH])
+        self.assertEqual(codes[MAIN_PATH], '''subroutine main(a, n)
+  a(1) = (a(1) + 1)
+  do i = 1, n
+    a(i) = (a(i) + 2)
+  end do
+end subroutine main
+''')
+
+    def test_local_variables(self):
+        index = _create_index()
+        self.assertEqual(index.routines['inc'].local_variables, set())
+        self.assertEqual(index.routines['swap'].local_variables, {'i'})
+        with self.assertRaises(ValueError):
+            index.select_call_sites(['swap'])
+        self.assertEqual({_.name for _ in index.select_call_sites(max_lines=10)}, {'inc'})
+        with self.assertRaises(ValueError):
+            FortranProjectInliner(index, verbose=False).inline(index.calls_to('swap'))
+
+    def test_overlapping_call_sites(self):
+        index = _create_index()
+        call_site = index.call_sites[0]
+        with self.assertRaises(ValueError):
+            FortranProjectInliner(index).inline([call_site, call_site])
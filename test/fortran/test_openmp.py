@@ -1,17 +1,44 @@
 """Tests for OpenMP support in transpyle."""
 
 import datetime
+import os
 import pathlib
 import sys
 import tempfile
+import time
 import unittest
 
+import horast.nodes as horast_nodes
+import numpy as np
+import static_typing as st
+import typed_ast.ast3 as typed_ast3
+
 from transpyle.general.code_reader import CodeReader
+from transpyle.general.code_writer import CodeWriter
 from transpyle import Language
-from transpyle import AutoTranspiler
+from transpyle import AutoTranslator, AutoTranspiler
+from transpyle.fortran.unparser import Fortran77Unparser, Fortran2008Unparser
+from transpyle.fortran.compiler import OPENMP_DIRECTIVE, F2PyCompiler
+from transpyle.fortran.binder import F2PyBinder
 
 from test.common import EXAMPLES_PY3_FILES, EXAMPLES_RESULTS_ROOT
 
+REGIONS = '''def regions(n: int, a: st.ndarray[1, np.double, (100,)]) -> None:
+    for i in range(n):  # type: int
+        a[i] = 0
+    if n > 0:
+        a[0] = 1
+'''
+
+
+def _regions_with_directives() -> typed_ast3.Module:
+    tree = typed_ast3.parse(REGIONS)
+    body = tree.body[0].body
+    for index, directive in [(1, 'pragma omp barrier'), (1, 'pragma omp single'),
+                             (0, 'pragma omp for'), (0, 'pragma omp parallel')]:
+        body.insert(index, horast_nodes.Comment(value=typed_ast3.Str(directive, ''), eol=False))
+    return st.augment(tree, eval_=False)
+
 
 class Tests(unittest.TestCase):
 
@@ -39,3 +66,96 @@ class Tests(unittest.TestCase):
 
         compiled_path = transpiler.transpile(reader.read_file(input_path), input_path, output_path, output_dir)
         # TODO: run it
+
+    def test_unparse_directives(self):
+        tree = _regions_with_directives()
+        extras = [sorted(vars(_)) for _ in typed_ast3.walk(tree)]
+        code = Fortran2008Unparser().unparse(tree)
+        self.assertEqual([sorted(vars(_)) for _ in typed_ast3.walk(tree)], extras)
+        self.assertIn('  !$omp parallel\n  !$omp do\n  do i = 0, (n - 1)\n', code)
+        self.assertIn('  end do\n  !$omp end parallel\n  !$omp single\n  !$omp barrier\n'
+                      '  if ((n > 0)) then\n', code)
+        self.assertIn('  end if\n  !$omp end single\n', code)
+        self.assertNotIn('end do\n  !$omp end do', code)
+        self.assertEqual(code.count('!$omp end'), 2)
+        code = Fortran77Unparser().unparse(_regions_with_directives())
+        self.assertIn('\n!$omp parallel\n!$omp do\n', code)
+        self.assertIn('\n!$omp end single\n', code)
+        tree = _regions_with_directives()
+        tree.body[0].body.insert(
+            4, horast_nodes.Comment(value=typed_ast3.Str('$omp end parallel', ''), eol=False))
+        code = Fortran2008Unparser().unparse(st.augment(tree, eval_=False))
+        self.assertEqual(code.count('!$omp end parallel'), 1)
+        tree = _regions_with_directives()
+        tree.body[0].body[0].value.s = 'pragma omp parallel if(max(n, 2)'
+        code = Fortran2008Unparser().unparse(tree)
+        self.assertIn('  !pragma omp parallel if(max(n, 2)\n  !$omp do\n', code)
+        self.assertNotIn('!$omp end parallel', code)
+
+    def test_unparse_long_directives(self):
+        variables = ['variable_{}'.format(_) for _ in range(20)]
+        directive = 'pragma omp parallel for private({}) reduction(+:total_sum)'.format(
+            ', '.join(variables))
+        for unparser, line_len, prefix, continuation in [
+                (Fortran77Unparser(), 72, '!$omp', '!$omp& '),
+                (Fortran2008Unparser(), 132, '  !$omp', '  !$omp ')]:
+            tree = _regions_with_directives()
+            tree.body[0].body[0].value.s = directive
+            code = unparser.unparse(tree)
+            lines = code.splitlines()
+            begin = [_.lstrip().startswith('!$omp parallel do') for _ in lines].index(True)
+            end = begin + [_.lstrip() for _ in lines[begin:]].index('!$omp do')
+            with self.subTest(unparser=unparser, lines=lines[begin:end]):
+                self.assertGreater(end - begin, 1)
+                self.assertTrue(all(len(_) <= line_len for _ in lines[begin:end]))
+                self.assertTrue(lines[begin].startswith(prefix + ' parallel do'))
+                self.assertTrue(all(_.startswith(continuation) for _ in lines[begin + 1:end]))
+                if isinstance(unparser, Fortran77Unparser):
+                    text = ' '.join(_[len(continuation):] for _ in lines[begin + 1:end])
+                else:
+                    self.assertTrue(all(_.endswith(' &') for _ in lines[begin:end - 1]))
+                    self.assertFalse(lines[end - 1].endswith('&'))
+                    text = ' '.join(_[len(continuation):].rstrip(' &')
+                                    for _ in lines[begin + 1:end])
+                self.assertTrue(text.endswith(', '.join(variables[-3:])
+                                              + ') reduction(+:total_sum)'))
+                for variable in variables:
+                    self.assertEqual(code.count(variable + ',') + code.count(variable + ')'), 1)
+
+    def test_detect_directives(self):
+        for code, expected in [
+                ('!$omp parallel do\n', True), ('  !$OMP PARALLEL\n', True),
+                ('c$omp parallel do\n', True), ('x = 1  !$omp parallel do\n', False),
+                ('! $omp parallel do\n', False), ('!$ompx\n', False)]:
+            with self.subTest(code=code):
+                self.assertEqual(OPENMP_DIRECTIVE.search(code) is not None, expected)
+
+    @unittest.skipIf(sys.version_info[:2] < (3, 6), 'unsupported in Python < 3.6')
+    @unittest.skipIf((os.cpu_count() or 1) < 2, 'multi-threaded speedup needs at least 2 cores')
+    def test_speedup(self):
+        input_path = [_ for _ in EXAMPLES_PY3_FILES if _.name == 'gemm_openmp.py'][0]
+        translator = AutoTranslator(Language.find('Python'), Language.find('Fortran'))
+        code = translator.translate(CodeReader().read_file(input_path), input_path)
+        self.assertIn('!$omp parallel do', code)
+        output_dir = pathlib.Path(
+            EXAMPLES_RESULTS_ROOT, input_path.parent.name,
+            'f2py_tmp_{}'.format(datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')))
+        output_dir.mkdir(parents=True)
+        translated_path = output_dir.joinpath(input_path.with_suffix('.f90').name)
+        CodeWriter('.f90').write_file(code, translated_path)
+        a = np.random.random((100, 100))
+        b = np.random.random((100, 100))
+        durations = {}
+        for openmp in (False, None):
+            with self.subTest(openmp=openmp):
+                compile_dir = output_dir.joinpath('openmp' if openmp is None else 'serial')
+                compile_dir.mkdir()
+                compiled_path = F2PyCompiler().compile(code, translated_path, compile_dir,
+                                                       openmp=openmp)
+                dgemm = F2PyBinder().bind(compiled_path).dgemm
+                self.assertTrue(np.allclose(dgemm(a, b), a @ b))
+                timer = time.perf_counter()
+                for _ in range(200):
+                    dgemm(a, b)
+                durations[openmp] = time.perf_counter() - timer
+        self.assertLess(durations[None], durations[False] / 1.2, msg=durations)
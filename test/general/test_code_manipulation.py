@@ -0,0 +1,52 @@
+"""Unit tests for line-based editing of code."""
+
+import random
+import unittest
+
+from transpyle.pair import replace_line, replace_scope, PatchSet
+
+CODE = ''.join('line {}\n'.format(_) for _ in range(1, 11))
+
+
+class Tests(unittest.TestCase):
+
+    def test_replace_scope(self):
+        self.assertEqual(replace_scope('a\nb\nc\nd\n', 1, 2, 'b\na\n'), 'b\na\nc\nd\n')
+        self.assertEqual(replace_line('a\nb\nc', 3, 'x'), 'a\nb\nx')
+
+    def test_patch_set_like_replace_scope(self):
+        random.seed(0)
+        for _ in range(50):
+            lines = sorted(random.sample(range(1, 11), 6))
+            scopes = list(zip(lines[::2], lines[1::2]))
+            replacements = ['x' * random.randint(0, 3) + '\n' * random.randint(0, 2)
+                            for _ in scopes]
+            with self.subTest(scopes=scopes, replacements=replacements):
+                patch_set = PatchSet(CODE)
+                for (line_begin, line_end), replacement in reversed(
+                        list(zip(scopes, replacements))):
+                    patch_set.replace_scope(line_begin, line_end, replacement)
+                code = CODE
+                for (line_begin, line_end), replacement in reversed(
+                        list(zip(scopes, replacements))):
+                    code = replace_scope(code, line_begin, line_end, replacement)
+                self.assertEqual(patch_set.apply(), code)
+
+    def test_patch_set_edges(self):
+        patch_set = PatchSet('a\nb\nc')
+        patch_set.replace_line(3, 'z')
+        patch_set.replace_line(1)
+        self.assertEqual(len(patch_set), 2)
+        self.assertEqual(patch_set.apply(), 'b\nz')
+        self.assertEqual(PatchSet(CODE).apply(), CODE)
+
+    def test_patch_set_errors(self):
+        patch_set = PatchSet(CODE)
+        for line_begin, line_end in [(0, 1), (3, 2), (10, 11)]:
+            with self.subTest(line_begin=line_begin, line_end=line_end):
+                with self.assertRaises(ValueError):
+                    patch_set.replace_scope(line_begin, line_end, 'x\n')
+        patch_set.replace_scope(2, 4, 'x\n')
+        patch_set.replace_scope(4, 5, 'y\n')
+        with self.assertRaises(ValueError):
+            patch_set.apply()
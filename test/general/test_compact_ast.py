@@ -0,0 +1,81 @@
+"""Unit tests for compact representation of generalized AST."""
+
+import gc
+import logging
+import tracemalloc
+import unittest
+
+import horast
+import static_typing as st
+import typed_ast.ast3 as typed_ast3
+import typed_astunparse
+
+from transpyle.pair import CompactAst, compact, expand
+
+from test.common import EXAMPLES_FILES
+
+
+def _dump_with_extras(tree):
+    """Dump a tree including non-field attributes of all nodes."""
+    dumped = []
+    for node in typed_ast3.walk(tree):
+        extras = {k: v for k, v in vars(node).items() if k not in node._fields}
+        dumped.append((type(node).__qualname__, repr(sorted(extras, key=str))))
+    return typed_astunparse.dump(tree, include_attributes=True), dumped
+
+
+class Tests(unittest.TestCase):
+
+    def test_roundtrip_examples(self):
+        for path in EXAMPLES_FILES['python3']:
+            with open(str(path)) as example_file:
+                code = example_file.read()
+            for augmented in (False, True):
+                tree = typed_ast3.parse(code)
+                if augmented:
+                    tree = st.augment(tree, eval_=False)
+                with self.subTest(path=path, augmented=augmented):
+                    table = compact(tree)
+                    self.assertIsInstance(table, CompactAst)
+                    self.assertLessEqual(len(table.layouts), len(table))
+                    restored = expand(table)
+                    self.assertIsNot(restored, tree)
+                    self.assertEqual(_dump_with_extras(restored), _dump_with_extras(tree))
+                    self.assertEqual(horast.unparse(restored), horast.unparse(tree))
+
+    def test_extras_and_sharing(self):
+        tree = typed_ast3.parse('a = b + c')
+        value = tree.body[0].value
+        value.fortran_metadata = {'is_allocation': True, 'names': ['x', 'y'], 'node': value.left}
+        tree.body.append(horast.nodes.Comment(value=typed_ast3.Str(' comment', ''), eol=False))
+        restored = expand(compact(tree))
+        restored_value = restored.body[0].value
+        self.assertIsNot(restored_value, value)
+        self.assertEqual(restored_value.fortran_metadata['names'], ['x', 'y'])
+        self.assertIs(restored_value.fortran_metadata['node'], restored_value.left)
+        self.assertIsInstance(restored.body[-1], horast.nodes.Comment)
+        self.assertEqual(restored.body[-1].value.s, ' comment')
+
+    def test_memory(self):
+        codes = []
+        for path in EXAMPLES_FILES['python3']:
+            with open(str(path)) as example_file:
+                codes.append(example_file.read())
+        # log records kept alive by test runners would be counted as well
+        logging.disable(logging.CRITICAL)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            baseline, _ = tracemalloc.get_traced_memory()
+            trees = [st.augment(typed_ast3.parse(code), eval_=False) for code in codes]
+            gc.collect()
+            trees_size = tracemalloc.get_traced_memory()[0] - baseline
+            tables = [compact(tree) for tree in trees]
+            del trees
+            gc.collect()
+            tables_size = tracemalloc.get_traced_memory()[0] - baseline
+        finally:
+            tracemalloc.stop()
+            logging.disable(logging.NOTSET)
+        self.assertEqual(len(tables), len(codes))
+        self.assertLess(tables_size, trees_size)
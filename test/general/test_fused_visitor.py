@@ -0,0 +1,109 @@
+"""Unit tests for running several passes in a single traversal."""
+
+import unittest
+
+import horast
+import static_typing as st
+import typed_ast.ast3 as typed_ast3
+
+from transpyle.pair import NodePass, FusedVisitor, FusedTransformer
+
+CODE = '''def f(a, b):
+    for i in range(a):
+        b = b + g(a, i)
+    return b
+'''
+
+
+class Counter(NodePass):
+
+    def __init__(self, skipped_types=()):
+        self.skipped_types = skipped_types
+        self.visited = []
+
+    def visit_node(self, node):
+        self.visited.append(type(node).__name__)
+
+
+class Renamer(NodePass):
+
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+
+    def visit_Name(self, node):  # pylint: disable=invalid-name
+        if node.id == self.old:
+            return typed_ast3.Name(id=self.new, ctx=node.ctx)
+        return node
+
+
+class ReturnToAssign(NodePass):
+
+    skipped_types = (typed_ast3.expr,)
+
+    def visit_Return(self, node):  # pylint: disable=invalid-name
+        return typed_ast3.Assign(targets=[typed_ast3.Name(id='a', ctx=typed_ast3.Store())],
+                                 value=node.value, type_comment=None)
+
+
+class Tests(unittest.TestCase):
+
+    def test_visit(self):
+        counter = Counter()
+        statements_counter = Counter(skipped_types=(typed_ast3.expr,))
+        FusedVisitor([counter, statements_counter]).visit(typed_ast3.parse(CODE))
+        self.assertEqual(len(counter.visited), len(list(typed_ast3.walk(typed_ast3.parse(CODE)))))
+        self.assertEqual(counter.visited[:3], ['Module', 'FunctionDef', 'arguments'])
+        self.assertIn('Call', counter.visited)
+        self.assertEqual(statements_counter.visited, [
+            'Module', 'FunctionDef', 'arguments', 'arg', 'arg', 'For', 'Name', 'Call', 'Assign',
+            'Name', 'BinOp', 'Return', 'Name'])
+
+    def test_skip_subtrees(self):
+        counter = Counter(skipped_types=(typed_ast3.stmt,))
+        visitor = FusedVisitor([counter])
+        visitor.visit(typed_ast3.parse(CODE))
+        self.assertEqual(counter.visited, ['Module', 'FunctionDef'])
+
+    def test_dispatch(self):
+        class Expressions(NodePass):
+            def __init__(self):
+                self.found = []
+
+            def visit_expr(self, node):
+                self.found.append(node)
+
+            def visit_FunctionDef(self, node):  # pylint: disable=invalid-name
+                self.found.append(node.name)
+
+        tree = st.augment(typed_ast3.parse(CODE), eval_=False)
+        expressions = Expressions()
+        FusedVisitor([expressions]).visit(tree)
+        self.assertEqual(expressions.found[0], 'f')
+        self.assertEqual(len(expressions.found) - 1, len(
+            [_ for _ in typed_ast3.walk(tree) if isinstance(_, typed_ast3.expr)]))
+
+    def test_transform_like_separate_traversals(self):
+        for passes in ([Renamer('a', 'x'), Renamer('b', 'y')],
+                       [Renamer('a', 'b'), Renamer('b', 'c')],
+                       [Renamer('a', 'b'), ReturnToAssign()],
+                       [ReturnToAssign(), Renamer('a', 'b')],
+                       [Renamer('b', 'a'), ReturnToAssign(), Renamer('a', 'c')]):
+            with self.subTest(passes=passes):
+                tree = typed_ast3.parse(CODE)
+                for pass_ in passes:
+                    tree = FusedTransformer([pass_]).visit(tree)
+                fused_tree = FusedTransformer(passes).visit(typed_ast3.parse(CODE))
+                self.assertEqual(horast.unparse(fused_tree), horast.unparse(tree))
+
+    def test_transform_into_many_and_none(self):
+        class Duplicator(NodePass):
+            def visit_AugAssign(self, node):  # pylint: disable=invalid-name
+                return [node, node]
+
+            def visit_Pass(self, node):  # pylint: disable=invalid-name,unused-argument
+                return None
+
+        tree = typed_ast3.parse('x += 1\npass\ny = 2\n')
+        tree = FusedTransformer([Duplicator(), Renamer('x', 'z')]).visit(tree)
+        self.assertEqual(horast.unparse(tree).strip(), 'z += 1\nz += 1\ny = 2')
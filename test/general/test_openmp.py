@@ -0,0 +1,69 @@
+"""Unit tests for representation of OpenMP directives in AST."""
+
+import unittest
+
+import horast.nodes as horast_nodes
+import typed_ast.ast3 as typed_ast3
+
+from transpyle.pair import OpenMpDirective, openmp_directive, find_openmp_directives
+
+DIRECTIVES = [
+    ('pragma omp parallel for', '$omp parallel do', OpenMpDirective('parallel for')),
+    ('pragma omp for', '$omp do', OpenMpDirective('for')),
+    ('pragma omp parallel for private(t, u) reduction(+:s)',
+     '$omp parallel do private(t, u) reduction(+:s)',
+     OpenMpDirective('parallel for', ['private(t, u)', 'reduction(+:s)'])),
+    ('pragma omp parallel for simd reduction(&&:b) schedule(static, 4)',
+     '$omp parallel do simd reduction(.and.:b) schedule(static, 4)',
+     OpenMpDirective('parallel for simd', ['reduction(&&:b)', 'schedule(static, 4)'])),
+    ('pragma omp parallel for if(max(n, 2) > 1) private(t)',
+     '$omp parallel do if(max(n, 2) > 1) private(t)',
+     OpenMpDirective('parallel for', ['if(max(n, 2) > 1)', 'private(t)'])),
+    ('pragma omp barrier', '$omp barrier', OpenMpDirective('barrier'))]
+
+
+class Tests(unittest.TestCase):
+
+    def test_from_comment(self):
+        for python_text, fortran_text, directive in DIRECTIVES:
+            for text in (python_text, fortran_text, ' {} '.format(python_text)):
+                with self.subTest(text=text):
+                    self.assertEqual(OpenMpDirective.from_comment(text), directive)
+        self.assertEqual(OpenMpDirective.from_comment('$OMP PARALLEL DO REDUCTION(.OR.:b)'),
+                         OpenMpDirective('parallel for', ['REDUCTION(||:b)']))
+        for text in ('pragma once', ' comment', 'omp parallel for', '$ompx'):
+            with self.subTest(text=text):
+                self.assertIsNone(OpenMpDirective.from_comment(text))
+        for text in ('pragma omp parallel for )', 'pragma omp parallel for if(max(n, 2) > 1'):
+            with self.subTest(text=text):
+                with self.assertRaises(SyntaxError):
+                    OpenMpDirective.from_comment(text)
+
+    def test_code(self):
+        for python_text, fortran_text, directive in DIRECTIVES:
+            with self.subTest(directive=directive):
+                self.assertEqual(directive.to_python(), python_text)
+                self.assertEqual(directive.to_cpp(), '#{}'.format(python_text))
+                self.assertEqual(directive.to_fortran(), '!{}'.format(fortran_text))
+                self.assertEqual(directive.is_loop, 'do' in fortran_text)
+                self.assertEqual(openmp_directive(directive.to_comment()), directive)
+
+    def test_openmp_directive(self):
+        comment = horast_nodes.Comment(value=typed_ast3.Str('pragma omp for', ''), eol=True)
+        self.assertIsNone(openmp_directive(comment))
+        self.assertIsNone(openmp_directive(typed_ast3.Pass()))
+        comment = horast_nodes.Comment(value=typed_ast3.Str('pragma omp for )', ''), eol=False)
+        self.assertIsNone(openmp_directive(comment))
+
+    def test_find_openmp_directives(self):
+        tree = typed_ast3.parse('for i in range(n):\n    a[i] = 0\nb = 1\n')
+        for index, text in [(1, ' comment'), (0, 'pragma omp for'), (0, 'pragma omp parallel'),
+                            (4, 'pragma omp barrier')]:
+            tree.body.insert(index, horast_nodes.Comment(value=typed_ast3.Str(text, ''),
+                                                         eol=False))
+        loop, assignment = tree.body[2], tree.body[5]
+        directives = find_openmp_directives(tree)
+        self.assertEqual(directives, {id(loop): [OpenMpDirective('parallel'),
+                                                 OpenMpDirective('for')]})
+        self.assertNotIn(id(assignment), directives)
+        self.assertFalse(hasattr(loop, 'openmp_directives'))
@@ -0,0 +1,122 @@
+"""Unit tests for pass manager."""
+
+import pathlib
+import tempfile
+import unittest
+
+import horast
+import typed_ast.ast3 as typed_ast3
+
+from transpyle.general import \
+    Language, AutoTranslator, Transformation, FunctionTransformation, PassManager, \
+    load_transformation
+import transpyle.python  # noqa: F401, pylint: disable=unused-import
+
+from test.common import RESULTS_ROOT
+
+INLINING_EXAMPLES_PATH = RESULTS_ROOT.parent.joinpath('examples_inlining.py')
+
+
+def _rename_variables(tree, prefix='renamed_'):
+    for node in typed_ast3.walk(tree):
+        if isinstance(node, typed_ast3.Name) and node.id in {'a', 'b'}:
+            node.id = prefix + node.id
+    return tree
+
+
+class Tests(unittest.TestCase):
+
+    def test_run(self):
+        calls = []
+
+        def count_calls(tree):
+            calls.append(tree)
+            return tree
+
+        pass_manager = PassManager([FunctionTransformation(count_calls),
+                                    FunctionTransformation(_rename_variables, prefix='x_')],
+                                   cache=True)
+        for _ in range(3):
+            tree = pass_manager.run(typed_ast3.parse('c = a + b'))
+            self.assertEqual(horast.unparse(tree).strip(), 'c = (x_a + x_b)')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(pass_manager.timings), 6)
+        self.assertEqual(list(pass_manager.summary), ['count_calls', '_rename_variables'])
+
+        pass_manager = PassManager([FunctionTransformation(count_calls)])
+        self.assertIsNone(pass_manager.cache)
+        for _ in range(3):
+            pass_manager.run(typed_ast3.parse('c = a + b'))
+        self.assertEqual(len(calls), 4)
+
+    def test_cache_metadata(self):
+        def read_metadata(tree):
+            tree.body[0].targets[0].id = tree.body[0].fortran_metadata['name']
+            return tree
+
+        pass_manager = PassManager([FunctionTransformation(read_metadata)], cache=True)
+        for name in ('x', 'y', 'x'):
+            tree = typed_ast3.parse('c = a + b')
+            tree.body[0].fortran_metadata = {'name': name}
+            with self.subTest(name=name):
+                self.assertEqual(horast.unparse(pass_manager.run(tree)).strip(),
+                                 '{} = (a + b)'.format(name))
+        self.assertEqual(len(pass_manager.cache), 1)
+
+    def test_cache_key(self):
+        pass_manager = PassManager([FunctionTransformation(_rename_variables, prefix='x_')],
+                                   cache=True)
+        self.assertIn('x_a', horast.unparse(pass_manager.run(typed_ast3.parse('a'))))
+        pass_manager.transformations = [FunctionTransformation(_rename_variables, prefix='y_')]
+        self.assertIn('y_a', horast.unparse(pass_manager.run(typed_ast3.parse('a'))))
+        self.assertEqual(len(pass_manager.cache), 2)
+
+    def test_dry_run(self):
+        pass_manager = PassManager([FunctionTransformation(_rename_variables)], dry_run=True)
+        tree = typed_ast3.parse('c = a + b\nd = c\n')
+        code = horast.unparse(tree)
+        self.assertIs(pass_manager.run(tree), tree)
+        self.assertEqual(horast.unparse(tree), code)
+        (name, diff), = pass_manager.diffs
+        self.assertEqual(name, '_rename_variables')
+        self.assertIn('-c = (a + b)', diff)
+        self.assertIn('+c = (renamed_a + renamed_b)', diff)
+        self.assertIn('\n d = c', diff)
+
+    def test_load_transformation(self):
+        transformation = load_transformation("inline:inlined=['buy']:verbose=False")
+        self.assertIsInstance(transformation, Transformation)
+        self.assertEqual(transformation.config['inlined'], ('buy',))
+        self.assertFalse(transformation.config['verbose'])
+        self.assertIs(type(transformation), Transformation.find('inlining'))
+        with tempfile.NamedTemporaryFile('w', suffix='.py', delete=False) as script:
+            script.write('def transform(tree, suffix="_x"):\n'
+                         '    tree.body[0].targets[0].id += suffix\n'
+                         '    return tree\n')
+        path = pathlib.Path(script.name)
+        try:
+            transformation = load_transformation('{}:suffix=_y'.format(path))
+        finally:
+            path.unlink()
+        tree = transformation.apply(typed_ast3.parse('a = 1'))
+        self.assertEqual(tree.body[0].targets[0].id, 'a_y')
+        for specification in ('no_such_transformation', 'inline:verbose'):
+            with self.subTest(specification=specification):
+                with self.assertRaises((KeyError, ValueError)):
+                    load_transformation(specification)
+
+    def test_translate_with_inlining(self):
+        language = Language.find('Python 3')
+        pass_manager = PassManager([load_transformation(
+            "inline:inlined=['buy','return_me']:verbose=False")])
+        translator = AutoTranslator(language, language, pass_manager=pass_manager)
+        with open(str(INLINING_EXAMPLES_PATH)) as examples_file:
+            code = examples_file.read()
+        inlined_code = translator.translate(code, INLINING_EXAMPLES_PATH)
+        tree = typed_ast3.parse(inlined_code)
+        functions = {_.name: _ for _ in tree.body if isinstance(_, typed_ast3.FunctionDef)}
+        for name in ('buy_products', 'just_return', 'just_assign'):
+            with self.subTest(name=name):
+                self.assertEqual([typed_ast3.dump(_) for _ in functions[name].body],
+                                 [typed_ast3.dump(_) for _ in functions[name + '_inlined'].body])
+        self.assertEqual([name for name, _ in pass_manager.timings], ['InliningTransformation'])
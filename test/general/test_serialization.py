@@ -0,0 +1,93 @@
+"""Unit tests for binary serialization of generalized AST."""
+
+import copy
+import pickle
+import struct
+import time
+import unittest
+
+import horast
+import static_typing as st
+import typed_ast.ast3 as typed_ast3
+import typed_astunparse
+
+from transpyle.pair import AST_FORMAT_VERSION, AstFormatError, serialize_ast, deserialize_ast
+
+from test.common import EXAMPLES_FILES
+
+
+def _dump_with_extras(tree):
+    dumped = []
+    for node in typed_ast3.walk(tree):
+        extras = {k: v for k, v in vars(node).items() if k not in node._fields}
+        dumped.append((type(node).__qualname__, repr(sorted(extras, key=str))))
+    return typed_astunparse.dump(tree, include_attributes=True), dumped
+
+
+class Tests(unittest.TestCase):
+
+    def test_roundtrip_examples(self):
+        for path in EXAMPLES_FILES['python3']:
+            with open(str(path)) as example_file:
+                code = example_file.read()
+            for augmented in (False, True):
+                tree = typed_ast3.parse(code)
+                if augmented:
+                    tree = st.augment(tree, eval_=False)
+                with self.subTest(path=path, augmented=augmented):
+                    data = serialize_ast(tree)
+                    self.assertIsInstance(data, bytes)
+                    restored = deserialize_ast(data)
+                    self.assertEqual(_dump_with_extras(restored), _dump_with_extras(tree))
+                    self.assertEqual(horast.unparse(restored), horast.unparse(tree))
+
+    def test_static_typing_data(self):
+        tree = st.augment(typed_ast3.parse(
+            'def f(x: int) -> int:\n    for i in range(x):\n        y = i\n    return y\n'),
+                          eval_=False)
+        function = deserialize_ast(serialize_ast(tree)).body[0]
+        self.assertIs(type(function), type(tree.body[0]))
+        self.assertEqual(function._kind, tree.body[0]._kind)
+        self.assertEqual(list(function._local_vars), ['i', 'y'])
+        self.assertEqual(type(function._returns), type(tree.body[0]._returns))
+        self.assertIs(function.resolved_returns, function.returns)
+
+    def test_comments_and_metadata(self):
+        tree = typed_ast3.parse('a = b + c')
+        tree.body[0].fortran_metadata = {'is_declaration': True, 'names': ('a',), 'flag': None}
+        tree.body.append(horast.nodes.Comment(value=typed_ast3.Str(' comment', ''), eol=False))
+        restored = deserialize_ast(serialize_ast(tree))
+        self.assertEqual(restored.body[0].fortran_metadata, tree.body[0].fortran_metadata)
+        self.assertIsInstance(restored.body[1], horast.nodes.Comment)
+        self.assertEqual(restored.body[1].value.s, ' comment')
+        self.assertFalse(restored.body[1].eol)
+
+    def test_bad_data(self):
+        data = serialize_ast(typed_ast3.parse('a = 1'))
+        header_size = struct.calcsize('<6sHB')
+        stale = data[:6] + struct.pack('<H', AST_FORMAT_VERSION + 1) + data[8:]
+        for bad_data in (b'', b'abcdefghijkl', stale, data[:header_size + 4]):
+            with self.subTest(data=bad_data):
+                with self.assertRaises(AstFormatError):
+                    deserialize_ast(bad_data)
+        self.assertTrue(issubclass(AstFormatError, ValueError))
+
+    def test_speed(self):
+        path = [_ for _ in EXAMPLES_FILES['python3'] if _.name == 'gemm.py'][0]
+        with open(str(path)) as example_file:
+            tree = st.augment(typed_ast3.parse(example_file.read() * 20), eval_=False)
+        with self.assertRaises((pickle.PicklingError, AttributeError, TypeError)):
+            pickle.dumps(tree)
+        repeats = 10
+
+        timer = time.perf_counter()
+        for _ in range(repeats):
+            deserialize_ast(serialize_ast(tree))
+        serialization_time = time.perf_counter() - timer
+
+        timer = time.perf_counter()
+        for _ in range(repeats):
+            copy.deepcopy(tree)
+        deepcopy_time = time.perf_counter() - timer
+
+        self.assertLess(serialization_time, deepcopy_time)
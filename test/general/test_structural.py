@@ -0,0 +1,92 @@
+"""Unit tests for structural hashing, comparison and copying of AST."""
+
+import copy
+import unittest
+
+import horast
+import static_typing as st
+import typed_ast.ast3 as typed_ast3
+
+from transpyle.pair import \
+    StructuralHasher, structural_hash, structurally_equal, clone, syntax_matches, dotted_name
+
+from test.common import EXAMPLES_FILES
+
+PAIRS = [
+    ('a + b', 'a + b', True),
+    ('a + b', 'a  +  b', True),
+    ('a + b', 'a - b', False),
+    ('a + b', 'b + a', False),
+    ('f(1)', 'f(1.0)', False),
+    ('f(1)', 'f(True)', False),
+    ('x[1:n]', 'x[1:n]', True),
+    ('x[1:n]', 'x[1:n:1]', False),
+    ('{a: 1, **b}', '{a: 1, **b}', True),
+    ('"abc"', "'abc'", True)]
+
+
+class Tests(unittest.TestCase):
+
+    def test_equal_and_hash(self):
+        hasher = StructuralHasher()
+        for code1, code2, equal in PAIRS:
+            syntax = typed_ast3.parse(code1, mode='eval').body
+            target = typed_ast3.parse(code2, mode='eval').body
+            with self.subTest(code1=code1, code2=code2):
+                self.assertEqual(typed_ast3.dump(syntax) == typed_ast3.dump(target), equal)
+                self.assertEqual(structurally_equal(syntax, target), equal)
+                self.assertEqual(syntax_matches(syntax, target), equal)
+                self.assertEqual(hasher.equal(syntax, target), equal)
+                if equal:
+                    self.assertEqual(structural_hash(syntax), structural_hash(target))
+
+    def test_clone_examples(self):
+        for path in EXAMPLES_FILES['python3']:
+            with open(str(path)) as example_file:
+                code = example_file.read()
+            for augmented in (False, True):
+                tree = typed_ast3.parse(code)
+                if augmented:
+                    tree = st.augment(tree, eval_=False)
+                with self.subTest(path=path, augmented=augmented):
+                    cloned = clone(tree)
+                    self.assertTrue(structurally_equal(cloned, tree))
+                    self.assertEqual(structural_hash(cloned), structural_hash(tree))
+                    self.assertEqual(typed_ast3.dump(cloned, include_attributes=True),
+                                     typed_ast3.dump(tree, include_attributes=True))
+                    original_ids = {id(_) for _ in typed_ast3.walk(tree)}
+                    self.assertFalse(any(id(_) in original_ids for _ in typed_ast3.walk(cloned)))
+
+    def test_clone_extras(self):
+        tree = st.augment(typed_ast3.parse(
+            'def f(x: int) -> int:\n    y = x  # type: int\n    return y\n'), eval_=False)
+        tree.body[0].body[0].fortran_metadata = {'is_declaration': True, 'names': ['y']}
+        cloned = clone(tree)
+        function = cloned.body[0]
+        self.assertIs(type(function), type(tree.body[0]))
+        self.assertIs(function.resolved_returns, function.returns)
+        original_nodes = {id(_) for _ in typed_ast3.walk(tree)}
+        cloned_nodes = {id(_) for _ in typed_ast3.walk(cloned)}
+        for name, declarations in function._local_vars.items():
+            original_declarations = tree.body[0]._local_vars[name]
+            for declaration, original in zip(declarations, original_declarations):
+                self.assertIsNot(declaration, original)
+                self.assertEqual(id(declaration) in cloned_nodes, id(original) in original_nodes)
+        metadata = function.body[0].fortran_metadata
+        self.assertEqual(metadata, tree.body[0].body[0].fortran_metadata)
+        self.assertIsNot(metadata, tree.body[0].body[0].fortran_metadata)
+
+    def test_clone_like_deepcopy(self):
+        tree = typed_ast3.parse('for i in range(n):\n    a[i] = b[i] * 2\n')
+        self.assertEqual(typed_ast3.dump(clone(tree), include_attributes=True),
+                         typed_ast3.dump(copy.deepcopy(tree), include_attributes=True))
+
+    def test_dotted_name(self):
+        for code in ('a', 'np.sqrt', 'Fortran.file_handles', 'a.b.c.d'):
+            with self.subTest(code=code):
+                syntax = typed_ast3.parse(code, mode='eval').body
+                self.assertEqual(dotted_name(syntax), code)
+                self.assertEqual(dotted_name(syntax), horast.unparse(syntax).strip())
+        for code in ('a[1]', 'a[1].b', 'f().b', '"a".b', '(a + b).c'):
+            with self.subTest(code=code):
+                self.assertIsNone(dotted_name(typed_ast3.parse(code, mode='eval').body))
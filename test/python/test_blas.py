@@ -0,0 +1,155 @@
+"""Unit tests for recognition and substitution of BLAS idioms."""
+
+import unittest
+
+import horast
+import numpy as np
+import static_typing as st
+import typed_ast.ast3 as typed_ast3
+
+from transpyle.general import Language, AutoTranslator, PassManager, load_transformation
+from transpyle.general.tools import find_blas_library
+from transpyle.fortran.compiler import BLAS_CALL
+from transpyle.python.blas import blas_idiom, array_ranks, BlasSubstitution
+import transpyle.fortran  # noqa: F401, pylint: disable=unused-import
+import transpyle.cpp  # noqa: F401, pylint: disable=unused-import
+
+IDIOMS = {
+    'for i in range(n):\n    s += x[i] * y[i]\n': 'dot',
+    'for i in range(n):\n    s -= 2 * x[i + 1] * a[i, j]\n': 'dot',
+    'for i in range(n):\n    y[i] += alpha * x[i]\n': 'axpy',
+    'for i in range(1, n):\n    y[i - 1] = y[i - 1] + x[i]\n': 'axpy',
+    'for p in range(n):\n    for k in range(m):\n        y[p] += a[p, k] * x[k]\n': 'gemv',
+    'for k in range(m):\n    for q in range(n):\n        y[q] += x[k] * a[k, q]\n': 'gemv',
+    'for k in range(m):\n    for q in range(n):\n        y[q] += a[k, q] * x[k]\n': 'gemv',
+    'for y in range(n):\n    for i in range(m):\n        for x in range(k):\n'
+    '            c[y, x] += a[y, i] * b[i, x]\n': 'gemm',
+    'for i in range(m):\n    for x in range(k):\n        for y in range(n):\n'
+    '            c[y, x] -= alpha * b[i, x] * beta * a[y, i]\n': 'gemm',
+    'for y in range(n):\n    for i in range(m):\n        for x in range(1, k, 2):\n'
+    '            c[y, x] += a[y, i] * b[i, x]\n': None,
+    'for y in range(n):\n    for i in range(m):\n        for x in range(k):\n'
+    '            c[y, x] += a[i, y] * b[i, x]\n': None,
+    'for y in range(n):\n    for i in range(m):\n        c[y] += a[y, i] * b[i, y]\n': None,
+    'for i in range(n):\n    s += x[i] * y[i] * z[i]\n': None,
+    'for i in range(n):\n    s += x[i] * f(y)\n': None,
+    'for i in range(n):\n    s *= x[i] * y[i]\n': None,
+    'for i in range(n):\n    y[i] += x[i] * y[i]\n': None,
+    'for i in range(n):\n    y[i] += x[2 * i]\n': None}
+
+KERNELS = '''def kernels(n: int, alpha: float, a: st.ndarray[2, np.double, (100, 100)],
+            b: st.ndarray[2, np.double, (100, 100)], c: st.ndarray[2, np.double, (100, 100)],
+            x: st.ndarray[1, np.double, (100,)], y: st.ndarray[1, np.double, (100,)]) -> float:
+    for p in range(n):  # type: int
+        for k in range(1, n):  # type: int
+            for q in range(n):  # type: int
+                c[p, q] += a[p, k] * b[k, q]
+    for p in range(n):  # type: int
+        for k in range(n):  # type: int
+            y[p] -= alpha * a[p, k] * x[k]
+    for q in range(n):  # type: int
+        for k in range(n):  # type: int
+            y[q] += x[k] * a[k + 1, q]
+    for i in range(2, n):  # type: int
+        x[i] += alpha * y[i - 1]
+    s = 0.0  # type: float
+    for i in range(n):  # type: int
+        s += x[i] * a[i, 3]
+    s += np.dot(x, y)
+    c += a @ b
+    return s
+'''
+
+
+def _run_kernels(code: str):
+    namespace = {'np': np, 'st': st}
+    exec(code, namespace)  # pylint: disable=exec-used
+    random = np.random.RandomState(0)
+    arrays = [random.rand(100, 100) for _ in range(3)] + [random.rand(100) for _ in range(2)]
+    return namespace['kernels'](50, 0.5, *arrays), arrays
+
+
+class Tests(unittest.TestCase):
+
+    def test_blas_idiom(self):
+        for code, kind in IDIOMS.items():
+            with self.subTest(code=code):
+                idiom = blas_idiom(typed_ast3.parse(code).body[0])
+                self.assertEqual(None if idiom is None else idiom.kind, kind)
+        idiom = blas_idiom(typed_ast3.parse(
+            'for i in range(m):\n    for x in range(k):\n        for y in range(n):\n'
+            '            c[y, x] -= alpha * b[i, x] * beta * a[y, i]\n').body[0])
+        self.assertEqual([horast.unparse(_).strip() for _ in idiom.operands],
+                         ['a[(y, i)]', 'b[(i, x)]'])
+        self.assertEqual([horast.unparse(_).strip() for _ in idiom.alpha], ['alpha', 'beta'])
+        self.assertTrue(idiom.subtracted)
+
+    def test_array_ranks(self):
+        function = typed_ast3.parse(KERNELS).body[0]
+        self.assertEqual(array_ranks(function), {'a': 2, 'b': 2, 'c': 2, 'x': 1, 'y': 1})
+
+    def test_substitution(self):
+        reference = _run_kernels(KERNELS)
+        code = horast.unparse(BlasSubstitution().apply(typed_ast3.parse(KERNELS)))
+        result = _run_kernels(code)
+        self.assertAlmostEqual(result[0], reference[0])
+        for array, reference_array in zip(result[1], reference[1]):
+            self.assertTrue(np.allclose(array, reference_array))
+        self.assertNotIn('for ', code)
+        for expected in ['c[0:n, 0:n] += np.matmul(a[0:n, 1:n], b[1:n, 0:n])\n',
+                         'y[0:n] -= (alpha * np.matmul(a[0:n, 0:n], x[0:n]))\n',
+                         'y[0:n] += np.matmul(x[0:n], a[1:(n + 1), 0:n])\n',
+                         'x[2:n] += (alpha * y[1:(n - 1)])\n',
+                         's += np.dot(x[0:n], a[0:n, 3])\n',
+                         'c += (a @ b)\n']:
+            self.assertIn(expected, code)
+        code = 'for i in range(n):\n    s += x[i] * y[i]\nprint(i)\n'
+        tree = BlasSubstitution().apply(typed_ast3.parse(code))
+        self.assertEqual(horast.unparse(tree), horast.unparse(typed_ast3.parse(code)))
+
+    def test_substitution_for_all_targets(self):
+        for language_name, expected in [
+                ('Fortran', [
+                    'c(0:(n - 1), 0:(n - 1)) = c(0:(n - 1), 0:(n - 1)) + matmul(a(0:(n - 1), ',
+                    'y(0:(n - 1)) = y(0:(n - 1)) + matmul(x(0:(n - 1)), a(1:n, 0:(n - 1)))\n',
+                    's = s + dot_product(x(0:(n - 1)), a(0:(n - 1), 3))\n',
+                    's = s + dot_product(x, y)\n',
+                    'c = c + matmul(a, b)\n']),
+                ('C++14', [
+                    '#include <cblas.h>\n',
+                    'cblas_dgemm(CblasRowMajor, CblasNoTrans, CblasNoTrans, n, n, (n - 1), 1.0, '
+                    '(a.data() + 1), a.shape()[1], (b.data() + b.shape()[1]), b.shape()[1], 1.0, '
+                    'c.data(), c.shape()[1]);',
+                    'cblas_dgemv(CblasRowMajor, CblasNoTrans, n, n, (- alpha), a.data(), '
+                    'a.shape()[1], x.data(), 1, 1.0, y.data(), 1);',
+                    'cblas_dgemv(CblasRowMajor, CblasTrans, n, n, 1.0, '
+                    '(a.data() + a.shape()[1]), a.shape()[1], x.data(), 1, 1.0, y.data(), 1);',
+                    'cblas_daxpy((n - 2), alpha, (y.data() + 1), 1, (x.data() + 2), 1);',
+                    's += cblas_ddot(n, x.data(), 1, (a.data() + 3), a.shape()[1]);',
+                    's += cblas_ddot(x.shape()[0], x.data(), 1, y.data(), 1);',
+                    'cblas_dgemm(CblasRowMajor, CblasNoTrans, CblasNoTrans, a.shape()[0], '
+                    'b.shape()[1], a.shape()[1], 1.0, a.data(), a.shape()[1], b.data(), '
+                    'b.shape()[1], 1.0, c.data(), c.shape()[1]);'])]:
+            pass_manager = PassManager([load_transformation(
+                'blas:target={!r}'.format(language_name))])
+            translator = AutoTranslator(Language.find('Python 3'), Language.find(language_name),
+                                        pass_manager=pass_manager)
+            with self.subTest(language_name=language_name):
+                code = translator.translate(KERNELS)
+                for snippet in expected:
+                    self.assertIn(snippet, code)
+                self.assertNotIn('do ', code)
+                self.assertNotIn('for (', code)
+
+    def test_detect_blas_calls(self):
+        for code, expected in [
+                ('call dgemm("N", "N", m, n, k, 1d0, a, m, b, k, 0d0, c, m)\n', True),
+                ('s = DDOT(n, x, 1, y, 1)\n', True), ('call zdotc (n, x, 1, y, 1)\n', True),
+                ('c = matmul(a, b)\n', False), ('s = dot_product(x, y)\n', False),
+                ('call mydgemm(a, b)\n', False)]:
+            with self.subTest(code=code):
+                self.assertEqual(BLAS_CALL.search(code) is not None, expected)
+
+    @unittest.skipIf(find_blas_library() is None, 'no BLAS library is installed')
+    def test_find_blas_library(self):
+        self.assertIn(find_blas_library(), ('openblas', 'blas'))
@@ -0,0 +1,176 @@
+"""Unit tests for affine analysis of loops and dependences."""
+
+import unittest
+
+import typed_ast.ast3 as typed_ast3
+
+from transpyle.python.dependence import \
+    AffineExpression, affine_expression, range_loop, perfect_loop_nest, forall_loop_nest, \
+    array_accesses, stride, dependence_directions, carries_dependences, is_fully_permutable, \
+    is_permutation_legal, is_fusion_legal, is_loop_parallel, reduction, loop_scalars
+
+GEMM = '''for y in range(n):
+    for i in range(k):
+        for x in range(1, m, 2):
+            c[y, x] += a[y, i] * b[i, x]
+'''
+
+DIRECTIONS = {
+    'a[i, j] = a[i - 1, j + 1] + 1': {('<', '>')},
+    'a[i, j] = a[i - 1, j - 1] + 1': {('<', '<')},
+    'a[i, j] = a[i, j] + b[j, i]': set(),
+    'a[i, j] = b[j, i]': set(),
+    'a[i] = a[i] + b[j]': {('=', '<')},
+    'a[2 * i] = a[2 * i + 1]': {('=', '<')},
+    'a[i + j] = a[i + j + 1]': {('<', '<'), ('<', '='), ('<', '>'), ('=', '<')},
+    'a[i, n] = a[i, n + 1] + a[i + 1, m]': {('<', '<'), ('<', '='), ('<', '>'), ('=', '<')}}
+
+
+def _nest_directions(code: str):
+    loops = perfect_loop_nest(typed_ast3.parse(code).body[0])
+    accesses = array_accesses(loops[-1].node.body)
+    if accesses is None:
+        return None
+    return dependence_directions(accesses, [_.variable for _ in loops])
+
+
+class Tests(unittest.TestCase):
+
+    def test_affine_expression(self):
+        for code, expected in [
+                ('i', AffineExpression({'i': 1})),
+                ('2 * i - (j - 3) + n', AffineExpression({'i': 2, 'j': -1, 'n': 1}, 3)),
+                ('-(i * 4) + +1', AffineExpression({'i': -4}, 1)),
+                ('i - i', AffineExpression()),
+                ('i * j', None), ('i / 2', None), ('f(i)', None), ('a[i]', None),
+                ('1.5', None)]:
+            with self.subTest(code=code):
+                self.assertEqual(affine_expression(typed_ast3.parse(code, mode='eval').body),
+                                 expected)
+
+    def test_range_loop(self):
+        for code, expected in [
+                ('for i in range(n): pass', ('i', 1)),
+                ('for i in range(1, n, 3): pass', ('i', 3)),
+                ('for i in range(n, 0, -1): pass', None),
+                ('for i in range(1, n, k): pass', None),
+                ('for i in x: pass', None),
+                ('for i, j in range(n): pass', None)]:
+            with self.subTest(code=code):
+                loop = range_loop(typed_ast3.parse(code).body[0])
+                self.assertEqual(None if loop is None else (loop.variable, loop.step), expected)
+
+    def test_perfect_loop_nest(self):
+        for code, expected in [
+                (GEMM, ['y', 'i', 'x']),
+                ('for i in range(n):\n    for j in range(i):\n        pass', ['i']),
+                ('for i in range(n):\n    for j in range(n):\n        pass\n    pass', ['i']),
+                ('for i in range(n):\n    for i in range(n):\n        pass', ['i'])]:
+            with self.subTest(code=code):
+                self.assertEqual([_.variable for _ in perfect_loop_nest(
+                    typed_ast3.parse(code).body[0])], expected)
+
+    def test_forall_loop_nest(self):
+        tree = typed_ast3.parse(GEMM)
+        self.assertEqual(forall_loop_nest(tree.body[0]), [])
+        tree.body[0].fortran_metadata = {'is_forall': True}
+        self.assertEqual([_.variable for _ in forall_loop_nest(tree.body[0])], ['y', 'i', 'x'])
+        tree.body[0].body[0].body[0].fortran_metadata = {'is_forall': True}
+        self.assertEqual([_.variable for _ in forall_loop_nest(tree.body[0])], ['y', 'i'])
+
+    def test_array_accesses(self):
+        accesses = array_accesses(perfect_loop_nest(typed_ast3.parse(GEMM).body[0])[-1].node.body)
+        self.assertEqual([(_.array, _.is_write) for _ in accesses],
+                         [('c', False), ('c', True), ('a', False), ('b', False)])
+        self.assertEqual(accesses[2].indices,
+                         (AffineExpression({'y': 1}), AffineExpression({'i': 1})))
+        for code in ['s = a[i]', 'a[i] = f(a[i])', 'a[i] = g(a)', 'a[i:j] = 0', 'x.y[i] = 0',
+                     'for j in range(n):\n    a[j] = 0', 'a[i] = a', 'a[i] = a.size']:
+            with self.subTest(code=code):
+                self.assertIsNone(array_accesses(typed_ast3.parse(code).body))
+        for code in ['if a[i] > 0:\n    a[i] = np.sqrt(abs(a[i]))\n', 'b[i] = a[i] + a.size']:
+            with self.subTest(code=code):
+                self.assertIsNotNone(array_accesses(typed_ast3.parse(code).body))
+
+    def test_stride(self):
+        accesses = array_accesses(typed_ast3.parse('a[i, j] = b[j, 2 * i] + c[i] + d[i, j * j]').body)
+        for variable, layout, expected in [
+                ('j', 'C', ['unit', 'strided', 'invariant', 'strided']),
+                ('i', 'C', ['strided', 'strided', 'unit', 'strided']),
+                ('i', 'F', ['unit', 'strided', 'unit', 'strided']),
+                ('k', 'F', ['invariant', 'invariant', 'invariant', 'strided'])]:
+            with self.subTest(variable=variable, layout=layout):
+                self.assertEqual([stride(_, variable, layout) for _ in accesses], expected)
+
+    def test_dependence_directions(self):
+        self.assertEqual(_nest_directions(GEMM), {('=', '<', '=')})
+        for statement, expected in DIRECTIONS.items():
+            code = 'for i in range(n):\n    for j in range(n):\n        {}\n'.format(statement)
+            with self.subTest(statement=statement):
+                self.assertEqual(_nest_directions(code), expected)
+
+    def test_carries_dependences(self):
+        for code, expected in [('a[i, j] = b[j, i]', False), ('a[i, j] = a[i, j] + 1', False),
+                               ('a[i, j] = a[i - 1, j + 1] + 1', True), ('a[i, j] = f(i)', True)]:
+            with self.subTest(code=code):
+                nest = 'for i in range(n):\n    for j in range(n):\n        {}\n'.format(code)
+                loops = perfect_loop_nest(typed_ast3.parse(nest).body[0])
+                self.assertEqual(carries_dependences(loops), expected)
+
+    def test_legality(self):
+        self.assertTrue(is_fully_permutable({('=', '<'), ('<', '=')}))
+        self.assertFalse(is_fully_permutable({('<', '>')}))
+        self.assertTrue(is_permutation_legal({('<', '<')}, [1, 0]))
+        self.assertFalse(is_permutation_legal({('<', '>')}, [1, 0]))
+        self.assertTrue(is_permutation_legal({('<', '>', '=')}, [0, 2, 1]))
+        self.assertFalse(is_permutation_legal({('=', '<', '>')}, [0, 2, 1]))
+
+    def test_fusion_legality(self):
+        for statement1, statement2, expected in [
+                ('a[i] = b[i]', 'c[i] = a[i]', True),
+                ('a[i] = b[i]', 'c[i] = a[i - 1]', True),
+                ('a[i] = b[i]', 'c[i] = a[i + 1]', False),
+                ('a[i] = b[i]', 'a[i - 1] = c[i]', True),
+                ('a[i] = b[i]', 'a[i + 1] = c[i]', False),
+                ('a[i] = b[i + 1]', 'b[i] = c[i]', True),
+                ('a[i] = b[i - 1]', 'b[i] = c[i]', False),
+                ('a[i] = b[i]', 'c[i] = b[i + 1]', True),
+                ('a[i] = b[i]', 'c[i] = a[n]', False),
+                ('a[i, j] = b[i, j]', 'c[i, j] = a[i - 1, j + 1]', True),
+                ('a[i, j] = b[i, j]', 'c[i, j] = a[i, j + 1]', False)]:
+            with self.subTest(statement1=statement1, statement2=statement2):
+                self.assertEqual(is_fusion_legal(
+                    array_accesses(typed_ast3.parse(statement1).body),
+                    array_accesses(typed_ast3.parse(statement2).body),
+                    ['i', 'j'] if 'j' in statement1 else ['i']), expected)
+
+    def test_parallel(self):
+        self.assertTrue(is_loop_parallel({('=', '<', '=')}, 0))
+        self.assertFalse(is_loop_parallel({('=', '<', '=')}, 1))
+        self.assertTrue(is_loop_parallel({('=', '<', '=')}, 2))
+        self.assertFalse(is_loop_parallel({('<', '>')}, 0))
+        self.assertTrue(is_loop_parallel({('<', '>')}, 1))
+
+    def test_reduction(self):
+        for code, expected in [
+                ('s += a[i]', ('s', '+')), ('s -= a[i] * 2', ('s', '+')),
+                ('s = s * a[i]', ('s', '*')), ('s = a[i] * s', ('s', '*')),
+                ('s = s - a[i]', ('s', '+')), ('s = max(s, a[i])', ('s', 'max')),
+                ('s = min(a[i], s)', ('s', 'min')),
+                ('s = a[i] - s', None), ('s += s', None), ('s = s / a[i]', None),
+                ('s = f(s, a[i])', None), ('a[i] += 1', None), ('s = a[i]', None)]:
+            with self.subTest(code=code):
+                self.assertEqual(reduction(typed_ast3.parse(code).body[0]), expected)
+
+    def test_loop_scalars(self):
+        for code, expected in [
+                ('a[i] = b[i]', (set(), {})),
+                ('t = a[i]\nb[i] = t * t\ns += t', ({'t'}, {'s': '+'})),
+                ('s += a[i]\nif a[i] > 0:\n    p = p * a[i]', (set(), {'s': '+', 'p': '*'})),
+                ('t = a[i]\nt += 1\nm = max(m, t)', ({'t'}, {'m': 'max'})),
+                ('b[i] = t\nt = a[i]', None), ('t += a[i]\nt = t * 2', None),
+                ('s += a[i]\nb[i] = s', None), ('if a[i] > 0:\n    t = 1\nb[i] = t', None),
+                ('s += a[i]\ns *= 2', None)]:
+            with self.subTest(code=code):
+                scalars = loop_scalars(typed_ast3.parse(code).body)
+                self.assertEqual(None if scalars is None else tuple(scalars), expected)
@@ -0,0 +1,355 @@
+"""Unit tests for transformations of loop nests."""
+
+import typing as t
+import unittest
+
+import horast
+import horast.nodes as horast_nodes
+import numpy as np
+import static_typing as st
+import typed_ast.ast3 as typed_ast3
+
+from transpyle.general import Language, AutoTranslator, PassManager, load_transformation
+from transpyle.python.loop_transformations import \
+    LoopTiling, LoopInterchange, LoopUnrolling, LoopFusion, LoopDistribution, LoopParallelization, \
+    ReductionSubstitution
+import transpyle.fortran  # noqa: F401, pylint: disable=unused-import
+import transpyle.cpp  # noqa: F401, pylint: disable=unused-import
+
+GEMM = '''def gemm(n: int, a: st.ndarray[2, np.double, (10, 10)], b: st.ndarray[2, np.double, (10, 10)],
+         c: st.ndarray[2, np.double, (10, 10)]) -> None:
+    for y in range(n):  # type: int
+        for i in range(n):  # type: int
+            for x in range(1, n, 2):  # type: int
+                c[y, x] += a[y, i] * b[i, x]
+'''
+
+SKEWED = '''def skewed(n, a):
+    for i in range(1, n):
+        for j in range(1, n - 1):
+            a[i, j] = a[i - 1, j + 1] + 1
+'''
+
+TRANSPOSED = '''def transposed(n, a, b):
+    for j in range(1, n):
+        for i in range(1, n):
+            a[i, j] = a[i - 1, j - 1] + b[j, i]
+'''
+
+STREAMS = '''def streams(n, a, b, c, d):
+    for i in range(1, n):
+        for j in range(n):
+            b[i, j] = a[i, j] * 2
+    for i in range(1, n):
+        for j in range(n):
+            c[i, j] = b[i - 1, j] + a[i, j]
+    for i in range(1, n):
+        for j in range(n):
+            d[i, j] = c[i, j] - b[i + 1, j]
+'''
+
+KERNELS = '''def kernels(n: int, a: st.ndarray[1, np.double, (100,)],
+            b: st.ndarray[2, np.double, (100, 100)]) -> float:
+    s = 0.0  # type: float
+    t = 0.0  # type: float
+    for i in range(n):  # type: int
+        t = a[i] * 2.0
+        s += t * a[i]
+    for i in range(1, n):  # type: int
+        for j in range(n):  # type: int
+            b[i, j] = b[i - 1, j] + a[j]
+    for i in range(1, n):  # type: int
+        u = a[i] + 1
+        a[i] = a[i - 1] * u
+    return s + t
+'''
+
+REDUCTIONS = '''def reductions(n: int, a: st.ndarray[1, np.double, (100,)],
+               b: st.ndarray[2, np.double, (100, 100)], c: st.ndarray[1, np.double, (100,)]
+               ) -> float:
+    s = 0.0  # type: float
+    for i in range(n):  # type: int
+        s += a[i]
+    m = a[0]  # type: float
+    for i in range(1, n):  # type: int
+        m = max(m, abs(a[i] - 2.0))
+    p = 1.0  # type: float
+    for i in range(1, 9, 2):  # type: int
+        p = p * a[i + 1]
+    for y in range(n):  # type: int
+        for i in range(n):  # type: int
+            c[y] += b[y, i] * a[i]
+    return s + m + p
+'''
+
+
+def _run_streams(code: str) -> np.ndarray:
+    namespace = {}
+    exec(code, namespace)  # pylint: disable=exec-used
+    arrays = [np.arange(64, dtype=np.double).reshape((8, 8)) * (_ + 1) for _ in range(4)]
+    namespace['streams'](7, *arrays)
+    return np.array(arrays)
+
+
+def _with_directive(code: str, directive: str, *path: int) -> typed_ast3.Module:
+    """Parse code and insert a directive comment before the loop found via given path."""
+    tree = typed_ast3.parse(code)
+    body = tree.body[0].body
+    for index in path[:-1]:
+        body = body[index].body
+    body.insert(path[-1], horast_nodes.Comment(value=typed_ast3.Str(directive, ''), eol=False))
+    return tree
+
+
+def _run_gemm(code: str) -> np.ndarray:
+    namespace = {'np': np, 'st': st}
+    exec(code, namespace)  # pylint: disable=exec-used
+    a = np.arange(100, dtype=np.double).reshape((10, 10))
+    c = np.ones((10, 10))
+    namespace['gemm'](10, a, a.T.copy(), c)
+    return c
+
+
+def _run_reductions(code: str) -> t.Tuple[float, np.ndarray]:
+    namespace = {'np': np, 'st': st}
+    exec(code, namespace)  # pylint: disable=exec-used
+    a = np.linspace(-5.0, 5.0, 100)
+    c = np.ones(100)
+    return namespace['reductions'](50, a, np.arange(10000.0).reshape((100, 100)), c), c
+
+
+class Tests(unittest.TestCase):
+
+    def test_tiling(self):
+        reference = _run_gemm(horast.unparse(typed_ast3.parse(GEMM)))
+        for config, loop_variables in [
+                ({}, ['y_tile', 'i_tile', 'y', 'i', 'x']),
+                ({'layout': 'F'}, ['y_tile', 'i_tile', 'x_tile', 'y', 'i', 'x']),
+                ({'tile_sizes': 4}, ['y_tile', 'i_tile', 'x_tile', 'y', 'i', 'x']),
+                ({'tile_sizes': (3, 1, 4)}, ['y_tile', 'x_tile', 'y', 'i', 'x']),
+                ({'tile_sizes': (1, 1, 1)}, ['y', 'i', 'x']),
+                ({'tile_sizes': 16}, ['y_tile', 'i_tile', 'x_tile', 'y', 'i', 'x'])]:
+            with self.subTest(config=config):
+                tree = LoopTiling(**config).apply(typed_ast3.parse(GEMM))
+                code = horast.unparse(tree)
+                self.assertTrue(np.array_equal(_run_gemm(code), reference))
+                self.assertEqual([_.target.id for _ in typed_ast3.walk(tree)
+                                  if isinstance(_, typed_ast3.For)], loop_variables)
+        code = horast.unparse(LoopTiling((3, 1, 4)).apply(typed_ast3.parse(GEMM)))
+        self.assertIn('for y_tile in range(0, n, 3):', code)
+        self.assertIn('for x in range(x_tile, min((x_tile + 8), n), 2):', code)
+
+    def test_no_tiling_with_dependences(self):
+        code = horast.unparse(typed_ast3.parse(SKEWED))
+        tree = LoopTiling(4).apply(typed_ast3.parse(SKEWED))
+        self.assertEqual(horast.unparse(tree), code)
+
+    def test_tiling_for_all_targets(self):
+        pass_manager = PassManager([load_transformation('tile:tile_sizes=32')])
+        for language_name, expected in [('Python 3', 'for y_tile in range(0, n, 32):'),
+                                        ('Fortran', 'do y_tile = 0, (n - 1), 32'),
+                                        ('C++14', 'y_tile += 32;')]:
+            with self.subTest(language_name=language_name):
+                translator = AutoTranslator(Language.find('Python 3'),
+                                            Language.find(language_name),
+                                            pass_manager=pass_manager)
+                code = translator.translate(GEMM)
+                self.assertIn(expected, code)
+                self.assertIn('min(', code)
+                if language_name == 'Fortran':
+                    self.assertIn(':: y_tile', code)
+
+    def test_interchange(self):
+        reference = _run_gemm(horast.unparse(typed_ast3.parse(GEMM)))
+        for layout, gemm_order, transposed_order in [
+                ('C', ['y', 'i', 'x'], ['i', 'j']), ('F', ['x', 'i', 'y'], ['j', 'i']),
+                ('Fortran', ['x', 'i', 'y'], ['j', 'i']), ('C++14', ['y', 'i', 'x'], ['i', 'j'])]:
+            with self.subTest(layout=layout):
+                tree = LoopInterchange(layout).apply(typed_ast3.parse(GEMM))
+                self.assertEqual([_.target.id for _ in typed_ast3.walk(tree)
+                                  if isinstance(_, typed_ast3.For)], gemm_order)
+                self.assertTrue(np.array_equal(_run_gemm(horast.unparse(tree)), reference))
+                tree = LoopInterchange(layout).apply(typed_ast3.parse(TRANSPOSED))
+                self.assertEqual([_.target.id for _ in typed_ast3.walk(tree)
+                                  if isinstance(_, typed_ast3.For)], transposed_order)
+        code = horast.unparse(typed_ast3.parse(SKEWED))
+        for layout in ('C', 'F'):
+            with self.subTest(layout=layout):
+                tree = LoopInterchange(layout).apply(typed_ast3.parse(SKEWED))
+                self.assertEqual(horast.unparse(tree), code)
+        with self.assertRaises(ValueError):
+            LoopInterchange('no such language')
+
+    def test_unrolling(self):
+        reference = _run_gemm(horast.unparse(typed_ast3.parse(GEMM)))
+        for factor, unrolled, remainder in [
+                (2, 'range(1, (1 + ((max(n, 0) // 4) * 4)), 4)', True),
+                (3, 'range(1, (1 + ((max(n, 0) // 6) * 6)), 6)', True),
+                (5, 'range(1, (1 + ((max(n, 0) // 10) * 10)), 10)', True),
+                (1, 'range(1, n, 2)', False)]:
+            for tree in (LoopUnrolling(factor).apply(typed_ast3.parse(GEMM)),
+                         LoopUnrolling().apply(_with_directive(
+                             GEMM, ' transpyle: unroll({})'.format(factor), 0, 0, 0))):
+                with self.subTest(factor=factor):
+                    code = horast.unparse(tree)
+                    self.assertTrue(np.array_equal(_run_gemm(code), reference))
+                    self.assertIn('for x in {}:'.format(unrolled), code)
+                    self.assertEqual(code.count('c[(y, (x + 2))]'), 1 if factor > 1 else 0)
+                    self.assertEqual(code.count('for x in '), 2 if remainder else 1)
+                    self.assertNotIn('transpyle:', code)
+        code = horast.unparse(LoopUnrolling(2).apply(typed_ast3.parse(
+            'for i in range(2, 11, 3):\n    a[i] = i\n')))
+        self.assertIn('for i in range(2, 8, 6):', code)
+        self.assertIn('for i in range(8, 11, 3):', code)
+        code = horast.unparse(LoopUnrolling(3).apply(typed_ast3.parse(
+            'for i in range(2, 11, 3):\n    a[i] = i\n')))
+        self.assertIn('for i in range(2, 11, 9):', code)
+        self.assertNotIn('for i in range(11, 11, 3):', code)
+        code = horast.unparse(typed_ast3.parse('for i in range(2, 11, 3):\n    a[i] = i\n'))
+        self.assertEqual(horast.unparse(LoopUnrolling(4).apply(typed_ast3.parse(code))), code)
+        code = horast.unparse(typed_ast3.parse(
+            'for i in range(n):\n    if a[i]:\n        break\n'))
+        self.assertEqual(horast.unparse(LoopUnrolling(4).apply(typed_ast3.parse(code))), code)
+        with self.assertRaises(ValueError):
+            LoopUnrolling(0)
+
+    def test_unroll_and_jam(self):
+        reference = _run_gemm(horast.unparse(typed_ast3.parse(GEMM)))
+        for tree in (LoopUnrolling(2, jam=True).apply(typed_ast3.parse(GEMM)),
+                     LoopUnrolling().apply(_with_directive(
+                         GEMM, ' transpyle: unroll_and_jam(2)', 0))):
+            with self.subTest(tree=tree):
+                code = horast.unparse(tree)
+                self.assertTrue(np.array_equal(_run_gemm(code), reference))
+                self.assertEqual([_.target.id for _ in typed_ast3.walk(tree)
+                                  if isinstance(_, typed_ast3.For)], ['y', 'y', 'i', 'i', 'x', 'x'])
+                self.assertIn('c[((y + 1), x)] += (a[((y + 1), i)] * b[(i, x)])', code)
+        code = horast.unparse(typed_ast3.parse(SKEWED))
+        tree = LoopUnrolling().apply(_with_directive(SKEWED, ' transpyle: unroll_and_jam(2)', 0))
+        self.assertEqual(horast.unparse(tree), code)
+        tree = LoopUnrolling().apply(_with_directive(SKEWED, ' transpyle: unroll(2)', 0))
+        self.assertEqual([_.target.id for _ in typed_ast3.walk(tree)
+                          if isinstance(_, typed_ast3.For)], ['i', 'i', 'j', 'j', 'j'])
+
+    def test_unrolling_for_all_targets(self):
+        pass_manager = PassManager([load_transformation('unroll:factor=4')])
+        for language_name, expected in [('Python 3', 'c[(y, (x + 6))]'),
+                                        ('Fortran', 'c(y, (x + 6))'),
+                                        ('C++14', 'c[(y, (x + 6))]')]:
+            with self.subTest(language_name=language_name):
+                translator = AutoTranslator(Language.find('Python 3'),
+                                            Language.find(language_name),
+                                            pass_manager=pass_manager)
+                code = translator.translate(GEMM)
+                self.assertIn(expected, code)
+                self.assertIn('max(', code)
+
+    def test_fusion(self):
+        reference = _run_streams(STREAMS)
+        tree = LoopFusion().apply(typed_ast3.parse(STREAMS))
+        code = horast.unparse(tree)
+        self.assertTrue(np.array_equal(_run_streams(code), reference))
+        self.assertEqual([_.target.id for _ in typed_ast3.walk(tree)
+                          if isinstance(_, typed_ast3.For)], ['i', 'i', 'j', 'j'])
+        self.assertIn('c[(i, j)] = (b[((i - 1), j)] + a[(i, j)])\n'
+                      '    for i in range(1, n):', code)
+        for code in ['for i in range(n):\n    a[i] = 1\nfor i in range(1, n):\n    b[i] = 1\n',
+                     'for i in range(n):\n    a[i] = 1\nfor j in range(n):\n    b[j] = 1\n',
+                     'for i in range(n):\n    a[i] = 1\nx = 1\nfor i in range(n):\n    b[i] = 1\n',
+                     'for i in range(n):\n    s = a[i]\nfor i in range(n):\n    b[i] = s\n',
+                     'for i in range(n):\n    a[i] = 1\nfor i in range(a[0]):\n    b[i] = 1\n']:
+            with self.subTest(code=code):
+                code = horast.unparse(typed_ast3.parse(code))
+                tree = LoopFusion().apply(typed_ast3.parse(code))
+                self.assertEqual(horast.unparse(tree), code)
+
+    def test_distribution(self):
+        fused = LoopFusion().apply(typed_ast3.parse(STREAMS))
+        reference = _run_streams(STREAMS)
+        tree = LoopDistribution().apply(fused)
+        self.assertTrue(np.array_equal(_run_streams(horast.unparse(tree)), reference))
+        self.assertEqual([_.target.id for _ in typed_ast3.walk(tree)
+                          if isinstance(_, typed_ast3.For)], ['i', 'i', 'i', 'j', 'j', 'j'])
+        code = horast.unparse(typed_ast3.parse(SKEWED))
+        self.assertEqual(horast.unparse(LoopDistribution().apply(typed_ast3.parse(SKEWED))), code)
+        tree = typed_ast3.parse('for i in range(1, n):\n    a[i] = b[i]\n    b[i + 1] = c[i]\n'
+                                '    c[i] = a[i]\n')
+        tree.body[0].body.insert(2, horast_nodes.Comment(value=typed_ast3.Str(' c', ''), eol=False))
+        code = horast.unparse(LoopDistribution().apply(tree))
+        self.assertEqual(code.count('for i in'), 2)
+        self.assertIn('    b[(i + 1)] = c[i]\nfor i in range(1, n):\n    # c\n    c[i] = a[i]',
+                      code)
+        pass_manager = PassManager([load_transformation('fuse')])
+        translator = AutoTranslator(Language.find('Python 3'), Language.find('Fortran'),
+                                    pass_manager=pass_manager)
+        self.assertEqual(translator.translate(STREAMS).count('do i = '), 2)
+
+    def test_parallelization(self):
+        tree = LoopParallelization().apply(typed_ast3.parse(GEMM))
+        self.assertIn('    #pragma omp parallel for\n    for y in range(n):', horast.unparse(tree))
+        code = horast.unparse(LoopParallelization().apply(typed_ast3.parse(KERNELS)))
+        self.assertIn('    #pragma omp parallel for lastprivate(t) reduction(+:s)\n'
+                      '    for i in range(n):', code)
+        self.assertIn('        #pragma omp parallel for\n        for j in range(n):', code)
+        self.assertEqual(code.count('#pragma omp'), 2)
+        tree = typed_ast3.parse(GEMM)
+        tree.body[0].body[0].body.insert(
+            0, horast_nodes.Comment(value=typed_ast3.Str('pragma omp for', ''), eol=False))
+        tree = LoopParallelization().apply(tree)
+        self.assertEqual(horast.unparse(tree).count('#pragma omp'), 1)
+        pass_manager = PassManager([load_transformation('openmp')])
+        for language_name, expected in [
+                ('Python 3', '#pragma omp parallel for lastprivate(t) reduction(+:s)\n'),
+                ('Fortran', '!$omp parallel do lastprivate(t) reduction(+:s)\n  do i = 0'),
+                ('C++14', '#pragma omp parallel for lastprivate(t) reduction(+:s)\n')]:
+            with self.subTest(language_name=language_name):
+                translator = AutoTranslator(Language.find('Python 3'),
+                                            Language.find(language_name),
+                                            pass_manager=pass_manager)
+                self.assertIn(expected, translator.translate(KERNELS))
+
+    def test_reduction_substitution(self):
+        reference = _run_reductions(REDUCTIONS)
+        code = horast.unparse(ReductionSubstitution().apply(typed_ast3.parse(REDUCTIONS)))
+        result = _run_reductions(code)
+        self.assertAlmostEqual(result[0], reference[0])
+        self.assertTrue(np.allclose(result[1], reference[1]))
+        self.assertEqual(code.count('for '), 1)
+        self.assertTrue(code.lstrip().startswith('import numpy as np\n'))
+        for expected in ['s += np.sum(a[0:n])\n',
+                         'if (n > 1):\n        m = max(m, np.max(abs((a[1:n] - 2.0))))\n',
+                         'p *= np.prod(a[2:10:2])\n',
+                         'c[y] += np.dot(b[y, 0:n], a[0:n])\n']:
+            self.assertIn(expected, code)
+        for code in ['for i in range(n):\n    s += a[2 * i]\n',
+                     'for i in range(n):\n    s += s * a[i]\n',
+                     'for i in range(n):\n    s += a[i]\nprint(i)\n',
+                     'for i in range(n):\n    s = a[i]\n',
+                     'for i in range(n):\n    a[i] += b[i]\n',
+                     'for i in range(n):\n    s += a[i, i]\n',
+                     'for i in range(n):\n    s += f(a[i])\n']:
+            with self.subTest(code=code):
+                code = horast.unparse(typed_ast3.parse(code))
+                tree = ReductionSubstitution().apply(typed_ast3.parse(code))
+                self.assertEqual(horast.unparse(tree), code)
+
+    def test_reduction_substitution_for_all_targets(self):
+        for language_name, expected in [
+                ('Fortran', ['s = s + sum(a(0:(n - 1)))\n',
+                             'm = max(m, maxval(abs((a(1:(n - 1)) - 2.0))))\n',
+                             'p = p * product(a(2:9:2))\n',
+                             'c(y) = c(y) + dot_product(b(y, 0:(n - 1)), a(0:(n - 1)))\n']),
+                ('C++14', ['#pragma omp simd reduction(+:s)\n',
+                           '#pragma omp simd reduction(max:m)\n',
+                           '#pragma omp simd reduction(*:p)\n'])]:
+            pass_manager = PassManager([load_transformation(
+                'reduce:target={!r}'.format(language_name))])
+            translator = AutoTranslator(Language.find('Python 3'), Language.find(language_name),
+                                        pass_manager=pass_manager)
+            with self.subTest(language_name=language_name):
+                code = translator.translate(REDUCTIONS)
+                for snippet in expected:
+                    self.assertIn(snippet, code)
+                self.assertEqual(code.count('pragma omp'), 3 if language_name == 'C++14' else 0)
+        with self.assertRaises(ValueError):
+            ReductionSubstitution('Cobol')
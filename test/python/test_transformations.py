@@ -1,16 +1,21 @@
 """Testing the AST transformations."""
 
 import contextlib
+import linecache
 import logging
 import os
+import tempfile
+import time
 import types
 import unittest
 
 import horast
+import typed_ast.ast3 as typed_ast3
 import typed_astunparse
 import static_typing as st
 
 from transpyle.general import CodeReader, Language, Parser
+import transpyle.python.transformations
 from transpyle.python.transformations import inline_syntax, inline
 
 from test.examples_inlining import \
@@ -18,7 +23,8 @@ from test.examples_inlining import \
     just_return, return_me, just_return_inlined, \
     just_assign, just_assign_inlined, \
     print_and_get_absolute, absolute_value, print_and_get_absolute_inlined, \
-    inline_oneliner, add_squares, inline_oneliner_inlined
+    inline_oneliner, add_squares, inline_oneliner_inlined, \
+    swapped_difference, difference, swapped_difference_inlined
 
 _LOG = logging.getLogger(__name__)
 
@@ -27,7 +33,8 @@ INLINING_EXAMPLES = {
     (just_return, return_me): just_return_inlined,
     (just_assign, return_me): just_assign_inlined,
     (print_and_get_absolute, absolute_value): print_and_get_absolute_inlined,
-    (inline_oneliner, add_squares): inline_oneliner_inlined}
+    (inline_oneliner, add_squares): inline_oneliner_inlined,
+    (swapped_difference, difference): swapped_difference_inlined}
 
 
 class Tests(unittest.TestCase):
@@ -65,3 +72,65 @@ class Tests(unittest.TestCase):
             with self.subTest(target=target, inlined=inlined):
                 target_inlined_ = inline(target, inlined)
                 self.assertIsInstance(target_inlined_, types.FunctionType)
+
+    def test_inline_in_memory(self):
+        temporary_files = set(os.listdir(tempfile.gettempdir()))
+        target_inlined = inline(just_return, return_me)
+        self.assertEqual(set(os.listdir(tempfile.gettempdir())), temporary_files)
+        self.assertIs(inline(just_return, return_me), target_inlined)
+        self.assertIsNot(inline(just_return, return_me, globals_={}), target_inlined)
+        self.assertEqual(CodeReader.read_function(target_inlined).lstrip(),
+                         CodeReader.read_function(just_return_inlined).replace('_inlined(', '(')
+                         .lstrip())
+
+    def test_inline_cache_size(self):
+        cache_size = transpyle.python.transformations.INLINED_FUNCTIONS_CACHE_SIZE
+        transpyle.python.transformations.INLINED_FUNCTIONS_CACHE_SIZE = 1
+        transpyle.python.transformations._INLINED_FUNCTIONS.clear()
+        try:
+            target_inlined = inline(just_return, return_me)
+            self.assertIs(inline(just_return, return_me), target_inlined)
+            inline(print_and_get_absolute, absolute_value)
+            self.assertEqual(len(transpyle.python.transformations._INLINED_FUNCTIONS), 1)
+            self.assertIsNot(inline(just_return, return_me), target_inlined)
+        finally:
+            transpyle.python.transformations.INLINED_FUNCTIONS_CACHE_SIZE = cache_size
+
+    def test_inline_cache_linecache(self):
+        def inlined_filenames():
+            return [_ for _ in linecache.cache if _.startswith('<inlined ')]
+
+        cache_size = transpyle.python.transformations.INLINED_FUNCTIONS_CACHE_SIZE
+        transpyle.python.transformations.INLINED_FUNCTIONS_CACHE_SIZE = 2
+        transpyle.python.transformations._INLINED_FUNCTIONS.clear()
+        for filename in inlined_filenames():
+            del linecache.cache[filename]
+        try:
+            for i in range(5):
+                inline(just_return, return_me, {'i': i})
+                inline(print_and_get_absolute, absolute_value, {'i': i})
+                self.assertEqual(len(inlined_filenames()), 2)
+            target_inlined = inline(just_return, return_me)
+            self.assertEqual(len(inlined_filenames()), 2)
+            self.assertIn(target_inlined.__code__.co_filename, linecache.cache)
+        finally:
+            transpyle.python.transformations.INLINED_FUNCTIONS_CACHE_SIZE = cache_size
+
+    def test_inline_many_call_sites(self):
+        body = '\n'.join('    y{} = x * {} + z[{}] - y{}'.format(i, i, i, i - 1) for i in range(1, 40))
+        inlined_code = 'def inlined(x, z):\n    y0 = x\n{}\n    return y39\n'.format(body)
+        durations = {}
+        for count in (25, 200):
+            target_code = 'def target(a, b):\n{}\n    return c0\n'.format('\n'.join(
+                '    c{} = inlined(a[{}], b)'.format(i, i) for i in range(count)))
+            timer = time.perf_counter()
+            target_inlined_syntax = inline_syntax(
+                typed_ast3.parse(target_code).body[0], typed_ast3.parse(inlined_code).body[0],
+                verbose=False)
+            durations[count] = (time.perf_counter() - timer) / count
+            self.assertEqual(len(target_inlined_syntax.body), count * 41 + 1)
+            assignments = [_ for _ in target_inlined_syntax.body if isinstance(_, typed_ast3.Assign)]
+            self.assertEqual(horast.unparse(assignments[41 * 7 - 1]).strip(), 'c6 = y39')
+            self.assertEqual(horast.unparse(assignments[41 * 7 + 1]).strip(),
+                             'y1 = (((a[7] * 1) + b[1]) - y0)')
+        self.assertLess(durations[200], 3 * durations[25])
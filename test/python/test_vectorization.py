@@ -0,0 +1,174 @@
+"""Unit tests for vectorization of loop nests into operations on NumPy arrays."""
+
+import math
+import unittest
+
+import horast
+import numpy as np
+import static_typing as st
+import typed_ast.ast3 as typed_ast3
+
+from transpyle.general import Language, Unparser, load_transformation
+from transpyle.python.vectorization import section_axes, LoopVectorization
+import transpyle.fortran  # noqa: F401, pylint: disable=unused-import
+import transpyle.cpp  # noqa: F401, pylint: disable=unused-import
+
+KERNELS = '''def kernels(n: int, m: int, a: st.ndarray[2, np.double, (50, 50)],
+            b: st.ndarray[2, np.double, (50, 50)], x: st.ndarray[1, np.double, (50,)],
+            y: st.ndarray[1, np.double, (50,)], z: st.ndarray[1, np.double, (50,)]) -> float:
+    for i in range(n):  # type: int
+        for j in range(m):  # type: int
+            a[i, j] = 2.0 * b[i, j] + x[j]
+    for j in range(m):  # type: int
+        for i in range(n):  # type: int
+            b[i, j] = a[j, i] * y[i] + i
+    for i in range(1, n):  # type: int
+        x[i] = x[i - 1] + y[i]
+    for i in range(n):  # type: int
+        y[i] = y[i + 1] * 0.5
+    for i in range(n):  # type: int
+        if x[i] > 0.5 and not y[i] > 0.9:
+            z[i] = math.sqrt(x[i]) + abs(y[i])
+        else:
+            z[i] -= 1.0
+    for i in range(n):  # type: int
+        t = x[i] * 2.0  # type: float
+        z[i] = max(t, y[i])
+    s = 0.0  # type: float
+    for i in range(n):  # type: int
+        s += x[i] * z[i]
+    for i in range(1, n):  # type: int
+        for j in range(m):  # type: int
+            a[i, j] = a[i - 1, j] + 1.0
+    return s
+'''
+
+NOT_VECTORIZED = [
+    'for i in range(1, n):\n    x[i] = x[i - 1] * 2\n',
+    'for i in range(n):\n    x[i] = y[i]\n    y[i + 1] = 0\n',
+    'for i in range(n):\n    x[i] = f(y[i])\n',
+    'for i in range(n):\n    x[i] = y[i]\nprint(i)\n',
+    'for i in range(n):\n    t = y[i]\n    x[i] = t\nprint(t)\n',
+    'for i in range(n):\n    for j in range(n):\n        x[i] = a[i, j]\n',
+    'for i in range(n):\n    x[i] = y[2 * i]\n',
+    'for i in range(n):\n    x[i] = y[idx[i]]\n']
+
+
+FORALLS = '''def foralls(n: int, a: st.ndarray[2, np.double, (50, 50)],
+            x: st.ndarray[1, np.double, (50,)], y: st.ndarray[1, np.double, (50,)]) -> None:
+    for i in range(n):  # type: int
+        for j in range(n):  # type: int
+            a[i, j] = x[i] * y[j]
+    for i in range(1, n):  # type: int
+        x[i] = x[i - 1] + 1.0
+    y[0:n] = np.where(x[0:n] > 0.5, x[0:n], y[0:n])
+    y[0:n] = np.where(x[0:n] > 0.5, y[0:n], 2 * x[0:n])
+    x[0:n] = np.where(x[0:n] > 0.5, 1.0, 0.0)
+    y = np.where(x > 0.5, 0.0, y)
+    n = np.where(n > 0, n, 1)
+'''
+
+
+def _run_kernels(code: str):
+    namespace = {'np': np, 'st': st, 'math': math}
+    exec(code, namespace)  # pylint: disable=exec-used
+    random = np.random.RandomState(0)
+    arrays = [random.rand(50, 50) for _ in range(2)] + [random.rand(50) for _ in range(3)]
+    return namespace['kernels'](40, 30, *arrays), arrays
+
+
+class Tests(unittest.TestCase):
+
+    def test_section_axes(self):
+        for code, axes in [('a[i, j]', ['i', 'j']), ('a[j + 1, k, i]', ['j', 'i']),
+                           ('a[2, n]', [])]:
+            with self.subTest(code=code):
+                subscript = typed_ast3.parse(code, mode='eval').body
+                self.assertEqual(section_axes(subscript, ['i', 'j']), axes)
+
+    def test_vectorization(self):
+        reference = _run_kernels(KERNELS)
+        code = horast.unparse(LoopVectorization().apply(typed_ast3.parse(KERNELS)))
+        result = _run_kernels(code)
+        self.assertAlmostEqual(result[0], reference[0])
+        for array, reference_array in zip(result[1], reference[1]):
+            self.assertTrue(np.allclose(array, reference_array))
+        self.assertTrue(code.lstrip().startswith('import numpy as np\n'))
+        self.assertEqual(code.count('for '), 2)
+        for expected in [
+                'a[0:n, 0:m] = ((2.0 * b[0:n, 0:m]) + x[0:m])\n',
+                'b[0:n, 0:m] = ((np.transpose(a[0:m, 0:n]) * y[0:n][:, None])'
+                ' + np.arange(0, n)[:, None])\n',
+                '    for i in range(1, n):\n        x[i] = (x[(i - 1)] + y[i])\n',
+                'y[0:n] = (y[1:(n + 1)] * 0.5)\n',
+                'mask = np.logical_and((x[0:n] > 0.5), np.logical_not((y[0:n] > 0.9)))\n',
+                'z[0:n] = np.where(mask, (np.sqrt(x[0:n]) + np.abs(y[0:n])), z[0:n])\n',
+                'z[0:n] = np.where(mask, z[0:n], (z[0:n] - 1.0))\n',
+                't = (x[0:n] * 2.0)\n',
+                'z[0:n] = np.maximum(t, y[0:n])\n',
+                's += np.dot(x[0:n], z[0:n])\n',
+                '    for i in range(1, n):\n        a[i, 0:m] = (a[(i - 1), 0:m] + 1.0)\n']:
+            self.assertIn(expected, code)
+
+    def test_temporaries(self):
+        for code in ['def f(n, a, b):\n    for i in range(n):\n'
+                     '        t = b[i]\n        b[i] = 0\n        a[i] = t\n',
+                     'def f(n, a, b):\n    for i in range(n):\n'
+                     '        t = b[i]\n        t += 1\n        a[i] = t\n']:
+            results = []
+            for transformed in (False, True):
+                tree = typed_ast3.parse(code)
+                if transformed:
+                    tree = LoopVectorization().apply(tree)
+                namespace = {}
+                exec(horast.unparse(tree), namespace)  # pylint: disable=exec-used
+                arrays = np.zeros(4), np.arange(4.0)
+                namespace['f'](4, *arrays)
+                results.append(arrays)
+            with self.subTest(code=code):
+                self.assertIn('t = np.array(b[0:n])\n', horast.unparse(tree))
+                for array, reference_array in zip(results[1], results[0]):
+                    self.assertTrue(np.array_equal(array, reference_array))
+
+    def test_not_vectorized(self):
+        for code in NOT_VECTORIZED:
+            with self.subTest(code=code):
+                tree = LoopVectorization().apply(typed_ast3.parse(code))
+                self.assertEqual(horast.unparse(tree), horast.unparse(typed_ast3.parse(code)))
+
+    def test_forall(self):
+        code = 'for i in range(1, n):\n    x[i] = x[i - 1] * 2\n'
+        tree = typed_ast3.parse(code)
+        tree.body[0].fortran_metadata = {'is_forall': True}
+        transformation = load_transformation('vectorize')
+        self.assertIsInstance(transformation, LoopVectorization)
+        self.assertEqual(horast.unparse(transformation.apply(tree)).strip(),
+                         'x[1:n] = (x[0:(n - 1)] * 2)')
+        tree = typed_ast3.parse(code + 'print(i)\n')
+        tree.body[0].fortran_metadata = {'is_forall': True}
+        self.assertEqual(horast.unparse(LoopVectorization().apply(tree)).strip(),
+                         'x[1:n] = (x[0:(n - 1)] * 2)\nprint(i)')
+
+    def test_forall_for_all_targets(self):
+        tree = st.augment(typed_ast3.parse(FORALLS), eval_=False)
+        for loop in tree.body[0].body[:2]:
+            loop.fortran_metadata = {'is_forall': True}
+        for language_name, expected, unexpected in [
+                ('Fortran 2008', [
+                    '  do concurrent (i = 0:(n - 1), j = 0:(n - 1))\n    a(i, j) = (x(i) * y(j))\n'
+                    '  end do\n',
+                    '  forall (i = 1:(n - 1))\n    x(i) = (x((i - 1)) + 1.0)\n  end forall\n',
+                    '  where ((x(0:n) > 0.5)) y(0:n) = x(0:n)\n',
+                    '  where ((.not. (x(0:n) > 0.5))) y(0:n) = (2 * x(0:n))\n',
+                    '  x(0:n) = merge(1.0, 0.0, (x(0:n) > 0.5))\n',
+                    '  where ((x > 0.5)) y = 0.0\n', '  n = merge(n, 1, (n > 0))\n'], []),
+                ('Fortran 77', ['y(0:n) = merge(x(0:n), y(0:n), (x(0:n) .gt. 0.5))\n'],
+                 ['concurrent', 'forall (', 'where (']),
+                ('C++14', ['    #pragma omp simd collapse(2)\n    for (\n    int i = 0;'],
+                 ['#pragma omp simd\n'])]:
+            with self.subTest(language_name=language_name):
+                code = Unparser.find(Language.find(language_name))().unparse(tree)
+                for snippet in expected:
+                    self.assertIn(snippet, code)
+                for snippet in unexpected:
+                    self.assertNotIn(snippet, code)
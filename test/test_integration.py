@@ -9,7 +9,8 @@ from transpyle.general.language import Language
 from transpyle.general.parser import Parser
 from transpyle.general.ast_generalizer import AstGeneralizer
 from transpyle.general.unparser import Unparser
-from transpyle.general.translator import Translator, AutoTranslator
+from transpyle.general.translator import \
+    Translator, AutoTranslator, MultiTranslator, AutoMultiTranslator
 
 from .common import EXAMPLES_LANGS_NAMES, EXAMPLES_FILES
 
@@ -66,5 +67,22 @@ class Tests(unittest.TestCase):
                     ast_generalizer = AstGeneralizer.find(language)()
                     general_ast = ast_generalizer.generalize(specific_ast)
 
+    def test_auto_multi_translator(self):
+        from_language = Language.find('Python 3')
+        to_languages = [Language.find(_) for _ in ('Python 3', 'Fortran 77', 'Fortran 2008')]
+        reader = CodeReader()
+        for path in EXAMPLES_FILES['python3']:
+            if path.name not in ('compute_pi.py', 'do_nothing.py', 'gemm.py'):
+                continue
+            code = reader.read_file(path)
+            expected = {to_language: AutoTranslator(from_language, to_language).translate(code, path)
+                        for to_language in to_languages}
+            for max_workers in (1, None):
+                with self.subTest(path=path, max_workers=max_workers):
+                    translator = AutoMultiTranslator(from_language, to_languages,
+                                                     max_workers=max_workers)
+                    self.assertIsInstance(translator, MultiTranslator)
+                    self.assertEqual(translator.translate(code, path), expected)
+
     def test_language_deduction(self):
         self.skipTest('not ready yet')
@@ -11,8 +11,9 @@ import numba
 import numpy as np
 import timing
 
-from transpyle.general import Language, AutoTranspiler
+from transpyle.general import Language, AutoTranspiler, AutoTranslator, PassManager
 from transpyle.general import Binder
+from transpyle.python.loop_transformations import LoopTiling, LoopInterchange
 from transpyle.cpp import CppSwigCompiler
 from transpyle.fortran import F2PyCompiler
 
@@ -26,6 +27,20 @@ PERFORMANCE_RESULTS_ROOT = RESULTS_ROOT.joinpath('performance')
 if not PERFORMANCE_RESULTS_ROOT.is_dir():
     PERFORMANCE_RESULTS_ROOT.mkdir()
 
+GEMM_CODE = '''def gemm(n, a, b, c):
+    for y in range(n):
+        for i in range(n):
+            for x in range(n):
+                c[y, x] += a[y, i] * b[i, x]
+'''
+
+GEMM_TRANSPOSED_ORDER_CODE = '''def gemm(n, a, b, c):
+    for x in range(n):
+        for i in range(n):
+            for y in range(n):
+                c[y, x] += a[y, i] * b[i, x]
+'''
+
 
 class Tests(unittest.TestCase):
 
@@ -127,3 +142,37 @@ class Tests(unittest.TestCase):
 
     def test_matmul(self):
         pass
+
+    def _test_gemm_variants(self, name: str, variants: dict, size: int):
+        a = np.random.rand(size, size)
+        b = np.random.rand(size, size)
+        reference = np.dot(a, b)
+
+        for variant, code in variants.items():
+            namespace = {}
+            exec(code, namespace)  # pylint: disable=exec-used
+            tested_function = numba.jit(namespace['gemm'], nopython=True)
+            with self.subTest(variant=variant):
+                for _ in _TIME.measure_many('{}.{}'.format(name, variant), 5):
+                    c = np.zeros((size, size))
+                    tested_function(size, a, b, c)
+                self.assertTrue(np.allclose(c, reference))
+
+        timings_name = '.'.join([__name__, name])
+        summary = timing.query_cache(timings_name).summary
+        _LOG.info('%s', summary)
+        json_to_file(summary, PERFORMANCE_RESULTS_ROOT.joinpath(timings_name + '.json'))
+
+    def test_gemm_tiling(self):
+        language = Language.find('Python 3')
+        translator = AutoTranslator(language, language, pass_manager=PassManager([LoopTiling()]))
+        variants = {'plain': GEMM_CODE, 'tiled': translator.translate(GEMM_CODE)}
+        self._test_gemm_variants('gemm_tiling', variants, 1024)
+
+    def test_gemm_interchange(self):
+        language = Language.find('Python 3')
+        translator = AutoTranslator(language, language, pass_manager=PassManager([
+            LoopInterchange(language.array_layout)]))
+        variants = {'plain': GEMM_TRANSPOSED_ORDER_CODE,
+                    'interchanged': translator.translate(GEMM_TRANSPOSED_ORDER_CODE)}
+        self._test_gemm_variants('gemm_interchange', variants, 512)
@@ -4,6 +4,7 @@ import contextlib
 import io
 import unittest
 
+from .common import RESULTS_ROOT
 from .test_setup import run_module
 
 
@@ -32,3 +33,20 @@ class Tests(unittest.TestCase):
         text = sio.getvalue()
         self.assertIn('support', text)
         self.assertIn('transpyle', text)
+
+    def test_transformations_dry_run(self):
+        path = RESULTS_ROOT.parent.joinpath('examples_inlining.py')
+        sio = io.StringIO()
+        with contextlib.redirect_stdout(sio):
+            run_module('transpyle', str(path), '--from', 'Python', '--to', 'Python',
+                       '--transformations', "inline:inlined='buy':verbose=False", '--dry-run')
+        text = sio.getvalue()
+        self.assertIn('InliningTransformation', text)
+        self.assertIn("-    buy(spam)", text)
+        self.assertIn("+    print('bought '.format(spam))", text)
+        sio = io.StringIO()
+        with contextlib.redirect_stderr(sio):
+            with self.assertRaises(SystemExit):
+                run_module('transpyle', str(path), '--from', 'Python', '--to', 'Python',
+                           '--dry-run')
+        self.assertIn('--dry-run option requires --transformations', sio.getvalue())
@@ -2,9 +2,9 @@
 
 from distutils.sysconfig import get_python_inc, get_config_vars
 import logging
-import os
 import pathlib
 import platform
+import re
 import shutil
 import subprocess
 import tempfile
@@ -15,10 +15,14 @@ import argunparse
 # import typed_ast.ast3 as typed_ast3
 
 from ..general import Language, CodeReader, Parser, AstGeneralizer, Unparser, Compiler
-from ..general.tools import run_tool
+from ..general.tools import temporarily_change_dir, run_tool, find_blas_library
 
 PYTHON_LIB_PATH = pathlib.Path(get_python_inc(plat_specific=1))
 
+OPENMP_DIRECTIVE = re.compile(r'^[ \t]*#[ \t]*pragma[ \t]+omp\b', re.MULTILINE)
+
+CBLAS_CALL = re.compile(r'\bcblas_\w+\s*\(')
+
 SWIG_INTERFACE_TEMPLATE = '''/* File: {module_name}.i */
 /* Generated by transpyle. */
 %module {module_name}
@@ -133,25 +137,31 @@ class CppSwigCompiler(SwigCompiler):
         _LOG.warning('running C++ compiler: %s', gcc_cmd)
         return run_tool(pathlib.Path(compiler), args)
 
-    def run_cpp_compiler(self, path: pathlib.Path,
-                         wrapper_path: pathlib.Path = None) -> subprocess.CompletedProcess:
+    def run_cpp_compiler(self, path: pathlib.Path, wrapper_path: pathlib.Path = None,
+                         openmp: bool = False) -> subprocess.CompletedProcess:
         # gcc -c example.c example_wrap.c -I/usr/local/include/python2.1
         flags = '-I{} {} {}'.format(
             self.py_config['INCLUDEPY'],
             self.py_config['BASECFLAGS'], self.py_config['BASECPPFLAGS']).split()
         flags = [_.strip() for _ in flags if _.strip()]
+        if openmp:
+            flags.append('-fopenmp')
         gcc_args = [*self.cpp_flags, *flags,
                     '-c', str(path), str(wrapper_path)]
         return self.run_gpp(*gcc_args)
 
-    def run_cpp_linker(self, path: pathlib.Path,
-                       wrapper_path: pathlib.Path = None) -> subprocess.CompletedProcess:
+    def run_cpp_linker(self, path: pathlib.Path, wrapper_path: pathlib.Path = None,
+                       openmp: bool = False, libraries: t.Sequence[str] = ()
+                       ) -> subprocess.CompletedProcess:
         # ld -shared example.o example_wrap.o -o _example.so
         ldlibrary = pathlib.Path(self.py_config['LDLIBRARY'].lstrip('lib')).with_suffix('')
         flags = '-L{} -l{} {} {} {}'.format(
             self.py_config['LIBDIR'], ldlibrary, self.py_config['LIBS'],
             self.py_config['SYSLIBS'], self.py_config['LINKFORSHARED']).split()
         flags = [_.strip() for _ in flags if _.strip()]
+        if openmp:
+            flags.append('-fopenmp')
+        flags += ['-l{}'.format(library) for library in libraries]
         linker_args = [*self.cpp_flags, *flags,
                        '-shared', str(path.with_suffix('.o')), str(wrapper_path.with_suffix('.o')),
                        '-o', '{}'.format(path.with_name('_' + path.name).with_suffix('.so'))]
@@ -159,10 +169,30 @@ class CppSwigCompiler(SwigCompiler):
 
     def compile(self, code: str, path: t.Optional[pathlib.Path] = None,
                 output_folder: t.Optional[pathlib.Path] = None, **kwargs) -> pathlib.Path:
+        """Compile C++ code using SWIG and C++ compiler.
+
+        Recognized kwargs:
+        openmp=True -- enable OpenMP support, which by default is enabled if the code contains
+        any OpenMP directives,
+        blas=True -- link a locally installed BLAS library, which by default is done if the code
+        calls any CBLAS routines.
+        """
         if output_folder is None:
             with tempfile.TemporaryDirectory() as tmpdir:
                 output_folder = pathlib.Path(tmpdir)
             output_folder.mkdir()
+        openmp = kwargs.get('openmp', None)
+        if openmp is None:
+            openmp = OPENMP_DIRECTIVE.search(code) is not None
+        blas = kwargs.get('blas', None)
+        if blas is None:
+            blas = CBLAS_CALL.search(code) is not None
+        libraries = []
+        if blas:
+            blas_library = find_blas_library()
+            if blas_library is None:
+                raise RuntimeError('no BLAS library found to link "{}" with'.format(path))
+            libraries.append(blas_library)
         header_code = self.create_header_file(path)
         hpp_path = output_folder.joinpath(path.name).with_suffix('.hpp')
         with hpp_path.open('w') as header_file:
@@ -175,18 +205,16 @@ class CppSwigCompiler(SwigCompiler):
             swig_interface_file.write(swig_interface)
         wrapper_path = output_folder.joinpath(path.with_suffix('').name + '_wrap.cxx')
 
-        cwd = os.getcwd()
-        os.chdir(str(output_folder))
-        result = self.run_swig(swig_interface_path, '-c++')
-        if result.returncode != 0:
-            raise RuntimeError('{} -- Failed to create SWIG interface for "{}":\n"""\n{}"""\n'
-                               'The header "{}" is:\n"""{}"""\nExamine folder "{}" for details'
-                               .format(result.args, path, result.stderr.decode(), hpp_path,
-                                       header_code, output_folder))
-        result = self.run_cpp_compiler(cpp_path, wrapper_path)
-        assert result.returncode == 0
-        result = self.run_cpp_linker(cpp_path, wrapper_path)
-        assert result.returncode == 0
-        os.chdir(cwd)
+        with temporarily_change_dir(output_folder):
+            result = self.run_swig(swig_interface_path, '-c++')
+            if result.returncode != 0:
+                raise RuntimeError('{} -- Failed to create SWIG interface for "{}":\n"""\n{}"""\n'
+                                   'The header "{}" is:\n"""{}"""\nExamine folder "{}" for details'
+                                   .format(result.args, path, result.stderr.decode(), hpp_path,
+                                           header_code, output_folder))
+            result = self.run_cpp_compiler(cpp_path, wrapper_path, openmp)
+            assert result.returncode == 0
+            result = self.run_cpp_linker(cpp_path, wrapper_path, openmp, libraries)
+            assert result.returncode == 0
 
         return cpp_path.with_suffix('.py')
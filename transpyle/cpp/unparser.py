@@ -9,6 +9,8 @@ import horast
 import typed_ast.ast3 as typed_ast3
 
 from ..general import Language, Unparser
+from ..pair import OpenMpDirective, openmp_directive
+from ..python.dependence import forall_loop_nest, carries_dependences
 
 _LOG = logging.getLogger(__name__)
 
@@ -104,6 +106,12 @@ class Cpp14UnparserBackend(horast.unparser.Unparser):
             return
         self.dispatch(type_hint)
 
+    def _Module(self, tree):
+        if any(isinstance(_, typed_ast3.Call) and isinstance(_.func, typed_ast3.Name)
+               and _.func.id.startswith('cblas_') for _ in typed_ast3.walk(tree)):
+            self.fill('#include <cblas.h>')
+        super()._Module(tree)
+
     def _Expr(self, tree):
         super()._Expr(tree)
         self.write(';')
@@ -161,6 +169,10 @@ class Cpp14UnparserBackend(horast.unparser.Unparser):
         self._unsupported_syntax(t)
 
     def _For(self, t):
+        loops = forall_loop_nest(t)
+        if loops and not carries_dependences(loops):
+            self.fill(OpenMpDirective('simd', ['collapse({})'.format(len(loops))] if len(loops) > 1
+                                      else []).to_cpp())
         self.fill('for (')
         init, cond, increment = for_header_to_tuple(t.target, t.resolved_type_comment, t.iter)
         self.dispatch(init)
@@ -216,16 +228,15 @@ class Cpp14UnparserBackend(horast.unparser.Unparser):
     def _Attribute(self, t):
         if isinstance(t.value, typed_ast3.Name):
             unparsed = {
-                ('a', 'shape'): '???',
-                ('b', 'shape'): '???',
-                ('c', 'shape'): '???',
                 ('np', 'single'): 'int32_t',
                 ('np', 'double'): 'int64_t',
+                ('np', 'empty'): 'boost::multi_array',
                 ('np', 'zeros'): 'boost::multi_array',
                 ('st', 'ndarray'): 'boost::multi_array'
-                }[t.value.id, t.attr]
-            self.write(unparsed)
-            return
+                }.get((t.value.id, t.attr))
+            if unparsed is not None:
+                self.write(unparsed)
+                return
         self.dispatch(t.value)
         self.write('.')
         self.write(t.attr)
@@ -256,6 +267,11 @@ class Cpp14UnparserBackend(horast.unparser.Unparser):
         self.write(t.arg)
 
     def _Comment(self, node):
+        openmp_directive_ = openmp_directive(node)
+        if openmp_directive_ is not None:
+            if not openmp_directive_.construct.startswith('end'):
+                self.fill(openmp_directive_.to_cpp())
+            return
         if node.eol:
             self.write(' //')
         else:
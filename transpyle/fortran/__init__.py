@@ -8,10 +8,11 @@ from .compiler import F2PyCompiler
 from .binder import F2PyBinder
 
 
-Language.register(Language(['Fortran 77'], ['.f']), ['Fortran 77'])
-Language.register(Language(['Fortran 95'], ['.f90', '.f', '.for', '.f95']), ['Fortran 95'])
+Language.register(Language(['Fortran 77'], ['.f'], array_layout='F'), ['Fortran 77'])
+Language.register(Language(['Fortran 95'], ['.f90', '.f', '.for', '.f95'], array_layout='F'),
+                  ['Fortran 95'])
 # Language.register(Language(['Fortran 2003'], ['.f90', '.f', '.for', '.f95']), ['Fortran 2003'])
-Language.register(Language(['Fortran 2008'], ['.f90', '.f', '.for', '.f95']),
+Language.register(Language(['Fortran 2008'], ['.f90', '.f', '.for', '.f95'], array_layout='F'),
                   ['Fortran 2008', 'Fortran'])
 
 Parser.register(FortranParser, (Language.find('Fortran 77'), Language.find('Fortran 95'),
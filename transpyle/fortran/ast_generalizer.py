@@ -23,7 +23,7 @@ from ..general.misc import flatten_sequence
 from ..general import Language, XmlAstGeneralizer
 from .definitions import \
     FORTRAN_PYTHON_TYPE_PAIRS, FORTRAN_PYTHON_OPERATORS, INTRINSICS_FORTRAN_TO_PYTHON, \
-    INTRINSICS_SPECIAL_CASES
+    INTRINSICS_FORTRAN_TO_PYTHON_SCALAR, INTRINSICS_SPECIAL_CASES
 
 _LOG = logging.getLogger(__name__)
 
@@ -45,9 +45,11 @@ class FortranAstGeneralizer(XmlAstGeneralizer):
         super().__init__(Language.find('Fortran 2008'))
         self._split_declarations = split_declarations
         self._now_parsing_file = False
+        self._scopes = []  # type: t.List[t.Dict[str, bool]]
 
     def generalize(self, syntax: ET.Element):
         self._now_parsing_file = False
+        self._scopes = []
         generalized = super().generalize(syntax)
         return st.augment(generalized, eval_=False, locals_={'np': np, 'st': st})
 
@@ -86,13 +88,16 @@ class FortranAstGeneralizer(XmlAstGeneralizer):
 
     def _module(self, node: ET.Element):
         module = typed_ast3.parse('''if __name__ == '__main__':\n    pass''')
+        self._scopes.append({})
         body = self.transform_all_subnodes(self.get_one(node, './body'))
         conditional = module.body[0]
         conditional.body = body
         members_node = node.find('./members')
         if members_node is None:
+            self._scopes.pop()
             return conditional
         members = self.transform_all_subnodes(members_node)
+        self._scopes.pop()
         if not members:
             members = [typed_ast3.Pass()]
         clsdef = typed_ast3.ClassDef(
@@ -104,7 +109,9 @@ class FortranAstGeneralizer(XmlAstGeneralizer):
 
     def _function(self, node: ET.Element):
         arguments = self.transform_one(self.get_one(node, './header/names'))
+        self._scopes.append({})
         body = self.transform_all_subnodes(self.get_one(node, './body'))
+        self._scopes.pop()
         for i, stmt in enumerate(body):
             stmt = ast.fix_missing_locations(stmt)
             stmt = typed_ast3.fix_missing_locations(stmt)
@@ -131,6 +138,7 @@ class FortranAstGeneralizer(XmlAstGeneralizer):
                                              defaults=[], kw_defaults=[])
         else:
             arguments = self.transform_one(arguments_node)
+        self._scopes.append({})
         body = self.transform_all_subnodes(self.get_one(node, './body'))
         function_def = typed_ast3.FunctionDef(
             name=node.attrib['name'], args=arguments, body=body, decorator_list=[],
@@ -141,6 +149,7 @@ class FortranAstGeneralizer(XmlAstGeneralizer):
                 'internal-subprogram', 'internal-subprogram-part'})
             assert members
             function_def.fortran_metadata = {'contains': members}
+        self._scopes.pop()
         return function_def
 
     def _arguments(self, node: ET.Element) -> typed_ast3.arguments:
@@ -180,7 +189,9 @@ class FortranAstGeneralizer(XmlAstGeneralizer):
 
     def _program(self, node: ET.Element) -> typed_ast3.AST:
         module = typed_ast3.parse('''if __name__ == '__main__':\n    pass''')
+        self._scopes.append({})
         body = self.transform_all_subnodes(self.get_one(node, './body'))
+        self._scopes.pop()
         for i in range(len(body) - 1, -1, -1):
             if isinstance(body[i], list):
                 sublist = body[i]
@@ -298,15 +309,20 @@ class FortranAstGeneralizer(XmlAstGeneralizer):
                            for _ in variable_dimensions]
         else:
             annotations = [base_type for _ in variables]
+        if self._scopes:
+            for var, annotation in zip(variables, annotations):
+                self._scopes[-1][var.id.lower()] = annotation is not base_type
 
         # initial values
         if dimensions_node is not None:
-            values = [None if val is None else make_numpy_constructor('array', val, base_type)
+            values = [None if val is None
+                      else make_numpy_constructor('array', val, base_type, order='F')
                       for _, val in variables_and_values]
         elif has_variable_dimensions:
             assert len(variables_and_values) == len(variable_dimensions)
             values = [None if val is None
-                      else (val if dim is None else make_numpy_constructor('array', val, base_type))
+                      else (val if dim is None
+                            else make_numpy_constructor('array', val, base_type, order='F'))
                       for (_, val), dim in zip(variables_and_values, variable_dimensions)]
         else:
             values = [val for _, val in variables_and_values]
@@ -483,6 +499,7 @@ class FortranAstGeneralizer(XmlAstGeneralizer):
             inner_loop = inner_loop.body[0]
         # inner_loop.body = [self.transform_one(self.get_one(node, './assignmet'))]
         inner_loop.body = self.transform_all_subnodes(self.get_one(node, './body'))
+        outer_loop.fortran_metadata = {'is_forall': True}
         return outer_loop
 
     def _index_variable(self, node: ET.Element) -> t.Tuple[typed_ast3.Name, typed_ast3.Call]:
@@ -710,12 +727,10 @@ class FortranAstGeneralizer(XmlAstGeneralizer):
             sizes = make_expression_from_slice(expression.slice)
             if not isinstance(sizes, typed_ast3.Tuple):
                 sizes = typed_ast3.Tuple(elts=[sizes], ctx=typed_ast3.Load())
-            val = typed_ast3.Call(
-                func=typed_ast3.Attribute(value=typed_ast3.Name(id='np', ctx=typed_ast3.Load()),
-                                          attr='zeros', ctx=typed_ast3.Load()),
-                args=[sizes], keywords=[typed_ast3.keyword(arg='dtype', value=typed_ast3.Attribute(
-                    value=typed_ast3.Name(id='t', ctx=typed_ast3.Load()), attr='Any',
-                    ctx=typed_ast3.Load()))])
+            # allocated memory is not initialized and is in column-major order in Fortran
+            val = make_numpy_constructor('empty', sizes, typed_ast3.Attribute(
+                value=typed_ast3.Name(id='t', ctx=typed_ast3.Load()), attr='Any',
+                ctx=typed_ast3.Load()), order='F')
             assert isinstance(var, typed_ast3.AST)
             assignment = typed_ast3.Assign(targets=[var], value=val, type_comment=None)
             assignment.fortran_metadata = {'is_allocation': True}
@@ -1338,6 +1353,18 @@ class FortranAstGeneralizer(XmlAstGeneralizer):
         if not members:
             members = (call.func.id,)
         func = typed_ast3.Name(id='np', ctx=typed_ast3.Load())
+        for member in members:
+            func = typed_ast3.Attribute(value=func, attr=member, ctx=typed_ast3.Load())
+        if tuple(members) in (('maximum',), ('minimum',)) and len(call.args) > 2:
+            *args, last_arg = call.args
+            folded = self._intrinsic_numpy_call(
+                typed_ast3.Call(func=call.func, args=args, keywords=[]), members)
+            return typed_ast3.Call(func=func, args=[folded, last_arg], keywords=call.keywords)
+        return typed_ast3.Call(func=func, args=call.args, keywords=call.keywords)
+
+    def _intrinsic_math_call(self, call, members):
+        self.ensure_import('math')
+        func = typed_ast3.Name(id='math', ctx=typed_ast3.Load())
         for member in members:
             func = typed_ast3.Attribute(value=func, attr=member, ctx=typed_ast3.Load())
         return typed_ast3.Call(func=func, args=call.args, keywords=call.keywords)
@@ -1364,10 +1391,59 @@ class FortranAstGeneralizer(XmlAstGeneralizer):
             if len(value) == 1 and value[0] == function:
                 return cls._intrinsic_numpy_call
             return functools.partial(cls._intrinsic_numpy_call, members=members)
+        if package == 'math':
+            return functools.partial(cls._intrinsic_math_call, members=members)
         raise NotImplementedError((case, value))
 
     _intrinsics_converters = {}
 
+    _scalar_intrinsics_converters = {}
+
+    def _is_declared_array(self, name: str) -> t.Optional[bool]:
+        """Check if a variable visible in current scope was declared as an array.
+
+        Return None if the variable was not declared in any of the enclosing program units.
+        """
+        for scope in reversed(self._scopes):
+            if name.lower() in scope:
+                return scope[name.lower()]
+        return None
+
+    def _is_scalar(self, node: typed_ast3.AST) -> bool:
+        """Determine if already generalized expression certainly evaluates to a scalar.
+
+        Only declared variables and results of scalar-only functions are considered,
+        and therefore False is returned whenever the answer is not known.
+        """
+        if isinstance(node, (typed_ast3.Num, typed_ast3.NameConstant)):
+            return True
+        if isinstance(node, typed_ast3.Name):
+            return self._is_declared_array(node.id) is False
+        if isinstance(node, typed_ast3.Index):
+            return self._is_scalar(node.value)
+        if isinstance(node, typed_ast3.Tuple):
+            return all(self._is_scalar(_) for _ in node.elts)
+        if isinstance(node, typed_ast3.Subscript):
+            return isinstance(node.value, typed_ast3.Name) \
+                and self._is_declared_array(node.value.id) is True and self._is_scalar(node.slice)
+        if isinstance(node, typed_ast3.Call):
+            if node.keywords or not all(self._is_scalar(_) for _ in node.args):
+                return False
+            if isinstance(node.func, typed_ast3.Attribute):
+                return isinstance(node.func.value, typed_ast3.Name) and node.func.value.id == 'math'
+            return isinstance(node.func, typed_ast3.Name) and (
+                node.func.id in ('abs', 'float', 'int', 'max', 'min')
+                or self._is_declared_array(node.func.id) is True)
+        if isinstance(node, typed_ast3.UnaryOp):
+            return self._is_scalar(node.operand)
+        if isinstance(node, typed_ast3.BinOp):
+            return self._is_scalar(node.left) and self._is_scalar(node.right)
+        if isinstance(node, typed_ast3.BoolOp):
+            return all(self._is_scalar(_) for _ in node.values)
+        if isinstance(node, typed_ast3.Compare):
+            return all(self._is_scalar(_) for _ in [node.left] + node.comparators)
+        return False
+
     def _name(self, node: ET.Element) -> typed_ast3.AST:
         name_str = node.attrib['id']
         name = typed_ast3.Name(id=name_str, ctx=typed_ast3.Load())
@@ -1385,7 +1461,11 @@ class FortranAstGeneralizer(XmlAstGeneralizer):
                     _LOG.warning('found intrinsic name "%s" without any subscripts', name_str)
                 else:
                     name_type = 'function'
-                    call = self._intrinsics_converters[name_str](self, call)
+                    converters = self._intrinsics_converters
+                    if name_str in self._scalar_intrinsics_converters and not keywords \
+                            and all(self._is_scalar(arg) for arg in args):
+                        converters = self._scalar_intrinsics_converters
+                    call = converters[name_str](self, call)
         except SyntaxError:
             _LOG.info('transforming name to call failed as below (continuing despite that)',
                       exc_info=True)
@@ -1468,3 +1548,7 @@ class FortranAstGeneralizer(XmlAstGeneralizer):
 FortranAstGeneralizer._intrinsics_converters = {
     case: FortranAstGeneralizer._convgen(case, value)
     for case, value in INTRINSICS_FORTRAN_TO_PYTHON.items()}
+
+FortranAstGeneralizer._scalar_intrinsics_converters = {
+    case: FortranAstGeneralizer._convgen(case, value)
+    for case, value in INTRINSICS_FORTRAN_TO_PYTHON_SCALAR.items()}
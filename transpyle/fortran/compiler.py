@@ -4,8 +4,8 @@
 import datetime
 # import io
 import logging
-import os
 import pathlib
+import re
 import subprocess
 import tempfile
 import typing as t
@@ -14,11 +14,15 @@ import argunparse
 import numpy.f2py
 
 from ..general import Compiler
-from ..general.tools import call_tool
+from ..general.tools import temporarily_change_dir, call_tool, find_blas_library
 
 
 _LOG = logging.getLogger(__name__)
 
+OPENMP_DIRECTIVE = re.compile(r'^[ \t]*[!cC*]\$omp\b', re.IGNORECASE | re.MULTILINE)
+
+BLAS_CALL = re.compile(r'\b[sdcz](gemm|gemv|axpy|dot[cu]?)\s*\(', re.IGNORECASE)
+
 
 def create_f2py_module_name(path: pathlib.Path) -> str:
     return '{}_transpyle_{}'.format(path.stem, datetime.datetime.now().strftime('%Y%m%d%H%M%S'))
@@ -56,7 +60,11 @@ class F2PyCompiler(Compiler):
 
         Recognized kwargs:
         mpi=True -- enable MPI support,
-        openmp=True -- enable OpenMP support.
+        openmp=True -- enable OpenMP support, which by default is enabled if the code contains
+        any OpenMP directives,
+        blas=True -- link a locally installed BLAS library and use it also for matmul and
+        dot_product intrinsics; by default, the library is only linked if the code explicitly
+        calls any BLAS routines, and intrinsics are left as implemented by the compiler.
         """
         if output_folder is None:
             with tempfile.TemporaryDirectory() as tmpdir:
@@ -75,21 +83,36 @@ class F2PyCompiler(Compiler):
         # if 'debug' in extra_args or 'debug-capi' in extra_args:
         #    _LOG.warning('building f2py module in debug mode')
 
-        if kwargs.get('mpi', False):
+        if kwargs.pop('mpi', False):
             # kwargs['f77exec'] = 'mpif90'
             kwargs['f90exec'] = 'mpif90'
             # kwargs['f77flags'] = '-g0'
             # kwargs['f90flags'] = '-g0'
         kwargs['opt'] = '-O3 -funroll-loops'
-        if kwargs.get('openmp', False):
-            kwargs['opt'] += ' -fopenmp'
         args = ()
+        openmp = kwargs.pop('openmp', None)
+        if openmp is None:
+            openmp = OPENMP_DIRECTIVE.search(code) is not None
+        if openmp:
+            _LOG.debug('compiling %s with OpenMP support', path)
+            kwargs['opt'] += ' -fopenmp'
+            args = (*args, '-lgomp')
+        blas = kwargs.pop('blas', None)
+        if blas is None and BLAS_CALL.search(code) is None:
+            blas = False
+        if blas is not False:
+            blas_library = find_blas_library()
+            if blas_library is None:
+                _LOG.warning('no BLAS library found, compiling %s without it', path)
+            else:
+                _LOG.debug('compiling %s with %s library', path, blas_library)
+                if blas:
+                    kwargs['opt'] += ' -fexternal-blas'
+                args = (*args, '-l{}'.format(blas_library))
         # args = (*args, '-v')
         # kwargs['noopt'] = True
-        _working_dir = pathlib.Path.cwd()
-        os.chdir(str(output_folder))
-        result = self.run_f2py(code, path, output_folder, module_name, *args, **kwargs)
-        os.chdir(str(_working_dir))
+        with temporarily_change_dir(output_folder):
+            result = self.run_f2py(code, path, output_folder, module_name, *args, **kwargs)
 
         path_mask = '{}*'.format(module_name)
         output_paths = [output_path for output_path in output_folder.glob(path_mask)
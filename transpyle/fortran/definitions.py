@@ -76,37 +76,37 @@ INTRINSICS_FORTRAN_TO_PYTHON = {
     # Fortran 77
     'abs': 'abs',  # or np.absolute
     'acos': ('numpy', 'arccos'),
-    'aimag': None,
-    'aint': None,
+    'aimag': ('numpy', 'imag'),
+    'aint': ('numpy', 'trunc'),
     'anint': None,
     'asin': ('numpy', 'arcsin'),
     'atan': ('numpy', 'arctan'),
-    'atan2': None,
-    'char': None,
+    'atan2': ('numpy', 'arctan2'),
+    'char': 'chr',
     'cmplx': None,
     'conjg': ('numpy', 'conj'),
     'cos': ('numpy', 'cos'),
-    'cosh': None,
+    'cosh': ('numpy', 'cosh'),
     'dble': 'float',  # incorrect
     'dim': None,
     'dprod': None,
-    'exp': None,
-    'ichar': None,
+    'exp': ('numpy', 'exp'),
+    'ichar': 'ord',
     'index': None,
     'int': 'int',
-    'len': None,
+    'len': 'len',  # incorrect for strings with trailing blanks
     'lge': None,
     'lgt': None,
     'lle': None,
     'llt': None,
-    'log': None,
-    'log10': None,
+    'log': ('numpy', 'log'),
+    'log10': ('numpy', 'log10'),
     'max': ('numpy', 'maximum'),
     'min': ('numpy', 'minimum'),
-    'mod': None,
+    'mod': ('numpy', 'fmod'),  # result has sign of the first argument
     'nint': None,
     'real': 'float',
-    'sign': ('numpy', 'sign'),
+    'sign': ('numpy', 'copysign'),  # incorrect for integers
     'sin': ('numpy', 'sin'),
     'sinh': ('numpy', 'sinh'),
     'sqrt': ('numpy', 'sqrt'),
@@ -116,10 +116,10 @@ INTRINSICS_FORTRAN_TO_PYTHON = {
     'getenv': ('os', 'environ'),
     # Fortran 90
     # Character string functions
-    'achar': None,
+    'achar': 'chr',
     'adjustl': None,
     'adjustr': None,
-    'iachar': None,
+    'iachar': 'ord',
     'len_trim': None,
     'repeat': None,
     'scan': None,
@@ -141,14 +141,14 @@ INTRINSICS_FORTRAN_TO_PYTHON = {
     'bit_size': None,
     # Vector- and matrix-multiplication functions
     'dot_product': ('numpy', 'dot'),
-    'matmul': None,
+    'matmul': ('numpy', 'matmul'),
     # Array functions
-    'all': None,
-    'any': None,
+    'all': ('numpy', 'all'),
+    'any': ('numpy', 'any'),
     'count': ('ndarray', 'count'),
-    'maxval': None,
-    'minval': None,
-    'product': None,
+    'maxval': ('numpy', 'max'),
+    'minval': ('numpy', 'min'),
+    'product': ('numpy', 'prod'),
     'sum': 'sum',
     # Array location functions
     'maxloc': ('numpy', 'argmax'),
@@ -161,6 +161,25 @@ INTRINSICS_FORTRAN_TO_PYTHON = {
     # Fortran 2008
     }
 
+INTRINSICS_FORTRAN_TO_PYTHON_SCALAR = {
+    'acos': ('math', 'acos'),
+    'asin': ('math', 'asin'),
+    'atan': ('math', 'atan'),
+    'atan2': ('math', 'atan2'),
+    'cos': ('math', 'cos'),
+    'cosh': ('math', 'cosh'),
+    'exp': ('math', 'exp'),
+    'log': ('math', 'log'),
+    'log10': ('math', 'log10'),
+    'max': 'max',
+    'min': 'min',
+    'sign': ('math', 'copysign'),  # incorrect for integers
+    'sin': ('math', 'sin'),
+    'sinh': ('math', 'sinh'),
+    'sqrt': ('math', 'sqrt'),
+    'tan': ('math', 'tan'),
+    'tanh': ('math', 'tanh')}
+
 
 def _transform_print_call(call):
     if not hasattr(call, 'fortran_metadata'):
@@ -177,23 +196,61 @@ def _transform_print_call(call):
 
 
 PYTHON_FORTRAN_INTRINSICS = {
+    'chr': 'achar',
+    'ord': 'iachar',
+    'math.acos': 'acos',
+    'math.asin': 'asin',
+    'math.atan': 'atan',
+    'math.atan2': 'atan2',
+    'math.copysign': 'sign',
+    'math.cos': 'cos',
+    'math.cosh': 'cosh',
+    'math.exp': 'exp',
+    'math.log': 'log',
+    'math.log10': 'log10',
+    'math.sin': 'sin',
+    'math.sinh': 'sinh',
+    'math.sqrt': 'sqrt',
+    'math.tan': 'tan',
+    'math.tanh': 'tanh',
+    'np.all': 'all',
+    'np.any': 'any',
+    'np.arccos': 'acos',
     'np.arcsin': 'asin',
     'np.arctan': 'atan',
+    'np.arctan2': 'atan2',
     'np.argmin': 'minloc',
     'np.argmax': 'maxloc',
     'np.array': lambda _: _.args[0],
     'np.conj': 'conjg',
+    'np.copysign': 'sign',
     'np.cos': 'cos',
+    'np.cosh': 'cosh',
     'np.dot': 'dot_product',
+    'np.exp': 'exp',
     'np.finfo.eps': 'epsilon',
     'np.finfo.max': 'huge',
     'np.finfo.tiny': 'tiny',
+    'np.fmod': 'mod',
+    'np.imag': 'aimag',
+    'np.log': 'log',
+    'np.log10': 'log10',
+    'np.max': 'maxval',
+    'np.matmul': 'matmul',
     'np.maximum': 'max',
+    'np.min': 'minval',
     'np.minimum': 'min',
+    'np.prod': 'product',
     'np.sign': 'sign',
     'np.sin': 'sin',
     'np.sinh': 'sinh',
     'np.sqrt': 'sqrt',
+    'np.sum': 'sum',
+    'np.tan': 'tan',
+    'np.tanh': 'tanh',
+    'np.trunc': 'aint',
+    'np.where': lambda _: typed_ast3.Call(func=typed_ast3.Name(id='merge', ctx=typed_ast3.Load()),
+                                          args=[_.args[1], _.args[2], _.args[0]], keywords=[]),
     'np.zeros': lambda _: typed_ast3.Num(n=0),
     'print': _transform_print_call,
     'os.environ': 'getenv',
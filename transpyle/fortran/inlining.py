@@ -0,0 +1,327 @@
+"""Inlining of Fortran subroutines in a whole project, driven by an index of call sites."""
+
+import collections
+import logging
+import pathlib
+import re
+import typing as t
+import xml.etree.ElementTree as ET
+
+import static_typing as st
+import typed_ast.ast3 as typed_ast3
+
+from ..general import Language, CodeReader, Parser, AstGeneralizer, Unparser
+from ..pair import PatchSet
+from ..python.transformations import CallInliner
+
+_LOG = logging.getLogger(__name__)
+
+FIXED_FORM_SUFFIXES = ('.f', '.for', '.ftn', '.f77')
+
+_CALL_STATEMENT = re.compile(r'^\s*(\d+\s*)?call\b', re.IGNORECASE)
+
+
+def is_fixed_form(path: pathlib.Path) -> bool:
+    return path.suffix.lower() in FIXED_FORM_SUFFIXES
+
+
+def _strip_comment(line: str) -> str:
+    """Remove trailing "!" comment from a line of free-form Fortran code."""
+    quote = None
+    for i, character in enumerate(line):
+        if quote is not None:
+            if character == quote:
+                quote = None
+        elif character in ('"', "'"):
+            quote = character
+        elif character == '!':
+            return line[:i]
+    return line
+
+
+def _is_comment_or_blank(line: str, fixed_form: bool) -> bool:
+    if fixed_form and line[:1] in ('c', 'C', '*'):
+        return True
+    return not line.strip() or line.lstrip().startswith('!')
+
+
+def statement_line_end(lines: t.Sequence[str], line_begin: int, line_end: int,
+                       fixed_form: bool = False) -> int:
+    """Find the last line of a statement, including all its continuation lines.
+
+    Line numbers start from 1, and line_end is the last line of the statement as reported by
+    the parser, which might not include continuation lines.
+    """
+    assert 1 <= line_begin <= line_end <= len(lines), (line_begin, line_end, len(lines))
+    if fixed_form:
+        line = line_end + 1
+        while line <= len(lines):
+            text = lines[line - 1]
+            if _is_comment_or_blank(text, fixed_form):
+                line += 1
+                continue
+            if len(text) <= 5 or text[5] in (' ', '0') or '\t' in text[:5]:
+                break
+            line_end = line
+            line += 1
+        return line_end
+    while _strip_comment(lines[line_end - 1]).rstrip().endswith('&'):
+        line = line_end + 1
+        while line <= len(lines) and _is_comment_or_blank(lines[line - 1], fixed_form):
+            line += 1
+        if line > len(lines):
+            break
+        line_end = line
+    return line_end
+
+
+class FortranRoutine:
+
+    """Definition of a subroutine in a source file."""
+
+    def __init__(self, name: str, path: pathlib.Path, xml: ET.Element,
+                 line_begin: int, line_end: int):
+        self.name = name
+        self.path = path
+        self.xml = xml
+        self.line_begin = line_begin
+        self.line_end = line_end
+
+    @property
+    def lines_count(self) -> int:
+        return self.line_end - self.line_begin + 1
+
+    @property
+    def local_variables(self) -> t.Set[str]:
+        """Names of variables declared or assigned in the routine, other than its parameters."""
+        names = {_.attrib['name'] for _ in self.xml.iterfind('./body//declaration//variable')}
+        names |= {_.attrib['id'] for _ in self.xml.iterfind('./body//assignment/target/name')}
+        names |= {_.attrib['name'] for _ in self.xml.iterfind('./body//index-variable')}
+        parameters = {_.attrib['name'].lower()
+                      for _ in self.xml.iterfind('./header/arguments/argument')}
+        return {_.lower() for _ in names} - parameters
+
+    def __repr__(self):
+        return '{}({}, {}:{}-{})'.format(type(self).__name__, self.name, self.path,
+                                         self.line_begin, self.line_end)
+
+
+class FortranCallSite:
+
+    """Call statement in a source file, with its line span including continuation lines."""
+
+    def __init__(self, name: str, path: pathlib.Path, xml: ET.Element,
+                 line_begin: int, line_end: int, loop_depth: int, caller: t.Optional[str]):
+        self.name = name
+        self.path = path
+        self.xml = xml
+        self.line_begin = line_begin
+        self.line_end = line_end
+        self.loop_depth = loop_depth
+        self.caller = caller
+
+    def __repr__(self):
+        return '{}({}, {}:{}-{}, loop_depth={})'.format(
+            type(self).__name__, self.name, self.path, self.line_begin, self.line_end,
+            self.loop_depth)
+
+
+class FortranCallIndex:
+
+    """Cross-file index of subroutine definitions and call sites.
+
+    Names of subroutines are case-insensitive, and are stored in lower case.
+    """
+
+    def __init__(self, parser: t.Optional[Parser] = None):
+        self._parser = parser
+        self.codes = {}  # type: t.Dict[pathlib.Path, str]
+        self.routines = {}  # type: t.Dict[str, FortranRoutine]
+        self.ambiguous_routines = set()  # type: t.Set[str]
+        self.call_sites = []  # type: t.List[FortranCallSite]
+
+    @classmethod
+    def from_paths(cls, paths: t.Iterable[pathlib.Path]) -> 'FortranCallIndex':
+        index = cls()
+        for path in paths:
+            index.add_file(path)
+        return index
+
+    def add_file(self, path: pathlib.Path, code: t.Optional[str] = None,
+                 xml: t.Optional[ET.Element] = None) -> None:
+        """Add definitions and calls from a source file, using already parsed XML if given."""
+        assert path not in self.codes, path
+        if code is None:
+            code = CodeReader().read_file(path)
+        if xml is None:
+            if self._parser is None:
+                self._parser = Parser.find(Language.find('Fortran'))()
+            xml = self._parser.parse(code, path)
+        self.codes[path] = code
+        self._index_node(xml, path, code.splitlines(), is_fixed_form(path), None, 0, None)
+
+    def _index_node(self, node: ET.Element, path: pathlib.Path, lines: t.List[str],
+                    fixed_form: bool, caller: t.Optional[str], loop_depth: int,
+                    span: t.Optional[t.Tuple[int, int]]) -> None:
+        for subnode in node:
+            subnode_span = span
+            if 'line_begin' in subnode.attrib:
+                subnode_span = (int(subnode.attrib['line_begin']),
+                                int(subnode.attrib['line_end']))
+            if subnode.tag == 'call':
+                self._add_call_site(subnode, path, lines, fixed_form, caller, loop_depth,
+                                    subnode_span)
+                continue
+            subnode_caller, subnode_loop_depth = caller, loop_depth
+            if subnode.tag in ('subroutine', 'function', 'program'):
+                subnode_caller, subnode_loop_depth = subnode.attrib.get('name', '').lower(), 0
+                if subnode.tag == 'subroutine':
+                    self._add_routine(subnode, path, subnode_span)
+            elif subnode.tag == 'loop':
+                subnode_loop_depth += 1
+            self._index_node(subnode, path, lines, fixed_form, subnode_caller,
+                             subnode_loop_depth, subnode_span)
+
+    def _add_routine(self, node: ET.Element, path: pathlib.Path,
+                     span: t.Optional[t.Tuple[int, int]]) -> None:
+        name = node.attrib['name'].lower()
+        if span is None:
+            raise SyntaxError('no line numbers for subroutine "{}" in {}'.format(name, path))
+        if name in self.routines:
+            _LOG.warning('subroutine "%s" defined in %s and in %s', name,
+                         self.routines[name].path, path)
+            self.ambiguous_routines.add(name)
+            return
+        self.routines[name] = FortranRoutine(name, path, node, *span)
+
+    def _add_call_site(self, node: ET.Element, path: pathlib.Path, lines: t.List[str],
+                       fixed_form: bool, caller: t.Optional[str], loop_depth: int,
+                       span: t.Optional[t.Tuple[int, int]]) -> None:
+        name_node = node.find('./name')
+        if name_node is None or 'line_begin' not in node.attrib:
+            _LOG.warning('ignoring call without a name or line numbers in %s:\n%s', path,
+                         ET.tostring(node).decode().rstrip())
+            return
+        line_begin, line_end = span
+        line_end = statement_line_end(lines, line_begin, line_end, fixed_form)
+        statement_lines = lines[line_begin - 1:line_end]
+        match = _CALL_STATEMENT.match(statement_lines[0][6:] if fixed_form
+                                      else statement_lines[0])
+        if fixed_form and statement_lines[0][:5].strip():
+            match = None
+        if match is None or match.group(1) is not None \
+                or any(';' in _strip_comment(_) for _ in statement_lines):
+            # replacing the lines would drop a label, a condition or other statements
+            _LOG.warning('ignoring call which is not the only statement in %s:%i-%i',
+                         path, line_begin, line_end)
+            return
+        self.call_sites.append(FortranCallSite(
+            name_node.attrib['id'].lower(), path, node, line_begin, line_end, loop_depth, caller))
+
+    def calls_to(self, name: str) -> t.List[FortranCallSite]:
+        name = name.lower()
+        return [call_site for call_site in self.call_sites if call_site.name == name]
+
+    def select_call_sites(self, routines: t.Iterable[str] = (),
+                          max_lines: t.Optional[int] = None,
+                          min_loop_depth: int = 0) -> t.List[FortranCallSite]:
+        """Select call sites for inlining.
+
+        All calls to given routines are selected. Additionally, if max_lines is given, calls to
+        all routines that have at most that many lines are selected, but only if the call
+        is nested in at least min_loop_depth loops. Calls within the called routine itself and
+        calls to routines which are not defined, or defined more than once, or which have
+        local variables, are never selected.
+        """
+        routines = {_.lower() for _ in routines}
+        for name in routines:
+            if name not in self.routines:
+                raise KeyError('subroutine "{}" is not defined in indexed files'.format(name))
+            if name in self.ambiguous_routines:
+                raise ValueError('subroutine "{}" is defined more than once'.format(name))
+            if self.routines[name].local_variables:
+                raise ValueError('subroutine "{}" has local variables {}'.format(
+                    name, sorted(self.routines[name].local_variables)))
+        selected = []
+        for call_site in self.call_sites:
+            name = call_site.name
+            if name not in self.routines or name in self.ambiguous_routines \
+                    or name == call_site.caller or self.routines[name].local_variables:
+                continue
+            if name in routines or max_lines is not None \
+                    and self.routines[name].lines_count <= max_lines \
+                    and call_site.loop_depth >= min_loop_depth:
+                selected.append(call_site)
+        return selected
+
+
+class FortranProjectInliner:
+
+    """Inline calls to Fortran subroutines in many files at once.
+
+    Each selected call statement is replaced by the body of the called subroutine, with
+    parameters substituted by arguments. All rewrites of a file are applied in a single batch,
+    and calls are not inlined transitively, i.e. calls within inlined bodies are kept.
+
+    Subroutines with local variables are not inlined, because their declarations would have to
+    be moved into the specification part of the caller, and their names could clash with
+    variables of the caller.
+    """
+
+    def __init__(self, index: FortranCallIndex, verbose: bool = True):
+        self.index = index
+        self.verbose = verbose
+        self._ast_generalizer = AstGeneralizer.find(Language.find('Fortran'))()
+        self._unparsers = {
+            True: Unparser.find(Language.find('Fortran 77'))(),
+            False: Unparser.find(Language.find('Fortran 2008'))()}
+        self._call_inliners = {}  # type: t.Dict[str, CallInliner]
+
+    def _call_inliner(self, name: str) -> CallInliner:
+        try:
+            return self._call_inliners[name]
+        except KeyError:
+            pass
+        routine = self.index.routines[name]
+        if routine.local_variables:
+            raise ValueError('cannot inline subroutine "{}" with local variables {}'.format(
+                name, sorted(routine.local_variables)))
+        inlined_syntax = st.augment(self._ast_generalizer.generalize(routine.xml))
+        call_inliner = CallInliner(inlined_syntax, verbose=self.verbose)
+        self._call_inliners[name] = call_inliner
+        return call_inliner
+
+    def inline_call_site(self, call_site: FortranCallSite) -> str:
+        """Create code of the inlined body of the routine, to replace lines of the call site."""
+        call = self._ast_generalizer.generalize(call_site.xml)
+        mock_function = typed_ast3.FunctionDef(
+            'f', typed_ast3.arguments([], None, [], None, [], []), [typed_ast3.Expr(call)], [],
+            None, None)
+        inlined = self._call_inliner(call_site.name).visit(st.augment(mock_function))
+        inlined = st.augment(typed_ast3.Module(inlined.body, []), eval_=False)
+        fixed_form = is_fixed_form(call_site.path)
+        code = self._unparsers[fixed_form].unparse(inlined).strip('\n')
+        if not fixed_form:
+            line = self.index.codes[call_site.path].splitlines()[call_site.line_begin - 1]
+            indentation = line[:len(line) - len(line.lstrip())]
+            code = '\n'.join(indentation + _ if _.strip() else _ for _ in code.splitlines())
+        return code + '\n'
+
+    def inline(self, call_sites: t.Iterable[FortranCallSite]) -> t.Dict[pathlib.Path, str]:
+        """Inline given call sites and return new code of all affected files."""
+        call_sites_by_path = collections.defaultdict(list)
+        for call_site in call_sites:
+            call_sites_by_path[call_site.path].append(call_site)
+        codes = {}
+        for path, path_call_sites in call_sites_by_path.items():
+            patch_set = PatchSet(self.index.codes[path])
+            for call_site in path_call_sites:
+                patch_set.replace_scope(call_site.line_begin, call_site.line_end,
+                                        self.inline_call_site(call_site))
+            codes[path] = patch_set.apply()
+        return codes
+
+    def inline_routines(self, routines: t.Iterable[str] = (), max_lines: t.Optional[int] = None,
+                        min_loop_depth: int = 0) -> t.Dict[pathlib.Path, str]:
+        """Select call sites as in FortranCallIndex.select_call_sites() and inline them."""
+        return self.inline(self.index.select_call_sites(routines, max_lines, min_loop_depth))
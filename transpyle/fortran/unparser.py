@@ -3,9 +3,12 @@
 import ast
 import collections.abc
 import copy
+import functools
 import io
 import itertools
 import logging
+import sys
+import typing as t
 
 from astunparse.unparser import INFSTR
 import horast
@@ -15,13 +18,156 @@ import typed_astunparse
 from typed_astunparse.unparser import interleave
 
 from ..pair import \
-    function_returns, syntax_matches, _match_array, _match_io, returns_array
+    function_returns, syntax_matches, dotted_name, NodePass, FusedVisitor, _match_array, \
+    _match_io, returns_array, openmp_directive, find_openmp_directives, structurally_equal
 from ..general import Language, Unparser
+from ..python.dependence import forall_loop_nest, carries_dependences
 from .definitions import PYTHON_FORTRAN_TYPE_PAIRS, PYTHON_FORTRAN_INTRINSICS
 
 _LOG = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=None)
+def _fortran_var_type(python_type: str) -> t.Optional[t.Tuple[str, ...]]:
+    """Get fragments of Fortran type declaration corresponding to a given Python type."""
+    if python_type not in PYTHON_FORTRAN_TYPE_PAIRS:
+        return None
+    type_name, precision = PYTHON_FORTRAN_TYPE_PAIRS[python_type]
+    if precision is None:
+        return type_name,
+    return type_name, '*', str(precision)
+
+
+def _accesses_file_handles(tree) -> bool:
+    """Check if code of a given expression would start with 'Fortran.file_handles['."""
+    while True:
+        if isinstance(tree, typed_ast3.Subscript):
+            if dotted_name(tree.value) == 'Fortran.file_handles':
+                return True
+            tree = tree.value
+        elif isinstance(tree, typed_ast3.Attribute):
+            tree = tree.value
+        elif isinstance(tree, typed_ast3.Call):
+            tree = tree.func
+        else:
+            return False
+
+
+def _accesses_numpy(tree) -> bool:
+    """Check if code of a given expression would start with 'np.'."""
+    parent = None
+    while isinstance(tree, (typed_ast3.Attribute, typed_ast3.Subscript, typed_ast3.Call)):
+        parent = tree
+        tree = tree.func if isinstance(tree, typed_ast3.Call) else tree.value
+    return isinstance(tree, typed_ast3.Name) and tree.id == 'np' \
+        and isinstance(parent, typed_ast3.Attribute)
+
+
+class _ReturnsCollector(NodePass):
+
+    """Collect return expressions of a function."""
+
+    skipped_types = (typed_ast3.expr,)
+
+    def __init__(self):
+        self.return_expressions = []
+
+    def visit_Return(self, node):  # pylint: disable=invalid-name
+        if node.value is not None:
+            self.return_expressions.append(node.value)
+
+
+class _TypedLoopsCollector(NodePass):
+
+    """Collect type-commented loops of a function, the first one for each loop variable."""
+
+    skipped_types = (typed_ast3.expr,)
+
+    def __init__(self):
+        self.typed_loops = {}
+
+    def visit_For(self, node):  # pylint: disable=invalid-name
+        if isinstance(node.target, typed_ast3.Name) and node.type_comment is not None:
+            self.typed_loops.setdefault(node.target.id, node)
+
+
+class _LineEmitter:
+
+    """Line-buffered output of Fortran unparser.
+
+    Fragments of the current line are collected together with the maximum line length
+    and indentation in effect when each of them was written. When the line ends, continuation
+    rules (fixed-form or free-form) are applied to the whole line at once and it is written
+    to the underlying file in a single call. When all fragments fit, which is the usual case,
+    the line is written as is.
+
+    Text written directly via write() bypasses line length tracking.
+    """
+
+    def __init__(self, file, indent_level: int, fixed_form: bool):
+        self._file = file
+        self._indent_level = indent_level
+        self._fixed_form = fixed_form
+        self._line_len = 0
+        self._pending = []  # type: t.List[t.Tuple[str, t.Optional[int], int]]
+        self._pending_len = 0
+        self._needs_wrapping = False
+
+    def append(self, text: str, max_line_len: t.Optional[int], indent: int) -> None:
+        self._pending.append((text, max_line_len, indent))
+        self._pending_len += len(text)
+        if max_line_len is not None and self._line_len + self._pending_len > max_line_len:
+            self._needs_wrapping = True
+
+    def new_line(self) -> None:
+        self._emit_pending()
+        self._file.write('\n')
+        self._line_len = 1
+
+    def write(self, text: str) -> None:
+        self._emit_pending()
+        self._file.write(text)
+
+    def flush(self) -> None:
+        self._emit_pending()
+        self._file.flush()
+
+    def _emit_pending(self) -> None:
+        if not self._pending:
+            return
+        if self._needs_wrapping:
+            line = []
+            for text, max_line_len, indent in self._pending:
+                self._put(line, text, max_line_len, indent)
+            self._file.write(''.join(line))
+        else:
+            self._file.write(''.join([text for text, _, _ in self._pending]))
+            self._line_len += self._pending_len
+        self._pending = []
+        self._pending_len = 0
+        self._needs_wrapping = False
+
+    def _put(self, line: list, text: str, max_line_len: t.Optional[int], indent: int) -> None:
+        if max_line_len is not None and self._line_len + len(text) > max_line_len:
+            if self._fixed_form:
+                self._put_fill(line, '', max_line_len, indent, continuation=True)
+            else:
+                line.append(' &')
+                self._put_fill(line, ' ' * self._indent_level, max_line_len, indent)
+        line.append(text)
+        self._line_len += len(text)
+
+    def _put_fill(self, line: list, text: str, max_line_len: t.Optional[int], indent: int,
+                  continuation: bool = False) -> None:
+        line.append('\n')
+        self._line_len = 1
+        if self._fixed_form:
+            self._put(line, '      ', max_line_len, indent)
+            self._put(line, '+' if continuation else ' ', max_line_len, indent)
+        self._put(line, ' ' * (self._indent_level * indent), max_line_len, indent)
+        self._put(line, text, max_line_len, indent)
+
+
 class Fortran77UnparserBackend(horast.unparser.Unparser):
 
     """Implementation of Fortran 77 unparser."""
@@ -33,12 +179,58 @@ class Fortran77UnparserBackend(horast.unparser.Unparser):
             **kwargs):
         self._indent_level = indent
         self._fixed_form = fixed_form
-        self._line_len = 0
         self._max_line_len = max_line_len
         self._context = None
         self._context_input_args = False
         self._syntax = args[0]
-        super().__init__(*args, **kwargs)
+        if len(args) > 1:
+            file = args[1]
+            args = args[:1]
+        else:
+            file = kwargs.pop('file', sys.stdout)
+        self._emitter = _LineEmitter(file, indent, fixed_form)
+        self._openmp_directives = find_openmp_directives(self._syntax)
+        super().__init__(*args, file=self._emitter, **kwargs)
+
+    def dispatch(self, tree):
+        super().dispatch(tree)
+        for directive in reversed(self._openmp_directives.get(id(tree), [])):
+            if directive.needs_end:
+                self._fill_openmp_directive(directive.to_fortran_end())
+
+    def _fill_openmp_directive(self, text: str):
+        """Write a directive, starting in the first column in fixed-form code.
+
+        Directive is split at blanks into as many lines as needed to fit in 72 columns
+        in fixed-form code and in 132 columns in free-form code. Continuation lines start
+        with "!$omp&" in fixed form, and in free form all but the last line end with "&".
+        """
+        sentinel, _, text = text.partition(' ')
+        if self._fixed_form:
+            line_len = 72
+            prefixes, suffix = (sentinel + ' ', sentinel + '& '), ''
+        else:
+            line_len = 132 - self._indent_level * self._indent
+            prefixes, suffix = (sentinel + ' ', sentinel + ' '), ' &'
+        lines = []
+        line = prefixes[0]
+        for word in text.split(' '):
+            if line not in prefixes and len(line) + 1 + len(word) + len(suffix) > line_len:
+                lines.append(line + suffix)
+                line = prefixes[1]
+            line += word if line in prefixes else ' ' + word
+        lines.append(line)
+        _max_line_len = self._max_line_len
+        self._max_line_len = None
+        for line in lines:
+            if not self._fixed_form:
+                self.fill(line)
+                continue
+            _indent = self._indent
+            self._indent = 0
+            super().fill(line)
+            self._indent = _indent
+        self._max_line_len = _max_line_len
 
     def fill(self, text='', continuation: bool = False):
         self.write('\n')
@@ -50,18 +242,11 @@ class Fortran77UnparserBackend(horast.unparser.Unparser):
 
     def write(self, text):
         if text == '\n':
-            self._line_len = 0
-        elif '\n' in text:
+            self._emitter.new_line()
+            return
+        if '\n' in text:
             raise NotImplementedError('long text printing not yet implemented')
-        if not self._fixed_form:
-            if self._max_line_len is not None and self._line_len + len(text) > self._max_line_len:
-                super().write(' &')
-                self.fill(' ' * self._indent_level)
-        if self._fixed_form:
-            if self._max_line_len is not None and self._line_len + len(text) > self._max_line_len:
-                self.fill('', continuation=True)
-        super().write(text)
-        self._line_len += len(text)
+        self._emitter.append(text, self._max_line_len, self._indent)
 
     def enter(self):
         self._indent += 1
@@ -77,14 +262,11 @@ class Fortran77UnparserBackend(horast.unparser.Unparser):
             tree.__class__.__name__, typed_ast3.dump(tree), unparsed, self.lang_name))
 
     def dispatch_var_type(self, tree):
-        code = horast.unparse(tree)
-        stripped_code = code.strip()
-        if stripped_code in PYTHON_FORTRAN_TYPE_PAIRS:
-            type_name, precision = PYTHON_FORTRAN_TYPE_PAIRS[stripped_code]
-            self.write(type_name)
-            if precision is not None:
-                self.write('*')
-                self.write(str(precision))
+        type_name = dotted_name(tree)
+        var_type = None if type_name is None else _fortran_var_type(type_name)
+        if var_type is not None:
+            for fragment in var_type:
+                self.write(fragment)
         elif _match_array(tree):
             sli = tree.slice
             assert isinstance(sli, typed_ast3.Index), typed_astunparse.dump(tree)
@@ -129,7 +311,7 @@ class Fortran77UnparserBackend(horast.unparser.Unparser):
             # self._unsupported_syntax(tree)
             # self.dispatch(tree)
 
-    def dispatch_for_iter(self, tree):
+    def dispatch_for_iter(self, tree, separator: str = ', '):
         if not isinstance(tree, typed_ast3.Call) \
                 or not isinstance(tree.func, typed_ast3.Name) or tree.func.id != 'range' \
                 or len(tree.args) not in (1, 2, 3):
@@ -141,7 +323,7 @@ class Fortran77UnparserBackend(horast.unparser.Unparser):
         else:
             lower, upper, step, *_ = tree.args + [None, None]
         self.dispatch(lower)
-        self.write(', ')
+        self.write(separator)
         if isinstance(upper, typed_ast3.BinOp) and isinstance(upper.op, typed_ast3.Add) \
                 and isinstance(upper.right, typed_ast3.Num) and upper.right.n == 1:
             self.dispatch(upper.left)
@@ -149,7 +331,7 @@ class Fortran77UnparserBackend(horast.unparser.Unparser):
             self.dispatch(typed_ast3.BinOp(left=upper, op=typed_ast3.Sub(),
                                            right=typed_ast3.Num(n=1)))
         if step is not None:
-            self.write(', ')
+            self.write(separator)
             self.dispatch(step)
 
     def _Module(self, tree):
@@ -166,7 +348,7 @@ class Fortran77UnparserBackend(horast.unparser.Unparser):
 
     def _Import(self, t):
         names = [name for name in t.names
-                 if name.name not in ('numpy', 'static_typing', 'typing')]
+                 if name.name not in ('math', 'numpy', 'static_typing', 'typing')]
         if not names:
             return
         self.fill('use ')
@@ -371,23 +553,18 @@ class Fortran77UnparserBackend(horast.unparser.Unparser):
             # _LOG.warning('%s', arg.resolved_annotation)
             # _LOG.warning('%s', typed_ast3.dump(arg.resolved_annotation))
 
+        returns_collector = _ReturnsCollector()
+        typed_loops_collector = _TypedLoopsCollector()
+        FusedVisitor([returns_collector, typed_loops_collector]).visit(static_t)
+
         # move return type into arguments
         if function_kind == 'subroutine' and function_returns(t):
-
-            class Visitor(st.ast_manipulation.RecursiveAstVisitor[typed_ast3]):
-                return_expressions = []
-
-                def visit_node(self, node):
-                    if isinstance(node, typed_ast3.Return) and node.value is not None:
-                        self.return_expressions.append(node.value)
-            visitor = Visitor()
-            visitor.visit(static_t)
-            _LOG.warning('return expressions: %s', visitor.return_expressions)
-            if not visitor.return_expressions:
+            _LOG.warning('return expressions: %s', returns_collector.return_expressions)
+            if not returns_collector.return_expressions:
                 raise SyntaxError('expected return statements in function "{}" but zero found'
                                   .format(t.name))
             returned_name = None
-            for return_expression in visitor.return_expressions:
+            for return_expression in returns_collector.return_expressions:
                 assert isinstance(return_expression, typed_ast3.Name), \
                     'only simple name can be returned'
                 if returned_name is None:
@@ -407,7 +584,8 @@ class Fortran77UnparserBackend(horast.unparser.Unparser):
         self.write(')')
         self.enter()
 
-        docstring = typed_ast3.get_docstring(t)
+        docstring = None if t.body and isinstance(t.body[0], horast.nodes.Comment) \
+            else typed_ast3.get_docstring(t)
         # _LOG.warning(docstring)
         if docstring is not None:
             for stmt in t.body:
@@ -458,21 +636,12 @@ class Fortran77UnparserBackend(horast.unparser.Unparser):
         if from_python and static_t._local_vars:
             self.fill('! local vars')
             for var in static_t._local_vars:
-
-                class Visitor(st.ast_manipulation.RecursiveAstVisitor[typed_ast3]):
-                    def visit_node(self, node):
-                        if isinstance(node, typed_ast3.For) and node.target.id == var \
-                                and node.type_comment is not None:
-                            node.type_comment = None
-                            declaration = typed_ast3.AnnAssign(
-                                target=node.target, value=None, annotation=node.resolved_type_comment)
-                            raise ValueError(declaration)
-                visitor = Visitor()
-                try:
-                    visitor.visit(static_t)
+                if var not in typed_loops_collector.typed_loops:
                     self.fill('! oh la la')
-                except ValueError as err:
-                    self.dispatch(err.args[0])
+                    continue
+                loop = typed_loops_collector.typed_loops[var]
+                self.dispatch(typed_ast3.AnnAssign(
+                    target=loop.target, value=None, annotation=loop.resolved_type_comment))
                 # for stmt in static_t.body:
                 #    if isinstance(stmt, typed_ast3.For) and stmt.type_comment is not None:
                 #        stmt.type_comment = None
@@ -736,11 +905,12 @@ class Fortran77UnparserBackend(horast.unparser.Unparser):
     def _Call(self, t):
         if getattr(t, 'fortran_metadata', {}).get('is_procedure_call', False):
             self.write('call ')
-        func_name = horast.unparse(t.func).strip()
-        if func_name.startswith('Fortran.file_handles['):
+        func_name = dotted_name(t.func)
+        func_attr = t.func.attr if isinstance(t.func, typed_ast3.Attribute) else None
+        if _accesses_file_handles(t.func):
             t = copy.copy(t)
             for suffix in ('read', 'close'):
-                if func_name.endswith('].{}'.format(suffix)):
+                if func_attr == suffix and isinstance(t.func.value, typed_ast3.Subscript):
                     t.args.insert(0, t.func.value.slice.value)
                     t.func = typed_ast3.Name(id=suffix, ctx=typed_ast3.Load())
                     break
@@ -749,23 +919,23 @@ class Fortran77UnparserBackend(horast.unparser.Unparser):
             # elif func_name.endswith('].close'):
             #    t.func = typed_ast3.Name(id='close', ctx=typed_ast3.Load())
             else:
-                raise NotImplementedError(func_name)
-        elif func_name.endswith('.format'):
+                raise NotImplementedError(horast.unparse(t.func).strip())
+        elif func_attr == 'format':
             t = copy.copy(t)
             prefix, _, label = t.func.value.id.rpartition('_')
             assert prefix == 'format_label', prefix
             self.write(label)
             self.write(' ')
             t.func = typed_ast3.Name(id='format', ctx=typed_ast3.Load())
-        elif func_name.endswith('.rstrip'):
+        elif func_attr == 'rstrip':
             t = copy.copy(t)
             t.args.insert(0, t.func.value)
             t.func = typed_ast3.Name(id='trim', ctx=typed_ast3.Load())
-        elif func_name.endswith('.sum'):
+        elif func_attr == 'sum' and not _accesses_numpy(t.func):
             t = copy.copy(t)
             t.args.insert(0, t.func.value)
             t.func = typed_ast3.Name(id='count', ctx=typed_ast3.Load())
-        elif func_name.endswith('.shape'):
+        elif func_attr == 'shape':
             _LOG.warning('assuming np.shape()')
             t = copy.copy(t)
             t.args[0].n += 1
@@ -779,9 +949,9 @@ class Fortran77UnparserBackend(horast.unparser.Unparser):
                 return
             t = copy.copy(t)
             t.func = typed_ast3.Name(id=new_func, ctx=typed_ast3.Load())
-        elif func_name.startswith('np.'):
+        elif _accesses_numpy(t.func):
             raise NotImplementedError('not yet implemented: {}'.format(typed_astunparse.dump(t)))
-        if func_name not in ('print',):
+        if func_name != 'print':
             super()._Call(t)
             return
 
@@ -797,9 +967,9 @@ class Fortran77UnparserBackend(horast.unparser.Unparser):
 
     def _Subscript(self, t):
         val = t.value
-        unparsed_val = horast.unparse(val).strip()
-        if unparsed_val in PYTHON_FORTRAN_INTRINSICS:
-            new_val = PYTHON_FORTRAN_INTRINSICS[unparsed_val]
+        val_name = dotted_name(val)
+        if val_name in PYTHON_FORTRAN_INTRINSICS:
+            new_val = PYTHON_FORTRAN_INTRINSICS[val_name]
             if isinstance(new_val, collections.abc.Callable):
                 self.dispatch(new_val(t))
                 return
@@ -898,6 +1068,11 @@ class Fortran77UnparserBackend(horast.unparser.Unparser):
         metadata = getattr(node, 'fortran_metadata', {})
         _max_line_len = self._max_line_len
         self._max_line_len = None
+        openmp_directive_ = openmp_directive(node)
+        if openmp_directive_ is not None:
+            self._fill_openmp_directive(openmp_directive_.to_fortran())
+            self._max_line_len = _max_line_len
+            return
         if metadata.get('is_directive', False):
             _indent = self._indent
             self._indent = 0
@@ -937,6 +1112,72 @@ class Fortran2008UnparserBackend(Fortran77UnparserBackend):
     cmpops = {
         'Eq': '==', 'NotEq': '/=', 'Lt': '<', 'LtE': '<=', 'Gt': '>', 'GtE': '>='}
 
+    def _is_array(self, target) -> bool:
+        """Check if target is an array section or a name of an array in current function."""
+        if isinstance(target, typed_ast3.Subscript):
+            return isinstance(target.slice, typed_ast3.Slice) \
+                or isinstance(target.slice, typed_ast3.ExtSlice) \
+                and any(isinstance(_, typed_ast3.Slice) for _ in target.slice.dims)
+        if not isinstance(target, typed_ast3.Name) or self._context is None:
+            return False
+        for arg in self._context.args.args:
+            if arg.arg == target.id:
+                return _match_array(getattr(arg, 'resolved_annotation', arg.annotation))
+        return any(isinstance(node, typed_ast3.AnnAssign) and node.simple
+                   and node.target.id == target.id and _match_array(node.annotation)
+                   for node in typed_ast3.walk(self._context))
+
+    def _Assign(self, t):
+        """Unparse "a = np.where(mask, b, a)" as "where (mask) a = b" statement.
+
+        This is done only if a is an array, and otherwise merge() is used.
+        """
+        value = t.value
+        if len(t.targets) != 1 or getattr(t, 'fortran_metadata', {}) \
+                or not isinstance(value, typed_ast3.Call) or dotted_name(value.func) != 'np.where' \
+                or len(value.args) != 3 or value.keywords or not self._is_array(t.targets[0]):
+            super()._Assign(t)
+            return
+        target = copy.copy(t.targets[0])
+        target.ctx = typed_ast3.Load()
+        mask, assigned, kept = value.args
+        if structurally_equal(assigned, target):
+            mask = typed_ast3.UnaryOp(op=typed_ast3.Not(), operand=mask)
+            assigned, kept = kept, assigned
+        if not structurally_equal(kept, target):
+            super()._Assign(t)
+            return
+        self.fill('where (')
+        self.dispatch(mask)
+        self.write(') ')
+        self.dispatch(t.targets[0])
+        self.write(' = ')
+        self.dispatch(assigned)
+
+    def _For(self, t):
+        """Unparse loops generated from forall as "do concurrent" if they carry no dependences.
+
+        Otherwise, they are unparsed as forall construct, which has semantics of array
+        assignments, i.e. all right-hand sides are evaluated before any assignment.
+        """
+        loops = forall_loop_nest(t)
+        if not loops:
+            super()._For(t)
+            return
+        construct = 'forall' if carries_dependences(loops) else 'do concurrent'
+        self.fill('{} ('.format(construct))
+        for i, loop in enumerate(loops):
+            if i > 0:
+                self.write(', ')
+            self.dispatch(loop.node.target)
+            self.write(' = ')
+            self.dispatch_for_iter(loop.node.iter, separator=':')
+        self.write(')')
+        self.enter()
+        self.dispatch(loops[-1].node.body)
+        self.leave()
+        self.fill('end forall' if construct == 'forall' else 'end do')
+
 
 class Fortran2008Unparser(Unparser):
 
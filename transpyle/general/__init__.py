@@ -11,5 +11,6 @@ from .code_writer import CodeWriter
 from .compiler import Compiler
 from .binder import Binder
 
-from .translator import Translator, AutoTranslator
+from .pass_manager import Transformation, FunctionTransformation, PassManager, load_transformation
+from .translator import Translator, AutoTranslator, MultiTranslator, AutoMultiTranslator
 from .transpiler import Transpiler, AutoTranspiler
@@ -20,11 +20,13 @@ class Language(Registry):
 
     def __init__(
             self, names: t.Sequence[str], file_extensions: t.Sequence[str],
-            version: t.Optional[tuple] = None):
+            version: t.Optional[tuple] = None, array_layout: str = 'C'):
         """Initialize a Language instance.
 
         :param names: list of names of the language
         :param file_extensions: file extensions, including the dot
+        :param array_layout: memory layout of multidimensional arrays, as in NumPy: "C" for
+            row-major (last index is contiguous), "F" for column-major (first index is contiguous)
         """
         assert isinstance(names, collections.abc.Sequence), type(names)
         assert names
@@ -39,12 +41,14 @@ class Language(Registry):
                 assert file_extension
                 assert file_extension.startswith('.'), file_extension
         assert isinstance(version, tuple) or version is None
+        assert array_layout in ('C', 'F'), array_layout
 
         self.names = [name for name in names]
         self.default_name = self.names[0]
         self.file_extensions = [file_extension.lower() for file_extension in file_extensions]
         self.default_file_extension = self.file_extensions[0]
         self.version = version
+        self.array_layout = array_layout
 
     @property
     def lowercase_name(self) -> str:
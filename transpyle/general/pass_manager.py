@@ -0,0 +1,176 @@
+"""Running transformations of generalized AST between generalization and unparsing."""
+
+import ast
+import difflib
+import importlib.util
+import logging
+import pathlib
+import time
+import typing as t
+
+import horast
+import typed_ast.ast3 as typed_ast3
+
+from ..pair import structural_hash, clone, serialize_ast, deserialize_ast
+from .registry import Registry
+
+_LOG = logging.getLogger(__name__)
+
+
+class Transformation(Registry):
+
+    """AST-to-AST transformation of generalized AST, i.e. a single pass of the pass manager.
+
+    Transformations are registered by name, and configured via keyword arguments, which are
+    also used to identify cached results of a transformation.
+    """
+
+    def __init__(self, **config):
+        self.config = config
+
+    @property
+    def name(self) -> str:
+        return type(self).__name__
+
+    def cache_key(self) -> t.Hashable:
+        """Identify this transformation and its configuration in the cache of pass manager."""
+        return type(self).__qualname__, repr(sorted(self.config.items()))
+
+    def apply(self, tree: typed_ast3.AST) -> typed_ast3.AST:
+        """Transform the tree, possibly in-place, and return the transformed tree."""
+        raise NotImplementedError()
+
+    def __repr__(self):
+        return '{}({})'.format(self.name, ', '.join(
+            '{}={!r}'.format(key, value) for key, value in self.config.items()))
+
+
+class FunctionTransformation(Transformation):
+
+    """Transformation defined by any callable that takes and returns a tree."""
+
+    def __init__(self, function: t.Callable[[typed_ast3.AST], typed_ast3.AST],
+                 name: t.Optional[str] = None, **config):
+        super().__init__(**config)
+        self._function = function
+        self._name = function.__name__ if name is None else name
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def cache_key(self) -> t.Hashable:
+        return self._function.__module__, self._function.__qualname__, self._name, \
+            repr(sorted(self.config.items()))
+
+    def apply(self, tree: typed_ast3.AST) -> typed_ast3.AST:
+        return self._function(tree, **self.config)
+
+
+def _parse_config_value(value: str):
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+def load_transformation(specification: str) -> Transformation:
+    """Create a transformation from its textual specification.
+
+    Specification is either a name of a registered transformation or a path to a Python script
+    which defines function "transform(tree, **config) -> tree". In both cases, it can be followed
+    by configuration, as in "name:key1=value1:key2=value2", where values are Python literals
+    (or are treated as strings otherwise).
+    """
+    name, *config_items = specification.split(':')
+    config = {}
+    for config_item in config_items:
+        key, separator, value = config_item.partition('=')
+        if not separator:
+            raise ValueError('invalid configuration "{}" of transformation "{}"'
+                             .format(config_item, name))
+        config[key] = _parse_config_value(value)
+    if name.endswith('.py'):
+        path = pathlib.Path(name)
+        spec = importlib.util.spec_from_file_location(
+            'transpyle_transformation_{}'.format(path.stem), str(path))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        if not callable(getattr(module, 'transform', None)):
+            raise ValueError('script "{}" does not define function "transform"'.format(path))
+        return FunctionTransformation(module.transform, name=str(path.resolve()), **config)
+    transformation_type = Transformation.find(name)
+    if transformation_type is None:
+        raise KeyError('transformation "{}" is not registered'.format(name))
+    return transformation_type(**config)
+
+
+class PassManager:
+
+    """Run an ordered list of transformations on generalized AST.
+
+    Time spent in each pass is recorded. Optionally, results of each pass are cached by structural
+    hash of the input AST and by configuration of the pass, so that repeated transformation of
+    the same code is not repeated. A cached result is used only if the serialized input AST,
+    including extra data attached to nodes, is identical to the one it was computed from.
+
+    In dry-run mode, the input AST is not modified -- instead, each pass is applied to a copy
+    and differences in unparsed code before and after each pass are recorded.
+    """
+
+    def __init__(self, transformations: t.Sequence[Transformation] = (), cache: bool = False,
+                 dry_run: bool = False):
+        self.transformations = list(transformations)
+        self.cache = {} if cache else None \
+            # type: t.Optional[t.Dict[t.Hashable, t.Tuple[bytes, bytes]]]
+        self.dry_run = dry_run
+        self.timings = []  # type: t.List[t.Tuple[str, float]]
+        self.diffs = []  # type: t.List[t.Tuple[str, str]]
+
+    def run(self, tree: typed_ast3.AST) -> typed_ast3.AST:
+        """Apply all transformations in order, and return the transformed tree.
+
+        In dry-run mode, the original tree is returned unchanged.
+        """
+        original_tree = tree
+        if self.dry_run:
+            tree = clone(tree)
+        for transformation in self.transformations:
+            code = horast.unparse(tree) if self.dry_run else None
+            timer = time.perf_counter()
+            tree = self._run_pass(transformation, tree)
+            duration = time.perf_counter() - timer
+            self.timings.append((transformation.name, duration))
+            _LOG.debug('pass %s took %f s', transformation, duration)
+            if self.dry_run:
+                self.diffs.append((transformation.name, ''.join(difflib.unified_diff(
+                    code.splitlines(keepends=True), horast.unparse(tree).splitlines(keepends=True),
+                    'before {}'.format(transformation.name),
+                    'after {}'.format(transformation.name)))))
+        if self.dry_run:
+            return original_tree
+        return tree
+
+    def _run_pass(self, transformation: Transformation, tree: typed_ast3.AST) -> typed_ast3.AST:
+        if self.cache is None:
+            return transformation.apply(tree)
+        key = (structural_hash(tree), transformation.cache_key())
+        serialized_tree = serialize_ast(tree)
+        try:
+            cached_input, cached_output = self.cache[key]
+        except KeyError:
+            pass
+        else:
+            if cached_input == serialized_tree:
+                return deserialize_ast(cached_output)
+        tree = transformation.apply(tree)
+        self.cache[key] = serialized_tree, serialize_ast(tree)
+        return tree
+
+    @property
+    def summary(self) -> t.Dict[str, float]:
+        """Total time spent in each pass."""
+        summary = {}
+        for name, duration in self.timings:
+            summary[name] = summary.get(name, 0.0) + duration
+        return summary
@@ -1,16 +1,20 @@
 """For running external tools in a slightly isolated ."""
 
 import contextlib
+import ctypes.util
 import io
 import logging
 import os
 import pathlib
 import subprocess
+import typing as t
 
 import argunparse
 
 _LOG = logging.getLogger(__name__)
 
+BLAS_LIBRARIES = ('openblas', 'blas')
+
 
 def _postprocess_result(result: subprocess.CompletedProcess) -> None:
     if isinstance(result.stdout, bytes):
@@ -87,3 +91,11 @@ def call_tool(function, args=(), kwargs=None, cwd: pathlib.Path = None,
     if result.returncode != 0:
         raise RuntimeError('execution of {}() failed: {}'.format(function.__name__, result))
     return result
+
+
+def find_blas_library() -> t.Optional[str]:
+    """Find a locally installed BLAS library, and return its name as used in "-l" option."""
+    for name in BLAS_LIBRARIES:
+        if ctypes.util.find_library(name) is not None:
+            return name
+    return None
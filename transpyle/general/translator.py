@@ -1,29 +1,36 @@
 """Translation of source code."""
 
+import concurrent.futures
 import inspect
 import pathlib
 import typing as t
 
+from ..pair import clone, serialize_ast, deserialize_ast
 from .registry import Registry
 from .language import Language
 from .parser import Parser
 from .ast_generalizer import AstGeneralizer
 from .unparser import Unparser
+from .pass_manager import PassManager
 
 
 class Translator(Registry):
 
     """Translate from one programming language to another."""
 
-    def __init__(self, parser: Parser, ast_generalizer: AstGeneralizer, unparser: Unparser):
+    def __init__(self, parser: Parser, ast_generalizer: AstGeneralizer, unparser: Unparser,
+                 pass_manager: t.Optional[PassManager] = None):
         self.parser = parser
         self.ast_generalizer = ast_generalizer
         self.unparser = unparser
+        self.pass_manager = pass_manager
 
     def translate(self, code: str, path: t.Optional[pathlib.Path] = None, parser_kwargs: dict = {},
                   ast_generalizer_kwargs: dict = {}, unparser_kwargs: dict = {}) -> str:
         specific_ast = self.parser.parse(code, path, **parser_kwargs)
         general_ast = self.ast_generalizer.generalize(specific_ast, **ast_generalizer_kwargs)
+        if self.pass_manager is not None:
+            general_ast = self.pass_manager.run(general_ast)
         to_code = self.unparser.unparse(general_ast, **unparser_kwargs)
         return to_code
 
@@ -39,9 +46,88 @@ class AutoTranslator(Translator):
     """Automatically find parser/unparser pair and translate between programming languages."""
 
     def __init__(self, from_language: Language, to_language: Language, parser_kwargs: dict = {},
-                 ast_generalizer_kwargs: dict = {}, unparser_kwargs: dict = {}):
+                 ast_generalizer_kwargs: dict = {}, unparser_kwargs: dict = {},
+                 pass_manager: t.Optional[PassManager] = None):
         super().__init__(Parser.find(from_language)(**parser_kwargs),
                          AstGeneralizer.find(from_language)(**ast_generalizer_kwargs),
-                         Unparser.find(to_language)(**unparser_kwargs))
+                         Unparser.find(to_language)(**unparser_kwargs), pass_manager)
         self.from_language = from_language
         self.to_language = to_language
+
+
+def _unparse_serialized(unparser: Unparser, data: bytes, unparser_kwargs: dict) -> str:
+    return unparser.unparse(deserialize_ast(data), **unparser_kwargs)
+
+
+class MultiTranslator:
+
+    """Translate from one programming language to several others at once.
+
+    Code is parsed and generalized only once. Then the generalized AST is unparsed to all target
+    languages in parallel, in worker processes. Each unparser receives its own copy of the
+    generalized AST, so the shared AST is never modified.
+    """
+
+    def __init__(self, parser: Parser, ast_generalizer: AstGeneralizer,
+                 unparsers: t.Mapping[t.Any, Unparser], max_workers: t.Optional[int] = None,
+                 pass_manager: t.Optional[PassManager] = None):
+        """Initialize a MultiTranslator instance.
+
+        :param unparsers: mapping from target (e.g. Language) to unparser for that target
+        :param max_workers: number of worker processes, by default one per target;
+            if 1, all unparsing is done sequentially in the current process
+        """
+        assert unparsers
+        self.parser = parser
+        self.ast_generalizer = ast_generalizer
+        self.unparsers = dict(unparsers)
+        self.max_workers = len(self.unparsers) if max_workers is None else max_workers
+        self.pass_manager = pass_manager
+
+    def translate(self, code: str, path: t.Optional[pathlib.Path] = None,
+                  parser_kwargs: dict = {}, ast_generalizer_kwargs: dict = {},
+                  unparser_kwargs: t.Mapping[t.Any, dict] = {}) -> t.Dict[t.Any, str]:
+        """Translate code into all target languages.
+
+        Return mapping from each target to code in the target language.
+        """
+        specific_ast = self.parser.parse(code, path, **parser_kwargs)
+        general_ast = self.ast_generalizer.generalize(specific_ast, **ast_generalizer_kwargs)
+        if self.pass_manager is not None:
+            general_ast = self.pass_manager.run(general_ast)
+        return self.unparse(general_ast, unparser_kwargs)
+
+    def unparse(self, general_ast, unparser_kwargs: t.Mapping[t.Any, dict] = {}
+                ) -> t.Dict[t.Any, str]:
+        """Unparse a generalized AST into all target languages, without modifying it."""
+        if self.max_workers == 1 or len(self.unparsers) == 1:
+            return {target: unparser.unparse(clone(general_ast), **unparser_kwargs.get(target, {}))
+                    for target, unparser in self.unparsers.items()}
+        data = serialize_ast(general_ast)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {target: executor.submit(_unparse_serialized, unparser, data,
+                                               unparser_kwargs.get(target, {}))
+                       for target, unparser in self.unparsers.items()}
+            return {target: future.result() for target, future in futures.items()}
+
+    def translate_object(self, code_object) -> t.Dict[t.Any, str]:
+        assert inspect.iscode(code_object), type(code_object)
+        code = inspect.getsource(code_object)
+        path_str = inspect.getabsfile(code_object)
+        return self.translate(code, pathlib.Path(path_str))
+
+
+class AutoMultiTranslator(MultiTranslator):
+
+    """Automatically find parser and unparsers, and translate into several languages at once."""
+
+    def __init__(self, from_language: Language, to_languages: t.Sequence[Language],
+                 parser_kwargs: dict = {}, ast_generalizer_kwargs: dict = {},
+                 unparser_kwargs: dict = {}, max_workers: t.Optional[int] = None,
+                 pass_manager: t.Optional[PassManager] = None):
+        super().__init__(Parser.find(from_language)(**parser_kwargs),
+                         AstGeneralizer.find(from_language)(**ast_generalizer_kwargs),
+                         {to_language: Unparser.find(to_language)(**unparser_kwargs)
+                          for to_language in to_languages}, max_workers, pass_manager)
+        self.from_language = from_language
+        self.to_languages = list(to_languages)
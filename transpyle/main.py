@@ -7,7 +7,8 @@ import sys
 import ordered_set
 import pandas as pd
 
-from .general import Language, CodeReader, CodeWriter, AutoTranslator
+from .general import Language, CodeReader, CodeWriter, AutoTranslator, PassManager, \
+    load_transformation
 from .general import Parser, AstGeneralizer, Unparser, Compiler, Binder
 
 PROG_NAME = 'transpyle'
@@ -77,10 +78,19 @@ def parse_args(args=None):
     parser.add_argument('--keep', action='store_true',
                         help='do not discard not-transpiled scopes of the code')
     parser.add_argument('--transformations', metavar='name', type=str, nargs='*',
-                        help='specify Python script that defines performed AST transformations')
+                        help='AST transformations to perform in the given order, each is a name of'
+                        ' registered transformation or a path to Python script that defines'
+                        ' function "transform(tree, **config)", optionally followed by'
+                        ' configuration, e.g. "inline:inlined=\'buy\':verbose=False"')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='print changes made by each transformation instead of writing'
+                        ' the target')
 
     parsed_args = parser.parse_args(args)
 
+    if parsed_args.dry_run and not parsed_args.transformations:
+        parser.error('--dry-run option requires --transformations')
+
     return parsed_args
 
 
@@ -104,7 +114,7 @@ def main(args=None):
     if parsed_args.source is None:
         raise NotImplementedError('source path was not provided')
 
-    if parsed_args.target is None:
+    if parsed_args.target is None and not parsed_args.dry_run:
         raise NotImplementedError('printing to stdout not supported yet')
 
     if any(_ is None for _ in (parsed_args.from_language, parsed_args.to_language)):
@@ -119,19 +129,28 @@ def main(args=None):
     if parsed_args.keep:
         raise NotImplementedError('--keep option not suppored yet')
 
-    if parsed_args.transformations is not None:
-        raise NotImplementedError('--trasformations option not suppored yet')
-
     from_language = Language.find(parsed_args.from_language)
     to_language = Language.find(parsed_args.to_language)
 
+    pass_manager = None
+    if parsed_args.transformations:
+        pass_manager = PassManager([load_transformation(_) for _ in parsed_args.transformations],
+                                   dry_run=parsed_args.dry_run)
+
     reader = CodeReader(from_language.file_extensions)
-    translator = AutoTranslator(from_language, to_language)
+    translator = AutoTranslator(from_language, to_language, pass_manager=pass_manager)
     writer = CodeWriter(to_language.default_file_extension)
 
     from_path = pathlib.Path(parsed_args.source)
-    to_path = pathlib.Path(parsed_args.target)
 
     from_code = reader.read_file(from_path)
     to_code = translator.translate(from_code, from_path)
+
+    if parsed_args.dry_run:
+        for (name, diff), (_, duration) in zip(pass_manager.diffs, pass_manager.timings):
+            print('{} ({:.3f}s):'.format(name, duration))
+            print(diff if diff else 'no changes')
+        return
+
+    to_path = pathlib.Path(parsed_args.target)
     writer.write_file(to_code, to_path)
@@ -6,7 +6,13 @@ import typed_ast.ast3 as typed_ast3
 
 from .assertions import function_returns, is_ast_none, syntax_matches
 from .manipulate import fix_stmts_in_body, separate_args_and_keywords
-from .code_manipulation import replace_line, replace_scope
+from .code_manipulation import replace_line, replace_scope, PatchSet
+from .compact_ast import CompactAst, compact, expand
+from .fused_visitor import NodePass, FusedVisitor, FusedTransformer
+from .openmp import OpenMpDirective, openmp_directive, find_openmp_directives
+from .serialization import AST_FORMAT_VERSION, AstFormatError, serialize_ast, deserialize_ast
+from .structural import \
+    StructuralHasher, structural_hash, structurally_equal, clone, dotted_name
 from .synthetic_ast import \
     make_range_call, make_call_from_slice, make_expression_from_slice, make_slice_from_call, \
     make_numpy_constructor, make_st_ndarray
@@ -3,6 +3,8 @@ import typing as t
 
 import typed_ast.ast3 as typed_ast3
 
+from .structural import structurally_equal
+
 
 def function_returns(function: typed_ast3.FunctionDef) -> bool:
     """Establish if a given function is not 'void'."""
@@ -18,10 +20,6 @@ def is_ast_none(syntax) -> bool:
     return isinstance(syntax, typed_ast3.NameConstant) and syntax.value is None
 
 
-def syntax_matches(syntax, target):
-    _01 = typed_ast3.dump(syntax)
-    _02 = typed_ast3.dump(target)
-    return _01 == _02
-    # import ipdb; ipdb.set_trace()
-    # raise TypeError()
-    # return False
+def syntax_matches(syntax, target) -> bool:
+    """Establish if two nodes are equivalent, i.e. if their typed_ast3.dump() would be equal."""
+    return structurally_equal(syntax, target)
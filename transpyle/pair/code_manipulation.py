@@ -1,3 +1,5 @@
+import itertools
+import typing as t
 
 
 def replace_line(code: str, line: int, replacement: str = '') -> str:
@@ -19,3 +21,55 @@ def replace_scope(code: str, line_begin: int, line_end: int, replacement: str =
 
 
 # replace_scope('a\nb\nc\nd\n', 1, 2, 'b\na\n')
+
+
+class PatchSet:
+
+    """Set of line-based edits of a code, all applied at once.
+
+    All line numbers refer to the original code, regardless of other edits in the set. Applying
+    the set gives the same result as applying replace_scope() for each edit, from the last edit
+    in the code to the first, but it takes linear time in the size of the code.
+    """
+
+    def __init__(self, code: str):
+        assert isinstance(code, str)
+        self.code = code
+        self._lines_count = len(code.splitlines())
+        self._patches = []  # type: t.List[t.Tuple[int, int, str]]
+
+    def __len__(self):
+        return len(self._patches)
+
+    def replace_line(self, line: int, replacement: str = '') -> None:
+        self.replace_scope(line, line, replacement)
+
+    def replace_scope(self, line_begin: int, line_end: int, replacement: str = '') -> None:
+        assert isinstance(replacement, str)
+        if not 1 <= line_begin <= line_end <= self._lines_count:
+            raise ValueError('invalid scope {}-{} in code of {} lines'.format(
+                line_begin, line_end, self._lines_count))
+        self._patches.append((line_begin, line_end, replacement))
+
+    def sorted_patches(self) -> t.List[t.Tuple[int, int, str]]:
+        """Return edits ordered by position in the code, and make sure that they do not overlap."""
+        patches = sorted(self._patches, key=lambda patch: patch[:2])
+        for previous, patch in zip(patches, patches[1:]):
+            if patch[0] <= previous[1]:
+                raise ValueError('scope {}-{} overlaps with scope {}-{}'.format(
+                    patch[0], patch[1], previous[0], previous[1]))
+        return patches
+
+    def apply(self) -> str:
+        """Return the code with all edits applied."""
+        patches = self.sorted_patches()
+        offsets = [0] + list(itertools.accumulate(
+            len(line) for line in self.code.splitlines(keepends=True)))
+        output = []
+        position = 0
+        for line_begin, line_end, replacement in patches:
+            output.append(self.code[position:offsets[line_begin - 1]])
+            output.append(replacement)
+            position = offsets[line_end]
+        output.append(self.code[position:])
+        return ''.join(output)
@@ -0,0 +1,204 @@
+"""Compact, table-based representation of generalized AST.
+
+Generalized AST is built from typed_ast3 nodes, each of which carries its own instance dictionary,
+and is often decorated with extra data like Fortran metadata or static typing information.
+For whole-application translations that representation is very memory-hungry, therefore trees
+can be converted into a compact node table for storage between translation stages.
+
+In the table, each node is a single row: an index of its layout (node class with names of stored
+attributes, interned and shared by all similar nodes) and a tuple of attribute values. Child nodes
+are referenced by row index, identifiers and other strings are interned and fieldless nodes
+(like expression contexts and operators) are shared. Conversion is lossless: node classes,
+all fields, positions and any extra attributes are restored, as well as sharing of node objects.
+"""
+
+import array
+import collections.abc
+import sys
+import typing as t
+
+import typed_ast.ast3 as typed_ast3
+
+__all__ = ['CompactAst', 'compact', 'expand']
+
+_PLAIN_TYPES = frozenset({type(None), bool, int, float, complex, bytes, type(Ellipsis)})
+
+_VALUE = 0
+_NODE = 1
+_NODES = 2
+_OTHER = 3
+
+
+class _Ref:
+
+    """Reference to a node row, used inside encoded non-node values."""
+
+    __slots__ = ('index',)
+
+    def __init__(self, index: int):
+        self.index = index
+
+
+class _Container:
+
+    """Encoded sequence, set or mapping, which may contain references to nodes."""
+
+    __slots__ = ('type_', 'items', 'is_mapping')
+
+    def __init__(self, type_: type, items: tuple, is_mapping: bool = False):
+        self.type_ = type_
+        self.items = items
+        self.is_mapping = is_mapping
+
+
+def _is_sequence_of_nodes(value) -> bool:
+    return type(value) is list and all(isinstance(_, typed_ast3.AST) for _ in value)
+
+
+class CompactAst:
+
+    """Array-backed node table equivalent to a typed_ast3 tree.
+
+    Use compact() and expand() (or CompactAst.from_tree() and CompactAst.to_tree()) to convert
+    at stage boundaries.
+    """
+
+    __slots__ = ('layouts', 'node_layouts', 'node_values', 'root')
+
+    def __init__(self):
+        self.layouts = []  # type: t.List[t.Tuple[type, t.Tuple[str, ...], t.Tuple[int, ...]]]
+        self.node_layouts = array.array('I')
+        self.node_values = []  # type: t.List[tuple]
+        self.root = None  # type: int
+
+    def __len__(self):
+        return len(self.node_layouts)
+
+    @classmethod
+    def from_tree(cls, tree: typed_ast3.AST) -> 'CompactAst':
+        return _Compactor(cls()).compact(tree)
+
+    def to_tree(self) -> typed_ast3.AST:
+        layouts = []
+        for node_type, names, kinds in self.layouts:
+            layouts.append((
+                node_type, names,
+                tuple(name for name, kind in zip(names, kinds) if kind == _NODE),
+                tuple(name for name, kind in zip(names, kinds) if kind == _NODES),
+                tuple(name for name, kind in zip(names, kinds) if kind == _OTHER)))
+        nodes = [layouts[_][0].__new__(layouts[_][0]) for _ in self.node_layouts]
+        for node, layout_index, values in zip(nodes, self.node_layouts, self.node_values):
+            _, names, node_names, nodes_names, other_names = layouts[layout_index]
+            node_dict = node.__dict__
+            node_dict.update(zip(names, values))
+            for name in node_names:
+                node_dict[name] = nodes[node_dict[name]]
+            for name in nodes_names:
+                node_dict[name] = [nodes[_] for _ in node_dict[name]]
+            for name in other_names:
+                node_dict[name] = _decode(node_dict[name], nodes)
+        return nodes[self.root]
+
+
+class _Compactor:
+
+    """Populate a node table by traversing a typed_ast3 tree."""
+
+    def __init__(self, table: CompactAst):
+        self._table = table
+        self._layout_indices = {}  # type: t.Dict[tuple, int]
+        self._node_indices = {}  # type: t.Dict[int, int]
+        self._fieldless = {}  # type: t.Dict[type, int]
+
+    def compact(self, tree: typed_ast3.AST) -> CompactAst:
+        self._table.root = self._node(tree)
+        return self._table
+
+    def _layout(self, layout: tuple) -> int:
+        try:
+            return self._layout_indices[layout]
+        except KeyError:
+            index = len(self._table.layouts)
+            self._table.layouts.append(layout)
+            self._layout_indices[layout] = index
+            return index
+
+    def _node(self, node: typed_ast3.AST) -> int:
+        node_indices = self._node_indices
+        try:
+            return node_indices[id(node)]
+        except KeyError:
+            pass
+        node_dict = node.__dict__
+        node_type = type(node)
+        if not node_dict and node_type in self._fieldless:
+            index = self._fieldless[node_type]
+            node_indices[id(node)] = index
+            return index
+        table = self._table
+        index = len(table.node_layouts)
+        node_indices[id(node)] = index
+        table.node_layouts.append(0)
+        table.node_values.append(())
+        if not node_dict:
+            self._fieldless[node_type] = index
+        kinds = []
+        values = []
+        for value in node_dict.values():
+            value_type = type(value)
+            if value_type is str:
+                kinds.append(_VALUE)
+                values.append(sys.intern(value))
+            elif value_type in _PLAIN_TYPES:
+                kinds.append(_VALUE)
+                values.append(value)
+            elif isinstance(value, typed_ast3.AST):
+                kinds.append(_NODE)
+                values.append(self._node(value))
+            elif _is_sequence_of_nodes(value):
+                kinds.append(_NODES)
+                values.append(tuple([self._node(_) for _ in value]))
+            else:
+                kinds.append(_OTHER)
+                values.append(self._encode(value))
+        table.node_layouts[index] = self._layout((node_type, tuple(node_dict), tuple(kinds)))
+        table.node_values[index] = tuple(values)
+        return index
+
+    def _encode(self, value):
+        if isinstance(value, typed_ast3.AST):
+            return _Ref(self._node(value))
+        if type(value) is str:
+            return sys.intern(value)
+        if isinstance(value, dict):
+            return _Container(type(value), tuple(
+                (self._encode(key), self._encode(item)) for key, item in value.items()), True)
+        if isinstance(value, (list, tuple, collections.abc.Set)):
+            return _Container(type(value), tuple(self._encode(_) for _ in value))
+        return value
+
+
+def _decode(value, nodes: t.List[typed_ast3.AST]):
+    if isinstance(value, _Ref):
+        return nodes[value.index]
+    if isinstance(value, _Container):
+        if value.is_mapping:
+            decoded = value.type_()
+            for key, item in value.items:
+                decoded[_decode(key, nodes)] = _decode(item, nodes)
+            return decoded
+        items = [_decode(_, nodes) for _ in value.items]
+        if issubclass(value.type_, tuple) and hasattr(value.type_, '_fields'):  # namedtuple
+            return value.type_(*items)
+        return value.type_(items)
+    return value
+
+
+def compact(tree: typed_ast3.AST) -> CompactAst:
+    """Convert a typed_ast3 tree into a compact node table."""
+    return CompactAst.from_tree(tree)
+
+
+def expand(table: CompactAst) -> typed_ast3.AST:
+    """Restore a typed_ast3 tree from a compact node table."""
+    return table.to_tree()
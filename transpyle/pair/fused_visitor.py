@@ -0,0 +1,151 @@
+"""Running several independent node-local passes over AST in a single traversal.
+
+A pass defines handlers named visit_<NodeClassName>, which are selected according to the MRO of
+the node's class (so visit_FunctionDef also handles statically typed function definitions, and
+visit_expr handles all expressions), and a catch-all handler visit_node. Handlers of all passes
+are looked up once per node type and stored in dispatch tables.
+
+Passes are applied at each node in the order in which they were given, before visiting fields
+of the node (i.e. in pre-order). A pass can declare types of nodes whose subtrees are of no
+interest to it, and subtrees which are of no interest to any pass are not traversed at all.
+
+When transforming, results are the same as if each pass was applied in a separate traversal,
+as long as the passes are independent: if a pass replaces a node, nodes created by that pass are
+visited only by that pass (unless it opts out) and by passes after it, while nodes reused from
+the replaced subtree are visited by all passes. A replacement by a list of nodes (allowed within
+lists of nodes, e.g. in bodies) is not visited again by the pass that created it, and
+a replacement by None removes the node.
+"""
+
+import typing as t
+
+import typed_ast.ast3 as typed_ast3
+
+__all__ = ['NodePass', 'FusedVisitor', 'FusedTransformer']
+
+
+class NodePass:
+
+    """Base class for node-local passes that can be combined into a single traversal."""
+
+    skipped_types = ()  # type: t.Tuple[type, ...]
+    """Types of nodes whose fields (i.e. subtrees) this pass does not need to visit."""
+
+    visits_replacements = True
+    """Whether fields of nodes created by this pass are visited by this pass."""
+
+    def handler(self, node_type: type) -> t.Optional[t.Callable]:
+        """Find the handler of this pass for nodes of a given type."""
+        for base in node_type.__mro__:
+            handler = getattr(self, 'visit_{}'.format(base.__name__), None)
+            if handler is not None:
+                return handler
+        return getattr(self, 'visit_node', None)
+
+
+class FusedVisitor:
+
+    """Visit AST with several passes at once, ignoring values returned by handlers."""
+
+    def __init__(self, passes: t.Sequence[NodePass]):
+        self.passes = list(passes)
+        self._all_passes = tuple(range(len(self.passes)))
+        self._handlers = {}  # type: t.Dict[tuple, t.List[t.Tuple[int, t.Callable]]]
+        self._fields_passes = {}  # type: t.Dict[tuple, t.Tuple[int, ...]]
+
+    def _dispatch(self, node_type: type, active: t.Tuple[int, ...]):
+        key = (node_type, active)
+        try:
+            return self._handlers[key], self._fields_passes[key]
+        except KeyError:
+            pass
+        handlers = []
+        for index in active:
+            handler = self.passes[index].handler(node_type)
+            if handler is not None:
+                handlers.append((index, handler))
+        self._handlers[key] = handlers
+        self._fields_passes[key] = tuple(
+            index for index in active
+            if not issubclass(node_type, self.passes[index].skipped_types))
+        return handlers, self._fields_passes[key]
+
+    def visit(self, tree: typed_ast3.AST) -> None:
+        self._visit(tree, self._all_passes)
+
+    def _visit(self, node: typed_ast3.AST, active: t.Tuple[int, ...]) -> None:
+        handlers, fields_passes = self._dispatch(type(node), active)
+        for _, handler in handlers:
+            handler(node)
+        if not fields_passes:
+            return
+        for name in node._fields:
+            value = getattr(node, name, None)
+            if isinstance(value, typed_ast3.AST):
+                self._visit(value, fields_passes)
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, typed_ast3.AST):
+                        self._visit(item, fields_passes)
+
+
+class FusedTransformer(FusedVisitor):
+
+    """Transform AST with several passes at once, replacing nodes with values returned by handlers.
+
+    The root of the tree cannot be replaced by a list of nodes.
+    """
+
+    def visit(self, tree: typed_ast3.AST) -> typed_ast3.AST:
+        return self._transform(tree, self._all_passes, None)
+
+    def _transform(self, node: typed_ast3.AST, active: t.Tuple[int, ...], origin):
+        if origin is not None and id(node) in origin[0]:
+            active, origin = origin[1], None
+        handlers, _ = self._dispatch(type(node), active)
+        position = 0
+        while position < len(handlers):
+            index, handler = handlers[position]
+            position += 1
+            result = handler(node)
+            if result is node:
+                continue
+            if result is None:
+                return None
+            if origin is None and active[0] < index:
+                # earlier passes did not visit the fields yet, they will visit those that are reused
+                origin = ({id(_) for _ in typed_ast3.walk(node)}, active)
+            remaining = tuple(_ for _ in active if _ > index)
+            if isinstance(result, list):
+                return self._transform_list(result, remaining, origin)
+            node = result
+            active = (index,) + remaining if self.passes[index].visits_replacements else remaining
+            handlers, _ = self._dispatch(type(node), remaining)
+            position = 0
+        _, fields_passes = self._dispatch(type(node), active)
+        if not fields_passes and origin is None:
+            return node
+        for name in node._fields:
+            value = getattr(node, name, None)
+            if isinstance(value, typed_ast3.AST):
+                result = self._transform(value, fields_passes, origin)
+                if result is not value:
+                    setattr(node, name, result)
+            elif isinstance(value, list):
+                setattr(node, name, self._transform_list(value, fields_passes, origin))
+        return node
+
+    def _transform_list(self, nodes: list, active: t.Tuple[int, ...], origin) -> list:
+        if not active and origin is None:
+            return nodes
+        transformed = []
+        for node in nodes:
+            if not isinstance(node, typed_ast3.AST):
+                transformed.append(node)
+                continue
+            result = self._transform(node, active, origin)
+            if isinstance(result, list):
+                transformed += result
+            elif result is not None:
+                transformed.append(result)
+        return transformed
@@ -0,0 +1,188 @@
+"""OpenMP directives, which are stored in the AST as comments.
+
+In the generalized AST, a directive is a comment "pragma omp ..." which uses C/C++ names of
+constructs, so that directives can be written directly in Python code. Comments "$omp ..."
+(which is what Fortran "!$omp ..." comments become) are recognized as well.
+
+Like in C/C++, a directive applies to the statement that follows it, e.g. a loop, unless it is
+a standalone directive like "barrier", or it is explicitly ended like in Fortran.
+"""
+
+import logging
+import re
+import typing as t
+
+import horast.nodes as horast_nodes
+import typed_ast.ast3 as typed_ast3
+
+_LOG = logging.getLogger(__name__)
+
+CONSTRUCT_WORDS = {
+    'atomic', 'barrier', 'critical', 'declare', 'distribute', 'do', 'end', 'flush', 'for',
+    'master', 'ordered', 'parallel', 'section', 'sections', 'simd', 'single', 'target', 'task',
+    'taskloop', 'taskwait', 'teams', 'workshare'}
+
+STANDALONE_CONSTRUCTS = {'barrier', 'declare', 'end', 'flush', 'taskwait', 'taskyield'}
+
+C_TO_FORTRAN_OPERATORS = {'&&': '.and.', '||': '.or.', '&': 'iand', '|': 'ior', '^': 'ieor'}
+
+_WORD = re.compile(r'\s*([A-Za-z_]\w*)(\s*\()?')
+
+_REDUCTION = re.compile(r'^reduction\s*\(\s*([^:]+?)\s*:', re.IGNORECASE)
+
+
+class OpenMpDirective:
+
+    """OpenMP directive, i.e. a construct like "parallel for" with a sequence of clauses."""
+
+    def __init__(self, construct: str, clauses: t.Sequence[str] = ()):
+        self.construct = ' '.join(construct.split())
+        self.clauses = list(clauses)
+
+    @classmethod
+    def from_comment(cls, text: str) -> t.Optional['OpenMpDirective']:
+        """Parse text of a comment, or return None if it is not an OpenMP directive."""
+        text = text.strip()
+        if text.startswith('pragma omp '):
+            text, fortran = text[len('pragma omp '):], False
+        elif text.lower().startswith('$omp '):
+            text, fortran = text[len('$omp '):], True
+        else:
+            return None
+        tokens = []
+        while text.strip():
+            token, text = _split_token(text)
+            tokens.append(token)
+            text = text.lstrip(' ,')
+        construct = []
+        while tokens and tokens[0].lower() in CONSTRUCT_WORDS:
+            construct.append(tokens.pop(0).lower())
+        if fortran:
+            construct = ['for' if _ == 'do' else _ for _ in construct]
+            tokens = [_fortran_to_c_clause(_) for _ in tokens]
+        return cls(' '.join(construct), tokens)
+
+    @property
+    def is_loop(self) -> bool:
+        return 'for' in self.construct.split()
+
+    @property
+    def is_standalone(self) -> bool:
+        """True if the directive does not apply to any statement."""
+        return not self.construct or self.construct.split()[0] in STANDALONE_CONSTRUCTS
+
+    @property
+    def needs_end(self) -> bool:
+        """True if an end directive is required after the statement in Fortran."""
+        return not self.is_loop and not self.is_standalone
+
+    def ends(self, directive: 'OpenMpDirective') -> bool:
+        """Check if this is the end directive of the given one."""
+        return self.construct == 'end {}'.format(directive.construct)
+
+    def to_comment(self) -> horast_nodes.Comment:
+        return horast_nodes.Comment(value=typed_ast3.Str(self.to_python(), ''), eol=False)
+
+    def to_python(self) -> str:
+        """Text of the comment that represents the directive, without the "#"."""
+        return ' '.join(['pragma omp', self.construct] + self.clauses)
+
+    def to_cpp(self) -> str:
+        return '#{}'.format(self.to_python())
+
+    def to_fortran(self) -> str:
+        construct = ['do' if _ == 'for' else _ for _ in self.construct.split()]
+        clauses = [_c_to_fortran_clause(_) for _ in self.clauses]
+        return ' '.join(['!$omp'] + construct + clauses)
+
+    def to_fortran_end(self) -> str:
+        construct = ['do' if _ == 'for' else _ for _ in self.construct.split()]
+        return ' '.join(['!$omp', 'end'] + construct)
+
+    def __eq__(self, other):
+        return isinstance(other, OpenMpDirective) and self.construct == other.construct \
+            and self.clauses == other.clauses
+
+    def __repr__(self):
+        return '{}({}, {})'.format(type(self).__name__, repr(self.construct), self.clauses)
+
+
+def _split_token(text: str) -> t.Tuple[str, str]:
+    """Split a word, optionally followed by arguments in balanced parentheses, from the text."""
+    match = _WORD.match(text)
+    if match is None:
+        raise SyntaxError('invalid OpenMP directive clause: "{}"'.format(text.strip()))
+    if match.group(2) is None:
+        return match.group(1), text[match.end():]
+    depth = 1
+    for index in range(match.end(), len(text)):
+        if text[index] == '(':
+            depth += 1
+        elif text[index] == ')':
+            depth -= 1
+            if depth == 0:
+                return text[match.start(1):index + 1], text[index + 1:]
+    raise SyntaxError('unbalanced parentheses in OpenMP directive clause: "{}"'
+                      .format(text.strip()))
+
+
+def _c_to_fortran_clause(clause: str) -> str:
+    match = _REDUCTION.match(clause)
+    if match is None or match.group(1) not in C_TO_FORTRAN_OPERATORS:
+        return clause
+    return '{}{}{}'.format(clause[:match.start(1)], C_TO_FORTRAN_OPERATORS[match.group(1)],
+                           clause[match.end(1):])
+
+
+def _fortran_to_c_clause(clause: str) -> str:
+    match = _REDUCTION.match(clause)
+    if match is None:
+        return clause
+    for c_operator, fortran_operator in C_TO_FORTRAN_OPERATORS.items():
+        if match.group(1).lower() == fortran_operator:
+            return '{}{}{}'.format(clause[:match.start(1)], c_operator, clause[match.end(1):])
+    return clause
+
+
+def openmp_directive(node: typed_ast3.AST) -> t.Optional[OpenMpDirective]:
+    """Get OpenMP directive represented by a node, or None if it is not a valid directive."""
+    if not isinstance(node, horast_nodes.Comment) or node.eol:
+        return None
+    try:
+        return OpenMpDirective.from_comment(node.value.s)
+    except SyntaxError:
+        _LOG.warning('treating invalid OpenMP directive "%s" as a comment', node.value.s,
+                     exc_info=True)
+        return None
+
+
+def find_openmp_directives(tree: typed_ast3.AST) -> t.Dict[int, t.List[OpenMpDirective]]:
+    """Find OpenMP directives which apply to statements in the tree, without modifying it.
+
+    Each statement that follows one or more directive comments (possibly with other comments
+    in between) is mapped by its id() to a list of them, from the outermost. Standalone directives
+    and directives which are explicitly ended later in the same body are not included.
+    """
+    statements_directives = {}  # type: t.Dict[int, t.List[OpenMpDirective]]
+    for node in typed_ast3.walk(tree):
+        for field in node._fields:
+            statements = getattr(node, field, None)
+            if not isinstance(statements, list):
+                continue
+            directives = []  # type: t.List[OpenMpDirective]
+            for index, statement in enumerate(statements):
+                if not isinstance(statement, typed_ast3.AST):
+                    break
+                directive = openmp_directive(statement)
+                if directive is not None:
+                    if not directive.is_standalone and not any(
+                            _ is not None and _.ends(directive)
+                            for _ in map(openmp_directive, statements[index + 1:])):
+                        directives.append(directive)
+                    continue
+                if isinstance(statement, horast_nodes.Comment):
+                    continue
+                if directives:
+                    statements_directives[id(statement)] = directives
+                    directives = []
+    return statements_directives
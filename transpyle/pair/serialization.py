@@ -0,0 +1,98 @@
+"""Binary serialization of generalized AST.
+
+Trees are stored using the binary pickle protocol, preceded by a header with format version.
+Node classes (including horast comments and static typing nodes), Fortran metadata and static
+typing information are all preserved. Statically typed node classes are created dynamically
+by static_typing and cannot be pickled by reference, therefore they are stored by name and
+resolved again when loading.
+
+Data serialized with different format version is rejected with AstFormatError, so that stale
+cache entries can be detected and discarded. As with pickle, only deserialize trusted data.
+"""
+
+import copyreg
+import io
+import pickle
+import struct
+import typing as t
+
+import static_typing as st
+import typed_ast.ast3 as typed_ast3
+
+__all__ = ['AST_FORMAT_VERSION', 'AstFormatError', 'serialize_ast', 'deserialize_ast']
+
+AST_FORMAT_VERSION = 1
+
+_MAGIC = b'TPYAST'
+
+_HEADER = struct.Struct('<6sHB')
+
+_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+
+def _statically_typed_classes() -> t.Dict[type, str]:
+    classes = {}
+    for name in st.nodes.__all__:
+        variants = getattr(st.nodes, name)
+        if not isinstance(variants, dict):
+            continue
+        for ast_module, node_type in variants.items():
+            classes[node_type] = '{}[{}]'.format(name, ast_module.__name__)
+    return classes
+
+
+_TYPE_NAMES = _statically_typed_classes()
+
+_TYPES = {name: node_type for node_type, name in _TYPE_NAMES.items()}
+
+
+def _new_statically_typed_node(type_name: str):
+    node_type = _TYPES[type_name]
+    return node_type.__new__(node_type)
+
+
+def _reduce_statically_typed_node(node):
+    return _new_statically_typed_node, (_TYPE_NAMES[type(node)],), node.__dict__
+
+
+_DISPATCH_TABLE = copyreg.dispatch_table.copy()
+_DISPATCH_TABLE.update({node_type: _reduce_statically_typed_node for node_type in _TYPE_NAMES})
+
+
+class AstFormatError(ValueError):
+
+    """Raised when serialized AST is malformed or stored in incompatible format version."""
+
+
+def serialize_ast(tree: typed_ast3.AST) -> bytes:
+    """Serialize a typed_ast3 tree (with all extra data attached to nodes) into bytes."""
+    data = io.BytesIO()
+    data.write(_HEADER.pack(_MAGIC, AST_FORMAT_VERSION, _PROTOCOL))
+    pickler = pickle.Pickler(data, protocol=_PROTOCOL)
+    pickler.dispatch_table = _DISPATCH_TABLE
+    pickler.dump(tree)
+    return data.getvalue()
+
+
+def deserialize_ast(data: bytes) -> typed_ast3.AST:
+    """Restore a typed_ast3 tree from bytes created by serialize_ast().
+
+    Raise AstFormatError if the data is not a serialized AST or if it was serialized using
+    a different format version.
+    """
+    if len(data) < _HEADER.size:
+        raise AstFormatError('data too short to be a serialized AST')
+    magic, format_version, protocol = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise AstFormatError('data is not a serialized AST')
+    if format_version != AST_FORMAT_VERSION or protocol > pickle.HIGHEST_PROTOCOL:
+        raise AstFormatError(
+            'serialized AST has format version {} (protocol {}) but version {} is required'
+            .format(format_version, protocol, AST_FORMAT_VERSION))
+    try:
+        tree = pickle.loads(memoryview(data)[_HEADER.size:])
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, KeyError) as err:
+        raise AstFormatError('serialized AST is malformed') from err
+    if not isinstance(tree, typed_ast3.AST):
+        raise AstFormatError('serialized data is not an AST but {}'.format(type(tree)))
+    return tree
@@ -0,0 +1,145 @@
+"""Structural hashing, comparison and copying of AST.
+
+Two nodes are structurally equal when typed_ast3.dump() would produce the same text for both
+of them, i.e. they have the same class name and equal fields, while attributes (like line
+numbers) and any extra data attached to nodes are ignored.
+"""
+
+import copy
+import typing as t
+
+import typed_ast.ast3 as typed_ast3
+
+__all__ = ['StructuralHasher', 'structural_hash', 'structurally_equal', 'clone', 'dotted_name']
+
+_ATOMIC_TYPES = (typed_ast3.AST, str, bytes, int, float, complex, type(None))
+
+
+def _value_key(value):
+    try:
+        return hash((type(value).__name__, value))
+    except TypeError:
+        return hash((type(value).__name__, repr(value)))
+
+
+class StructuralHasher:
+
+    """Compute structural hashes of nodes, memoizing hash of every visited node.
+
+    Memoized hashes stay valid only as long as the hashed trees are not modified, therefore
+    a hasher should be used only for the duration of a single analysis of unchanged trees.
+    Hashes can be used to key caches, e.g. for detection of common subexpressions.
+    """
+
+    def __init__(self):
+        self._hashes = {}  # type: t.Dict[int, t.Tuple[typed_ast3.AST, int]]
+
+    def hash(self, value) -> int:
+        """Compute structural hash of a node, list of nodes or a field value."""
+        if isinstance(value, typed_ast3.AST):
+            try:
+                return self._hashes[id(value)][1]
+            except KeyError:
+                pass
+            value_hash = hash((type(value).__name__,) + tuple(
+                self.hash(field) for _, field in typed_ast3.iter_fields(value)))
+            self._hashes[id(value)] = (value, value_hash)
+            return value_hash
+        if isinstance(value, list):
+            return hash(tuple(self.hash(_) for _ in value))
+        return _value_key(value)
+
+    def equal(self, syntax, target) -> bool:
+        """Check structural equality, using memoized hashes to reject mismatches early."""
+        if self.hash(syntax) != self.hash(target):
+            return False
+        return structurally_equal(syntax, target)
+
+    def clear(self) -> None:
+        self._hashes.clear()
+
+
+def structural_hash(syntax) -> int:
+    """Compute structural hash of a node."""
+    return StructuralHasher().hash(syntax)
+
+
+def structurally_equal(syntax, target) -> bool:
+    """Check if two nodes (or lists of nodes) are structurally equal.
+
+    Stops at the first mismatch, and is equivalent to comparing typed_ast3.dump() of both.
+    """
+    if syntax is target:
+        return True
+    if isinstance(syntax, typed_ast3.AST):
+        if not isinstance(target, typed_ast3.AST) \
+                or type(syntax).__name__ != type(target).__name__:
+            return False
+        syntax_fields = list(typed_ast3.iter_fields(syntax))
+        target_fields = list(typed_ast3.iter_fields(target))
+        if len(syntax_fields) != len(target_fields):
+            return False
+        for (syntax_name, syntax_field), (target_name, target_field) in zip(
+                syntax_fields, target_fields):
+            if syntax_name != target_name or not structurally_equal(syntax_field, target_field):
+                return False
+        return True
+    if isinstance(syntax, list):
+        return isinstance(target, list) and len(syntax) == len(target) and all(
+            structurally_equal(syntax_item, target_item)
+            for syntax_item, target_item in zip(syntax, target))
+    return type(syntax) is type(target) and (syntax == target or repr(syntax) == repr(target))
+
+
+def _clone_fields(node: typed_ast3.AST, memo: dict) -> typed_ast3.AST:
+    try:
+        return memo[id(node)]
+    except KeyError:
+        pass
+    node_type = type(node)
+    cloned = node_type.__new__(node_type)
+    memo[id(node)] = cloned
+    cloned_dict = cloned.__dict__
+    for name, value in node.__dict__.items():
+        if isinstance(value, typed_ast3.AST):
+            value = _clone_fields(value, memo)
+        elif type(value) is list:
+            value = [_clone_fields(_, memo) if isinstance(_, typed_ast3.AST) else _
+                     for _ in value]
+        cloned_dict[name] = value
+    return cloned
+
+
+def clone(syntax: typed_ast3.AST) -> typed_ast3.AST:
+    """Create a deep copy of a tree, much faster than copy.deepcopy().
+
+    Extra data attached to nodes (like static typing information or Fortran metadata) is
+    deep-copied as well, and references from it to nodes of the tree point to the copies.
+    """
+    memo = {}
+    cloned = _clone_fields(syntax, memo)
+    for cloned_node in list(memo.values()):
+        cloned_dict = cloned_node.__dict__
+        for name, value in cloned_dict.items():
+            if isinstance(value, _ATOMIC_TYPES):
+                continue
+            if type(value) is list and all(isinstance(_, _ATOMIC_TYPES) for _ in value):
+                continue
+            cloned_dict[name] = copy.deepcopy(value, memo)
+    return cloned
+
+
+def dotted_name(syntax) -> t.Optional[str]:
+    """Resolve a Name or a chain of Attributes on a Name into a dotted name, like 'np.sqrt'.
+
+    Return None for any other node. Whenever the name is resolved, it is identical to what
+    unparsing the node would produce, but no unparsing is done.
+    """
+    attrs = []
+    while isinstance(syntax, typed_ast3.Attribute):
+        attrs.append(syntax.attr)
+        syntax = syntax.value
+    if not isinstance(syntax, typed_ast3.Name):
+        return None
+    attrs.append(syntax.id)
+    return '.'.join(reversed(attrs))
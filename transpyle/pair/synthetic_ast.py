@@ -80,14 +80,16 @@ def make_slice_from_call(call: typed_ast3.Call) -> typed_ast3.Slice:
     return typed_ast3.Slice(lower=lower, upper=upper, step=step)
 
 
-def make_numpy_constructor(function: str, arg: typed_ast3.AST,
-                           data_type: typed_ast3.AST) -> typed_ast3.Call:
+def make_numpy_constructor(function: str, arg: typed_ast3.AST, data_type: typed_ast3.AST,
+                           order: t.Optional[str] = None) -> typed_ast3.Call:
+    keywords = [typed_ast3.keyword(arg='dtype', value=data_type)]
+    if order is not None:
+        keywords.append(typed_ast3.keyword(arg='order', value=typed_ast3.Str(order, '')))
     return typed_ast3.Call(
         func=typed_ast3.Attribute(
             value=typed_ast3.Name(id='np', ctx=typed_ast3.Load()),
             attr=function, ctx=typed_ast3.Load()),
-        args=[arg],
-        keywords=[typed_ast3.keyword(arg='dtype', value=data_type)])
+        args=[arg], keywords=keywords)
 
 
 def make_st_ndarray(data_type: typed_ast3.AST,
@@ -13,11 +13,16 @@ import typed_ast.ast3 as typed_ast3
 from ..pair import make_range_call, make_numpy_constructor, make_st_ndarray
 from ..general import \
     CodeReader, Language, Parser, AstGeneralizer, IdentityAstGeneralizer, Unparser, Translator, \
-    AutoTranspiler, Binder
+    AutoTranspiler, Binder, Transformation
 from .parser import TypedPythonParserWithComments
 from .unparser import TypedPythonUnparserWithComments
 from .translator import PythonTranslator
-from .transformations import inline
+from .transformations import InliningTransformation, inline
+from .loop_transformations import \
+    LoopTiling, LoopInterchange, LoopUnrolling, LoopFusion, LoopDistribution, LoopParallelization, \
+    ReductionSubstitution
+from .blas import BlasSubstitution
+from .vectorization import LoopVectorization
 
 _LOG = logging.getLogger(__name__)
 
@@ -43,6 +48,17 @@ Unparser.register(TypedPythonUnparserWithComments,
 
 Translator.register(PythonTranslator, (Language.find('Python 3.5'), Language.find('Python 3.6')))
 
+Transformation.register(InliningTransformation, ('inline', 'inlining'))
+Transformation.register(LoopTiling, ('tile', 'tiling'))
+Transformation.register(LoopInterchange, ('interchange', 'loop_interchange'))
+Transformation.register(LoopUnrolling, ('unroll', 'unrolling'))
+Transformation.register(LoopFusion, ('fuse', 'fusion'))
+Transformation.register(LoopDistribution, ('distribute', 'distribution'))
+Transformation.register(LoopParallelization, ('parallelize', 'openmp'))
+Transformation.register(ReductionSubstitution, ('reduce', 'reductions'))
+Transformation.register(BlasSubstitution, ('blas',))
+Transformation.register(LoopVectorization, ('vectorize', 'vectorization'))
+
 
 def transpile(function_or_class, to_language: Language, *args, **kwargs):
     """Instantiate Python transpiler to transpile one function or class.
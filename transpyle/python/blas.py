@@ -0,0 +1,438 @@
+"""Recognition of dense linear algebra in generalized AST, and its substitution by BLAS routines.
+
+Recognized idioms are perfect loop nests over range() with unit steps, which compute:
+
+* dot: s += x[i] * y[i]
+* axpy: y[i] += alpha * x[i]
+* gemv: y[p] += a[p, k] * x[k] or y[q] += x[k] * a[k, q]
+* gemm: c[p, q] += a[p, k] * b[k, q]
+
+in any order of loops, where alpha is an optional product of loop-invariant factors, and "-="
+can be used instead of "+=". Array operands can be sections of arrays which have more
+dimensions, as long as the loop variables appear in them like "variable + offset".
+"""
+
+import collections
+import functools
+import logging
+import typing as t
+
+import typed_ast.ast3 as typed_ast3
+
+from ..general import Language
+from ..pair import clone
+from .dependence import RangeLoop, affine_expression, perfect_loop_nest
+from .loop_transformations import \
+    LoopNestTransformation, ReductionSubstitution, affine_to_expression, array_section, \
+    loop_only_names
+
+_LOG = logging.getLogger(__name__)
+
+BlasIdiom = collections.namedtuple(
+    'BlasIdiom', ['kind', 'target', 'operands', 'alpha', 'subtracted', 'loops'])
+"""Loop nest which computes "target += alpha * kind(operands)" (or "-=" if subtracted), with alpha
+being a possibly empty list of loop-invariant factors."""
+
+_Operand = collections.namedtuple('_Operand', ['array', 'starts', 'extents'])
+"""Section of an array: starts in all dimensions, and extents in the sectioned dimensions."""
+
+
+def _names(node: typed_ast3.AST) -> t.Set[str]:
+    return {_.id for _ in typed_ast3.walk(node) if isinstance(_, typed_ast3.Name)}
+
+
+def _factors(expression: typed_ast3.expr) -> t.List[typed_ast3.expr]:
+    if isinstance(expression, typed_ast3.BinOp) and isinstance(expression.op, typed_ast3.Mult):
+        return _factors(expression.left) + _factors(expression.right)
+    return [expression]
+
+
+def _section_variables(subscript: typed_ast3.Subscript,
+                       variables: t.Set[str]) -> t.Optional[t.List[str]]:
+    """Find loop variables that index given subscript, in order of dimensions."""
+    if not isinstance(subscript.slice, typed_ast3.Index):
+        return None
+    index = subscript.slice.value
+    dims = index.elts if isinstance(index, typed_ast3.Tuple) else [index]
+    section_variables = []
+    for dim in dims:
+        dim_variables = _names(dim) & variables
+        if not dim_variables:
+            continue
+        affine = affine_expression(dim)
+        if len(dim_variables) != 1 or affine is None:
+            return None
+        variable, = dim_variables
+        if affine.coefficients[variable] != 1 or variable in section_variables:
+            return None
+        section_variables.append(variable)
+    return section_variables
+
+
+def blas_idiom(loop: typed_ast3.For) -> t.Optional[BlasIdiom]:
+    """Recognize a loop nest that is equivalent to a BLAS routine."""
+    loops = perfect_loop_nest(loop)
+    if not loops or len(loops[-1].node.body) != 1 or any(_.step != 1 for _ in loops):
+        return None
+    parts = ReductionSubstitution.reduction_parts(loops[-1].node.body[0])
+    if parts is None or parts[1] not in ('+', '-'):
+        return None
+    target, operator, operand = parts
+    variables = {_.variable for _ in loops}
+    if isinstance(target, typed_ast3.Name):
+        target_variables = []  # type: t.List[str]
+    else:
+        target_variables = _section_variables(target, variables)
+        if target_variables is None:
+            return None
+    arrays, alpha = [], []
+    for factor in _factors(operand):
+        if not _names(factor) & variables:
+            if not isinstance(factor, (typed_ast3.Name, typed_ast3.Num, typed_ast3.Attribute,
+                                       typed_ast3.Subscript)):
+                return None
+            alpha.append(factor)
+            continue
+        if not isinstance(factor, typed_ast3.Subscript):
+            return None
+        factor_variables = _section_variables(factor, variables)
+        if factor_variables is None:
+            return None
+        arrays.append((factor, factor_variables))
+    subtracted = operator == '-'
+    contracted = sorted(variables - set(target_variables))
+    if len(arrays) == 1 and len(loops) == 1 and not contracted \
+            and arrays[0][1] == target_variables:
+        return BlasIdiom('axpy', target, [arrays[0][0]], alpha, subtracted, loops)
+    if len(arrays) != 2 or len(contracted) != 1 or len(loops) != len(target_variables) + 1:
+        return None
+    variable, = contracted
+    if not target_variables:
+        if arrays[0][1] == arrays[1][1] == [variable]:
+            return BlasIdiom('dot', target, [arrays[0][0], arrays[1][0]], alpha, subtracted,
+                             loops)
+        return None
+    for (first, first_variables), (second, second_variables) in (arrays, arrays[::-1]):
+        if first_variables[-1:] == [variable] and second_variables[:1] == [variable] \
+                and first_variables[:-1] + second_variables[1:] == target_variables:
+            kind = 'gemm' if len(target_variables) == 2 else 'gemv'
+            return BlasIdiom(kind, target, [first, second], alpha, subtracted, loops)
+    return None
+
+
+def array_ranks(function: typed_ast3.FunctionDef) -> t.Dict[str, int]:
+    """Get numbers of dimensions of arrays annotated like st.ndarray[2, ...] in a function."""
+    annotated = [(_.arg, _.annotation) for _ in function.args.args]
+    annotated += [(_.target.id, _.annotation) for _ in typed_ast3.walk(function)
+                  if isinstance(_, typed_ast3.AnnAssign) and isinstance(_.target, typed_ast3.Name)]
+    ranks = {}
+    for name, annotation in annotated:
+        if isinstance(annotation, typed_ast3.Subscript) \
+                and isinstance(annotation.value, typed_ast3.Attribute) \
+                and annotation.value.attr == 'ndarray' \
+                and isinstance(annotation.slice, typed_ast3.Index) \
+                and isinstance(annotation.slice.value, typed_ast3.Tuple) \
+                and isinstance(annotation.slice.value.elts[0], typed_ast3.Num):
+            ranks[name] = annotation.slice.value.elts[0].n
+    return ranks
+
+
+def _attribute_call(value: typed_ast3.expr, attr: str, *args: typed_ast3.expr) -> typed_ast3.Call:
+    return typed_ast3.Call(func=typed_ast3.Attribute(value=value, attr=attr,
+                                                     ctx=typed_ast3.Load()),
+                           args=list(args), keywords=[])
+
+
+def _call(name: str, *args: typed_ast3.expr) -> typed_ast3.Call:
+    return typed_ast3.Call(func=typed_ast3.Name(id=name, ctx=typed_ast3.Load()),
+                           args=list(args), keywords=[])
+
+
+def _product(factors: t.Sequence[typed_ast3.expr]) -> typed_ast3.expr:
+    return functools.reduce(
+        lambda left, right: typed_ast3.BinOp(left=left, op=typed_ast3.Mult(), right=right),
+        [clone(_) for _ in factors])
+
+
+def _is_zero(node: typed_ast3.expr) -> bool:
+    return isinstance(node, typed_ast3.Num) and node.n == 0
+
+
+class BlasSubstitution(LoopNestTransformation):
+
+    """Replace loop nests and calls that perform dense linear algebra by library routines.
+
+    Substitution depends on the target language:
+
+    * in Python, loop nests become NumPy np.dot() and np.matmul() on array sections;
+    * in Fortran, loop nests become intrinsics dot_product and matmul (which can call external
+      BLAS when compiled with -fexternal-blas), and so do np.dot() and "@" on whole arrays,
+      depending on numbers of dimensions of arguments;
+    * in C and C++, loop nests become calls to CBLAS routines cblas_ddot, cblas_daxpy,
+      cblas_dgemv and cblas_dgemm on row-major arrays of doubles, and so do "s = np.dot(x, y)"
+      on vectors and "c += a @ b" on whole arrays.
+
+    Loop nests whose variables are used outside of loops over them are left as they are.
+    """
+
+    def __init__(self, target: str = 'Python 3'):
+        language = Language.find(target)
+        if language is None:
+            raise ValueError('"{}" is not a language name'.format(target))
+        super().__init__(target=target)
+        name = language.lowercase_name
+        self._mode = 'fortran' if name.startswith('fortran') \
+            else 'cblas' if name.startswith('c') else 'numpy'
+        self._loop_only_names = set()  # type: t.Set[str]
+        self._ranks = {}  # type: t.Dict[str, int]
+
+    def apply(self, tree: typed_ast3.AST) -> typed_ast3.AST:
+        self._loop_only_names = loop_only_names(tree)
+        self._ranks = {}
+        for function in typed_ast3.walk(tree):
+            if isinstance(function, typed_ast3.FunctionDef):
+                self._ranks.update(array_ranks(function))
+        return super().apply(tree)
+
+    def transform_loop(self, loop: typed_ast3.For) -> t.Optional[t.List[typed_ast3.stmt]]:
+        idiom = blas_idiom(loop)
+        if idiom is None or any(_.variable not in self._loop_only_names for _ in idiom.loops):
+            return None
+        if self._mode == 'cblas':
+            statement = self._cblas_statement(idiom)
+        else:
+            statement = self._array_statement(idiom)
+        if statement is None:
+            return None
+        _LOG.debug('substituting %s in loops over %s', idiom.kind,
+                   [_.variable for _ in idiom.loops])
+        return [statement]
+
+    def transform_statements(self, statements: t.List[typed_ast3.AST]
+                             ) -> t.Optional[t.List[typed_ast3.AST]]:
+        if self._mode == 'numpy':
+            return None
+        transformed = [self._transform_products(_) for _ in statements]
+        if all(new is old for new, old in zip(transformed, statements)):
+            return None
+        return transformed
+
+    def _rank(self, node: typed_ast3.expr) -> t.Optional[int]:
+        if isinstance(node, typed_ast3.Name):
+            return self._ranks.get(node.id)
+        return None
+
+    def _product_operands(self, node: typed_ast3.AST
+                          ) -> t.Optional[t.Tuple[typed_ast3.expr, typed_ast3.expr]]:
+        if isinstance(node, typed_ast3.BinOp) and isinstance(node.op, typed_ast3.MatMult):
+            return node.left, node.right
+        if isinstance(node, typed_ast3.Call) and isinstance(node.func, typed_ast3.Attribute) \
+                and isinstance(node.func.value, typed_ast3.Name) \
+                and node.func.value.id in ('np', 'numpy') and node.func.attr == 'dot' \
+                and len(node.args) == 2 and not node.keywords:
+            return node.args[0], node.args[1]
+        return None
+
+    def _transform_products(self, statement: typed_ast3.AST) -> typed_ast3.AST:
+        """Convert np.dot() and "@" in a statement, given that they are not in a loop nest."""
+        if self._mode == 'cblas':
+            return self._cblas_products(statement)
+        if not isinstance(statement, typed_ast3.stmt) or isinstance(statement, (
+                typed_ast3.For, typed_ast3.While, typed_ast3.If, typed_ast3.With,
+                typed_ast3.FunctionDef, typed_ast3.ClassDef, typed_ast3.Try)):
+            return statement
+        original, statement = statement, clone(statement)
+        products = []
+        for node in typed_ast3.walk(statement):
+            for field in node._fields:
+                value = getattr(node, field, None)
+                operands = self._product_operands(value)
+                if operands is None:
+                    continue
+                ranks = [self._rank(_) for _ in operands]
+                if isinstance(value, typed_ast3.BinOp):
+                    function = 'dot' if ranks == [1, 1] else 'matmul'
+                elif 2 in ranks:
+                    function = 'matmul'
+                else:
+                    continue
+                products.append((node, field, _attribute_call(
+                    typed_ast3.Name(id='np', ctx=typed_ast3.Load()), function, *operands)))
+        if not products:
+            return original
+        for node, field, call in products:
+            setattr(node, field, call)
+        return statement
+
+    def _array_statement(self, idiom: BlasIdiom) -> t.Optional[typed_ast3.stmt]:
+        inclusive = self._mode == 'fortran'
+        sections = [array_section(_, idiom.loops, inclusive) for _ in idiom.operands]
+        if isinstance(idiom.target, typed_ast3.Subscript):
+            target = array_section(idiom.target, idiom.loops, inclusive)
+        else:
+            target = clone(idiom.target)
+        if target is None or any(_ is None for _ in sections):
+            return None
+        target.ctx = typed_ast3.Store()
+        if idiom.kind == 'axpy':
+            value = sections[0]
+        else:
+            value = _attribute_call(typed_ast3.Name(id='np', ctx=typed_ast3.Load()),
+                                    'dot' if idiom.kind == 'dot' else 'matmul', *sections)
+        if idiom.alpha:
+            value = typed_ast3.BinOp(left=_product(idiom.alpha), op=typed_ast3.Mult(),
+                                     right=value)
+        return typed_ast3.AugAssign(
+            target=target, op=typed_ast3.Sub() if idiom.subtracted else typed_ast3.Add(),
+            value=value)
+
+    def _operand(self, subscript: typed_ast3.Subscript,
+                 loops: t.Sequence[RangeLoop]) -> t.Optional[_Operand]:
+        section = array_section(subscript, loops)
+        if section is None:
+            return None
+        dims = section.slice.dims if isinstance(section.slice, typed_ast3.ExtSlice) \
+            else [section.slice]
+        if len(dims) > 2:
+            return None
+        starts, extents = [], []
+        for dim in dims:
+            if isinstance(dim, typed_ast3.Index):
+                starts.append(dim.value)
+                continue
+            starts.append(dim.lower)
+            lower, upper = affine_expression(dim.lower), affine_expression(dim.upper)
+            if lower is not None and upper is not None:
+                extent = affine_to_expression(upper - lower)
+            elif _is_zero(dim.lower):
+                extent = dim.upper
+            else:
+                extent = typed_ast3.BinOp(left=dim.upper, op=typed_ast3.Sub(), right=dim.lower)
+            extents.append((len(starts) - 1, extent))
+        return _Operand(section.value, starts, extents)
+
+    def _whole_array(self, node: typed_ast3.expr) -> t.Optional[_Operand]:
+        rank = self._rank(node)
+        if rank not in (1, 2):
+            return None
+        return _Operand(node, [typed_ast3.Num(n=0)] * rank,
+                        [(dim, self._shape(node, dim)) for dim in range(rank)])
+
+    @staticmethod
+    def _shape(array: typed_ast3.expr, dim: int) -> typed_ast3.expr:
+        return typed_ast3.Subscript(value=_attribute_call(clone(array), 'shape'),
+                                    slice=typed_ast3.Index(value=typed_ast3.Num(n=dim)),
+                                    ctx=typed_ast3.Load())
+
+    def _pointer(self, operand: _Operand) -> typed_ast3.expr:
+        pointer = _attribute_call(clone(operand.array), 'data')
+        offset = clone(operand.starts[-1])
+        if len(operand.starts) == 2 and not _is_zero(operand.starts[0]):
+            row = self._leading_dimension(operand)
+            if not isinstance(operand.starts[0], typed_ast3.Num) or operand.starts[0].n != 1:
+                row = typed_ast3.BinOp(left=clone(operand.starts[0]), op=typed_ast3.Mult(),
+                                       right=row)
+            offset = row if _is_zero(offset) else typed_ast3.BinOp(
+                left=row, op=typed_ast3.Add(), right=offset)
+        if _is_zero(offset):
+            return pointer
+        return typed_ast3.BinOp(left=pointer, op=typed_ast3.Add(), right=offset)
+
+    def _leading_dimension(self, operand: _Operand) -> typed_ast3.expr:
+        return self._shape(operand.array, len(operand.starts) - 1)
+
+    def _increment(self, operand: _Operand) -> typed_ast3.expr:
+        if operand.extents[0][0] == len(operand.starts) - 1:
+            return typed_ast3.Num(n=1)
+        return self._leading_dimension(operand)
+
+    def _cblas_call(self, kind: str, alpha: typed_ast3.expr, operands: t.Sequence[_Operand],
+                    target: t.Optional[_Operand], beta: typed_ast3.expr
+                    ) -> t.Optional[typed_ast3.Call]:
+        """Create a call to CBLAS routine computing target = alpha * kind(operands) + beta * target.
+
+        For dot, target must be None and the call returns the dot product.
+        """
+        ranks = [len(_.extents) for _ in operands]
+        if kind == 'dot':
+            x, y = operands
+            return _call('cblas_ddot', clone(x.extents[0][1]), self._pointer(x),
+                         self._increment(x), self._pointer(y), self._increment(y))
+        if kind == 'axpy':
+            x, = operands
+            return _call('cblas_daxpy', clone(target.extents[0][1]), alpha, self._pointer(x),
+                         self._increment(x), self._pointer(target), self._increment(target))
+        row_major = typed_ast3.Name(id='CblasRowMajor', ctx=typed_ast3.Load())
+        no_trans = typed_ast3.Name(id='CblasNoTrans', ctx=typed_ast3.Load())
+        if ranks == [2, 2]:
+            a, b = operands
+            return _call('cblas_dgemm', row_major, no_trans, clone(no_trans),
+                         clone(a.extents[0][1]), clone(b.extents[1][1]), clone(a.extents[1][1]),
+                         alpha, self._pointer(a), self._leading_dimension(a),
+                         self._pointer(b), self._leading_dimension(b), beta,
+                         self._pointer(target), self._leading_dimension(target))
+        if ranks not in ([2, 1], [1, 2]):
+            return None
+        a, x = operands if ranks == [2, 1] else reversed(operands)
+        transposition = 'CblasNoTrans' if ranks == [2, 1] else 'CblasTrans'
+        return _call('cblas_dgemv', row_major,
+                     typed_ast3.Name(id=transposition, ctx=typed_ast3.Load()),
+                     clone(a.extents[0][1]), clone(a.extents[1][1]), alpha, self._pointer(a),
+                     self._leading_dimension(a), self._pointer(x), self._increment(x), beta,
+                     self._pointer(target), self._increment(target))
+
+    def _cblas_statement(self, idiom: BlasIdiom) -> t.Optional[typed_ast3.stmt]:
+        operands = [self._operand(_, idiom.loops) for _ in idiom.operands]
+        target = None
+        if isinstance(idiom.target, typed_ast3.Subscript):
+            target = self._operand(idiom.target, idiom.loops)
+            if target is None:
+                return None
+        if any(_ is None for _ in operands):
+            return None
+        if idiom.kind == 'dot':
+            call = self._cblas_call('dot', typed_ast3.Num(n=1.0), operands, None,
+                                    typed_ast3.Num(n=0.0))
+            value = typed_ast3.BinOp(left=_product(idiom.alpha), op=typed_ast3.Mult(),
+                                     right=call) if idiom.alpha else call
+            return typed_ast3.AugAssign(
+                target=clone(idiom.target),
+                op=typed_ast3.Sub() if idiom.subtracted else typed_ast3.Add(), value=value)
+        alpha = _product(idiom.alpha) if idiom.alpha else typed_ast3.Num(n=1.0)
+        if idiom.subtracted:
+            alpha = typed_ast3.UnaryOp(op=typed_ast3.USub(), operand=alpha)
+        call = self._cblas_call(idiom.kind, alpha, operands, target, typed_ast3.Num(n=1.0))
+        return None if call is None else typed_ast3.Expr(value=call)
+
+    def _cblas_products(self, statement: typed_ast3.AST) -> typed_ast3.AST:
+        """Convert "s = np.dot(x, y)" on vectors and "c += a @ b" on whole arrays."""
+        if isinstance(statement, typed_ast3.Assign) and len(statement.targets) == 1:
+            target, value = statement.targets[0], statement.value
+            augmented = False
+        elif isinstance(statement, typed_ast3.AugAssign) \
+                and isinstance(statement.op, typed_ast3.Add):
+            target, value = statement.target, statement.value
+            augmented = True
+        else:
+            return statement
+        operands = self._product_operands(value)
+        if operands is None:
+            return statement
+        operands = [self._whole_array(_) for _ in operands]
+        if any(_ is None for _ in operands):
+            return statement
+        ranks = [len(_.extents) for _ in operands]
+        if ranks == [1, 1]:
+            call = self._cblas_call('dot', typed_ast3.Num(n=1.0), operands, None,
+                                    typed_ast3.Num(n=0.0))
+            if augmented:
+                return typed_ast3.AugAssign(target=clone(target), op=typed_ast3.Add(),
+                                            value=call)
+            return typed_ast3.Assign(targets=[clone(target)], value=call,
+                                     type_comment=statement.type_comment)
+        target = self._whole_array(target)
+        if not augmented or target is None or len(target.extents) != max(ranks) + min(ranks) - 2:
+            return statement
+        call = self._cblas_call('gemm' if ranks == [2, 2] else 'gemv', typed_ast3.Num(n=1.0),
+                                operands, target, typed_ast3.Num(n=1.0))
+        return statement if call is None else typed_ast3.Expr(value=call)
@@ -0,0 +1,491 @@
+"""Affine analysis of loops and array subscripts, used to check legality of loop transformations.
+
+Only loops over range() with a constant positive step are analysed, and only subscripts which are
+affine functions of variables (with integer coefficients) give information about dependences.
+Anything that cannot be analysed is treated conservatively, i.e. as a possible dependence.
+Different array names are assumed not to alias each other.
+"""
+
+import collections
+import functools
+import itertools
+import math
+import typing as t
+
+import typed_ast.ast3 as typed_ast3
+
+PURE_FUNCTIONS = {'abs', 'min', 'max', 'float', 'int', 'pow', 'round'}
+
+PURE_MODULES = {'np', 'numpy', 'math'}
+
+
+class AffineExpression:
+
+    """Expression of the form c_1 * v_1 + ... + c_n * v_n + c_0 with integer coefficients."""
+
+    def __init__(self, coefficients: t.Optional[t.Mapping[str, int]] = None, constant: int = 0):
+        self.coefficients = {variable: coefficient
+                             for variable, coefficient in (coefficients or {}).items()
+                             if coefficient != 0}
+        self.constant = constant
+
+    @property
+    def variables(self) -> t.Set[str]:
+        return set(self.coefficients)
+
+    def __add__(self, other: 'AffineExpression') -> 'AffineExpression':
+        coefficients = dict(self.coefficients)
+        for variable, coefficient in other.coefficients.items():
+            coefficients[variable] = coefficients.get(variable, 0) + coefficient
+        return AffineExpression(coefficients, self.constant + other.constant)
+
+    def __neg__(self) -> 'AffineExpression':
+        return self * -1
+
+    def __sub__(self, other: 'AffineExpression') -> 'AffineExpression':
+        return self + -other
+
+    def __mul__(self, factor: int) -> 'AffineExpression':
+        return AffineExpression({variable: coefficient * factor
+                                 for variable, coefficient in self.coefficients.items()},
+                                self.constant * factor)
+
+    def __eq__(self, other):
+        return isinstance(other, AffineExpression) and self.coefficients == other.coefficients \
+            and self.constant == other.constant
+
+    def __hash__(self):
+        return hash((frozenset(self.coefficients.items()), self.constant))
+
+    def __repr__(self):
+        terms = ['{}*{}'.format(coefficient, variable)
+                 for variable, coefficient in sorted(self.coefficients.items())]
+        return ' + '.join(terms + [str(self.constant)])
+
+
+def _is_int(node: typed_ast3.AST) -> bool:
+    return isinstance(node, typed_ast3.Num) and isinstance(node.n, int) \
+        and not isinstance(node.n, bool)
+
+
+def affine_expression(node: typed_ast3.AST) -> t.Optional[AffineExpression]:
+    """Convert an expression to affine form, or return None if it is not affine."""
+    if _is_int(node):
+        return AffineExpression(constant=node.n)
+    if isinstance(node, typed_ast3.Name):
+        return AffineExpression({node.id: 1})
+    if isinstance(node, typed_ast3.UnaryOp) and isinstance(node.op, (typed_ast3.UAdd,
+                                                                        typed_ast3.USub)):
+        operand = affine_expression(node.operand)
+        if operand is None or isinstance(node.op, typed_ast3.UAdd):
+            return operand
+        return -operand
+    if not isinstance(node, typed_ast3.BinOp):
+        return None
+    left = affine_expression(node.left)
+    right = affine_expression(node.right)
+    if left is None or right is None:
+        return None
+    if isinstance(node.op, typed_ast3.Add):
+        return left + right
+    if isinstance(node.op, typed_ast3.Sub):
+        return left - right
+    if isinstance(node.op, typed_ast3.Mult):
+        if not left.coefficients:
+            return right * left.constant
+        if not right.coefficients:
+            return left * right.constant
+    return None
+
+
+RangeLoop = collections.namedtuple('RangeLoop', ['node', 'variable', 'start', 'stop', 'step'])
+
+
+def range_loop(node: typed_ast3.AST) -> t.Optional[RangeLoop]:
+    """Analyse a loop "for variable in range(start, stop, step)" with constant positive step."""
+    if not isinstance(node, typed_ast3.For) or node.orelse \
+            or not isinstance(node.target, typed_ast3.Name):
+        return None
+    iter_ = node.iter
+    if not isinstance(iter_, typed_ast3.Call) or not isinstance(iter_.func, typed_ast3.Name) \
+            or iter_.func.id != 'range' or iter_.keywords or not 1 <= len(iter_.args) <= 3:
+        return None
+    args = iter_.args
+    if len(args) == 1:
+        return RangeLoop(node, node.target.id, typed_ast3.Num(n=0), args[0], 1)
+    if len(args) == 3 and not (_is_int(args[2]) and args[2].n > 0):
+        return None
+    return RangeLoop(node, node.target.id, args[0], args[1], args[2].n if len(args) == 3 else 1)
+
+
+def perfect_loop_nest(node: typed_ast3.For) -> t.List[RangeLoop]:
+    """Collect perfectly nested range loops starting from a given loop.
+
+    The nest is rectangular, i.e. bounds of the loops do not depend on variables of the nest.
+    """
+    loops = []
+    loop = range_loop(node)
+    while loop is not None:
+        variables = {_.variable for _ in loops}
+        bounds_names = {_.id for bound in (loop.start, loop.stop)
+                        for _ in typed_ast3.walk(bound) if isinstance(_, typed_ast3.Name)}
+        if loop.variable in variables or bounds_names & (variables | {loop.variable}):
+            break
+        loops.append(loop)
+        body = loop.node.body
+        if len(body) != 1:
+            break
+        loop = range_loop(body[0])
+    return loops
+
+
+def forall_loop_nest(node: typed_ast3.For) -> t.List[RangeLoop]:
+    """Collect loops over index variables of a single Fortran forall construct.
+
+    The outermost loop generated from a forall construct is marked with "is_forall" Fortran
+    metadata. Return an empty list if the loop is not marked or cannot be analysed.
+    """
+    if not getattr(node, 'fortran_metadata', {}).get('is_forall', False):
+        return []
+    loops = []
+    loop = range_loop(node)
+    while loop is not None:
+        loops.append(loop)
+        body = loop.node.body
+        if len(body) != 1 or getattr(body[0], 'fortran_metadata', {}).get('is_forall', False):
+            break
+        loop = range_loop(body[0])
+    return loops
+
+
+REDUCTION_OPERATORS = {typed_ast3.Add: '+', typed_ast3.Sub: '+', typed_ast3.Mult: '*'}
+
+REDUCTION_FUNCTIONS = {'max', 'min'}
+
+LoopScalars = collections.namedtuple('LoopScalars', ['private', 'reductions'])
+"""Scalars written in a loop body: a set of private ones, and a mapping from reduction variables
+to their operators."""
+
+
+ArrayAccess = collections.namedtuple('ArrayAccess', ['array', 'indices', 'is_write', 'node'])
+"""Access to an element of an array, with indices in affine form (or None if not affine)."""
+
+
+class _AccessesCollector(typed_ast3.NodeVisitor):
+
+    def __init__(self, scalar_writes: bool = False):
+        self.accesses = []  # type: t.List[ArrayAccess]
+        self.scalars = set()  # type: t.Set[str]
+        self.analysable = True
+        self._scalar_writes = scalar_writes
+
+    def _access(self, node: typed_ast3.Subscript, is_write: bool):
+        if not isinstance(node.value, typed_ast3.Name) \
+                or not isinstance(node.slice, typed_ast3.Index):
+            self.analysable = False
+            return
+        index = node.slice.value
+        indices = index.elts if isinstance(index, typed_ast3.Tuple) else [index]
+        self.accesses.append(ArrayAccess(
+            node.value.id, tuple(affine_expression(_) for _ in indices), is_write, node))
+        for index in indices:
+            self.visit(index)
+
+    def visit_Subscript(self, node):  # pylint: disable=invalid-name
+        self._access(node, isinstance(node.ctx, typed_ast3.Store))
+
+    def visit_AugAssign(self, node):  # pylint: disable=invalid-name
+        if isinstance(node.target, typed_ast3.Subscript):
+            self._access(node.target, False)
+        self.generic_visit(node)
+
+    def visit_Name(self, node):  # pylint: disable=invalid-name
+        if not isinstance(node.ctx, typed_ast3.Load) and not self._scalar_writes:
+            self.analysable = False
+        self.scalars.add(node.id)
+
+    def visit_Attribute(self, node):  # pylint: disable=invalid-name
+        if not isinstance(node.ctx, typed_ast3.Load):
+            self.analysable = False
+        self.generic_visit(node)
+
+    def visit_Call(self, node):  # pylint: disable=invalid-name
+        func = node.func
+        if isinstance(func, typed_ast3.Name) and func.id in PURE_FUNCTIONS \
+                or isinstance(func, typed_ast3.Attribute) \
+                and isinstance(func.value, typed_ast3.Name) and func.value.id in PURE_MODULES:
+            for arg in itertools.chain(node.args, (_.value for _ in node.keywords)):
+                self.visit(arg)
+            return
+        self.analysable = False
+
+    def visit_stmt(self, node):
+        if isinstance(node, (typed_ast3.Assign, typed_ast3.AugAssign, typed_ast3.AnnAssign,
+                             typed_ast3.Expr, typed_ast3.If, typed_ast3.Pass)):
+            self.generic_visit(node)
+        else:
+            self.analysable = False
+
+    def visit(self, node):
+        for base in type(node).__mro__:
+            handler = getattr(self, 'visit_{}'.format(base.__name__), None)
+            if handler is not None:
+                return handler(node)
+        return self.generic_visit(node)
+
+
+def array_accesses(statements: t.Sequence[typed_ast3.stmt],
+                   scalar_writes: bool = False) -> t.Optional[t.List[ArrayAccess]]:
+    """Collect all array accesses in given statements.
+
+    Return None if the statements might have effects that cannot be described by accesses
+    to array elements: assignments to scalars (unless scalar_writes is True, in which case
+    the caller is responsible for analysing them) or attributes, calls to functions which are
+    not known to be pure, loops and other compound statements, or uses of written arrays as
+    a whole.
+    """
+    collector = _AccessesCollector(scalar_writes)
+    for statement in statements:
+        collector.visit(statement)
+    if not collector.analysable:
+        return None
+    written = {access.array for access in collector.accesses if access.is_write}
+    if written & collector.scalars:
+        return None
+    return collector.accesses
+
+
+def stride(access: ArrayAccess, variable: str, layout: str = 'C') -> str:
+    """Classify how consecutive iterations of a loop move through elements of an array.
+
+    Result is "invariant" if the variable does not appear in indices, "unit" if it appears only
+    in the contiguous dimension with coefficient 1 or -1, and "strided" otherwise (including when
+    an index is not affine). Layout is "C" (row-major, last dimension is contiguous) or "F"
+    (column-major, first dimension is contiguous), as in NumPy.
+    """
+    assert layout in ('C', 'F'), layout
+    if any(index is None for index in access.indices):
+        return 'strided'
+    dimensions = [dimension for dimension, index in enumerate(access.indices)
+                  if variable in index.coefficients]
+    if not dimensions:
+        return 'invariant'
+    contiguous = len(access.indices) - 1 if layout == 'C' else 0
+    if dimensions == [contiguous] and abs(access.indices[contiguous].coefficients[variable]) == 1:
+        return 'unit'
+    return 'strided'
+
+
+def _distances(access1: ArrayAccess, access2: ArrayAccess,
+               variables: t.Sequence[str]) -> t.Optional[t.Dict[str, int]]:
+    """Find constraints on the distance in iterations of the loops between two accesses.
+
+    Return None if accesses never refer to the same element, or otherwise a mapping from
+    a loop variable to the exact difference between its values in access2 and in access1,
+    for all variables for which it is known.
+    """
+    if len(access1.indices) != len(access2.indices):
+        return {}
+    variables_set = set(variables)
+    distances = {}
+    for index1, index2 in zip(access1.indices, access2.indices):
+        if index1 is None or index2 is None:
+            continue
+        symbols = (index1.variables | index2.variables) - variables_set
+        if any(index1.coefficients.get(_) != index2.coefficients.get(_) for _ in symbols):
+            continue
+        loop_variables = (index1.variables | index2.variables) & variables_set
+        difference = index1.constant - index2.constant
+        if any(index1.coefficients.get(_) != index2.coefficients.get(_) for _ in loop_variables):
+            coefficients = [index.coefficients.get(_, 0)
+                            for index in (index1, index2) for _ in loop_variables]
+            if difference % functools.reduce(math.gcd, coefficients) != 0:
+                return None
+            continue
+        if not loop_variables:
+            if difference != 0:
+                return None
+            continue
+        if len(loop_variables) > 1:
+            coefficients = [index1.coefficients[_] for _ in loop_variables]
+            if difference % functools.reduce(math.gcd, coefficients) != 0:
+                return None
+            continue
+        variable, = loop_variables
+        coefficient = index1.coefficients[variable]
+        if difference % coefficient != 0:
+            return None
+        distance = difference // coefficient
+        if distances.setdefault(variable, distance) != distance:
+            return None
+    return distances
+
+
+def _sign(number: int) -> str:
+    return '<' if number > 0 else '>' if number < 0 else '='
+
+
+def _reversed_direction(direction: t.Tuple[str, ...]) -> t.Tuple[str, ...]:
+    return tuple({'<': '>', '>': '<', '=': '='}[_] for _ in direction)
+
+
+def is_lexicographically_positive(direction: t.Sequence[str]) -> bool:
+    for component in direction:
+        if component != '=':
+            return component == '<'
+    return False
+
+
+def dependence_directions(accesses: t.Sequence[ArrayAccess],
+                          variables: t.Sequence[str]) -> t.Set[t.Tuple[str, ...]]:
+    """Compute direction vectors of all dependences carried by loops with given variables.
+
+    Each direction vector has one component per loop, from the outermost loop, and each
+    component is one of "<" (the dependence goes forward in that loop), "=" or ">". Since
+    dependences go forward in time, all vectors are lexicographically positive, and
+    dependences between accesses within the same iteration of all loops are not included.
+    """
+    directions = set()
+    for access1, access2 in itertools.combinations_with_replacement(accesses, 2):
+        if access1.array != access2.array or not (access1.is_write or access2.is_write):
+            continue
+        distances = _distances(access1, access2, variables)
+        if distances is None:
+            continue
+        for direction in itertools.product(*[
+                _sign(distances[variable]) if variable in distances else '<=>'
+                for variable in variables]):
+            if is_lexicographically_positive(direction):
+                directions.add(direction)
+            elif is_lexicographically_positive(_reversed_direction(direction)):
+                directions.add(_reversed_direction(direction))
+    return directions
+
+
+def is_fully_permutable(directions: t.Iterable[t.Sequence[str]]) -> bool:
+    """Check if loops can be reordered arbitrarily, and in particular tiled."""
+    return all('>' not in direction for direction in directions)
+
+
+def is_loop_parallel(directions: t.Iterable[t.Sequence[str]], level: int) -> bool:
+    """Check if the loop at given level of a nest (0 being the outermost) carries no dependence."""
+    return all(direction[level] == '=' or '<' in direction[:level] for direction in directions)
+
+
+def carries_dependences(loops: t.Sequence[RangeLoop]) -> bool:
+    """Check if iterations of a perfect loop nest might depend on each other."""
+    accesses = array_accesses(loops[-1].node.body)
+    return accesses is None or bool(dependence_directions(accesses, [_.variable for _ in loops]))
+
+
+def is_permutation_legal(directions: t.Iterable[t.Sequence[str]],
+                         permutation: t.Sequence[int]) -> bool:
+    """Check if loops can be reordered so that i-th loop becomes the permutation[i]-th loop."""
+    for direction in directions:
+        permuted = [None] * len(permutation)
+        for index, new_index in enumerate(permutation):
+            permuted[new_index] = direction[index]
+        if not is_lexicographically_positive(permuted):
+            return False
+    return True
+
+
+def is_fusion_legal(accesses1: t.Sequence[ArrayAccess], accesses2: t.Sequence[ArrayAccess],
+                    variables: t.Sequence[str]) -> bool:
+    """Check if bodies of two loop nests with the same iteration space can be executed together.
+
+    After fusion, an iteration of the second body is executed before all later iterations of the
+    first body, instead of after all of them. This is legal if no access in the second body
+    depends on an access in the first body from a later iteration.
+    """
+    for access1, access2 in itertools.product(accesses1, accesses2):
+        if access1.array != access2.array or not (access1.is_write or access2.is_write):
+            continue
+        distances = _distances(access1, access2, variables)
+        if distances is None:
+            continue
+        for direction in itertools.product(*[
+                _sign(distances[variable]) if variable in distances else '<=>'
+                for variable in variables]):
+            if is_lexicographically_positive(_reversed_direction(direction)):
+                return False
+    return True
+
+
+def _names(node: typed_ast3.AST, ctx: type = typed_ast3.Load) -> t.Set[str]:
+    return {_.id for _ in typed_ast3.walk(node)
+            if isinstance(_, typed_ast3.Name) and isinstance(_.ctx, ctx)}
+
+
+def reduction(statement: typed_ast3.stmt) -> t.Optional[t.Tuple[str, str]]:
+    """Recognize reduction statement like "s += e", "s = s * e" or "s = max(s, e)".
+
+    Return the reduction variable and the operator, or None if the statement is not a reduction.
+    """
+    if isinstance(statement, typed_ast3.AugAssign):
+        target, operator, operands = statement.target, statement.op, [statement.value]
+    elif isinstance(statement, typed_ast3.Assign) and len(statement.targets) == 1:
+        target, value = statement.targets[0], statement.value
+        if isinstance(value, typed_ast3.BinOp):
+            operator, operands = value.op, [value.left, value.right]
+        elif isinstance(value, typed_ast3.Call) and isinstance(value.func, typed_ast3.Name) \
+                and value.func.id in REDUCTION_FUNCTIONS and len(value.args) == 2 \
+                and not value.keywords:
+            operator, operands = value.func.id, list(value.args)
+        else:
+            return None
+        if not isinstance(target, typed_ast3.Name):
+            return None
+        if not isinstance(operator, typed_ast3.Sub) and isinstance(operands[1], typed_ast3.Name) \
+                and operands[1].id == target.id:
+            operands.reverse()
+        if not isinstance(operands[0], typed_ast3.Name) or operands[0].id != target.id:
+            return None
+        operands = operands[1:]
+    else:
+        return None
+    if not isinstance(target, typed_ast3.Name):
+        return None
+    if not isinstance(operator, str):
+        operator = REDUCTION_OPERATORS.get(type(operator))
+        if operator is None:
+            return None
+    if any(target.id in _names(_) for _ in operands):
+        return None
+    return target.id, operator
+
+
+def loop_scalars(statements: t.Sequence[typed_ast3.stmt]) -> t.Optional[LoopScalars]:
+    """Classify scalars written in a body of a loop, from the point of view of one iteration.
+
+    A scalar is a reduction variable if all statements that use it are reductions with the same
+    operator, and it is private if it is assigned at the top level of the body before it is
+    read. Return None if any written scalar is neither.
+    """
+    nodes = list(itertools.chain.from_iterable(typed_ast3.walk(_) for _ in statements))
+    operators = collections.defaultdict(set)  # type: t.Dict[str, t.Set[str]]
+    reduction_uses = collections.Counter()  # type: t.Dict[str, int]
+    for node in nodes:
+        reduction_ = reduction(node) if isinstance(node, typed_ast3.stmt) else None
+        if reduction_ is None:
+            continue
+        variable, operator = reduction_
+        operators[variable].add(operator)
+        reduction_uses[variable] += sum(1 for _ in typed_ast3.walk(node)
+                                        if isinstance(_, typed_ast3.Name) and _.id == variable)
+    uses = collections.Counter(_.id for _ in nodes if isinstance(_, typed_ast3.Name))
+    reductions = {}  # type: t.Dict[str, str]
+    for variable, operators_ in operators.items():
+        if len(operators_) == 1 and uses[variable] == reduction_uses[variable]:
+            reductions[variable], = operators_
+    written = set().union(*[_names(_, typed_ast3.Store) for _ in statements]) - set(reductions)
+    private = set()  # type: t.Set[str]
+    for statement in statements:
+        if (_names(statement) & written) - private:
+            return None
+        statement_written = _names(statement, typed_ast3.Store) & written
+        if isinstance(statement, (typed_ast3.Assign, typed_ast3.AnnAssign)):
+            private |= statement_written
+        elif statement_written - private:
+            return None
+    return LoopScalars(private, reductions)
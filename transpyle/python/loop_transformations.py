@@ -0,0 +1,911 @@
+"""Transformations of loop nests in generalized AST.
+
+All transformations are applied only if they are legal according to dependence analysis, and
+leave loops that cannot be analysed untouched.
+"""
+
+import collections
+import itertools
+import logging
+import re
+import typing as t
+
+import horast
+import horast.nodes as horast_nodes
+import static_typing as st
+import typed_ast.ast3 as typed_ast3
+
+from ..general import Language, Transformation
+from ..pair import clone, structurally_equal, OpenMpDirective, openmp_directive
+from .dependence import \
+    AffineExpression, RangeLoop, ArrayAccess, affine_expression, range_loop, perfect_loop_nest, \
+    array_accesses, loop_scalars, stride, dependence_directions, is_fully_permutable, \
+    is_loop_parallel, is_permutation_legal, is_fusion_legal
+
+_LOG = logging.getLogger(__name__)
+
+
+def array_layout(layout_or_language: str) -> str:
+    """Get array layout ("C" or "F") given directly or via name of the target language."""
+    if layout_or_language in ('C', 'F'):
+        return layout_or_language
+    language = Language.find(layout_or_language)
+    if language is None:
+        raise ValueError('"{}" is neither an array layout nor a language name'
+                         .format(layout_or_language))
+    return language.array_layout
+
+
+def _retyped_function(function: typed_ast3.FunctionDef) -> typed_ast3.FunctionDef:
+    """Recompute static typing information of a function, e.g. after adding local variables."""
+    retyped = typed_ast3.FunctionDef(*[getattr(function, field) for field in function._fields])
+    for name, value in vars(function).items():
+        if name not in function._fields and not name.startswith(('_', 'resolved_')):
+            setattr(retyped, name, value)
+    return st.augment(retyped, eval_=False)
+
+
+def make_range_loop(variable: str, start: typed_ast3.expr, stop: typed_ast3.expr, step: int,
+                    body: t.List[typed_ast3.stmt], type_comment: t.Optional[str] = None
+                    ) -> typed_ast3.For:
+    args = [start, stop] if step == 1 else [start, stop, typed_ast3.Num(n=step)]
+    return typed_ast3.For(
+        target=typed_ast3.Name(id=variable, ctx=typed_ast3.Store()),
+        iter=typed_ast3.Call(func=typed_ast3.Name(id='range', ctx=typed_ast3.Load()),
+                             args=args, keywords=[]),
+        body=body, orelse=[], type_comment=type_comment)
+
+
+def _offset_variable(variable: str, offset: int) -> typed_ast3.expr:
+    name = typed_ast3.Name(id=variable, ctx=typed_ast3.Load())
+    if offset == 0:
+        return name
+    return typed_ast3.BinOp(left=name, op=typed_ast3.Add(), right=typed_ast3.Num(n=offset))
+
+
+def substitute_offset(statements: t.Sequence[typed_ast3.stmt], variable: str,
+                      offset: int) -> t.List[typed_ast3.stmt]:
+    """Copy statements, replacing each read of the variable by "variable + offset"."""
+    statements = [clone(statement) for statement in statements]
+    if offset == 0:
+        return statements
+    for node in itertools.chain.from_iterable(typed_ast3.walk(_) for _ in statements):
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if isinstance(value, list):
+                setattr(node, field, [
+                    _offset_variable(variable, offset) if isinstance(_, typed_ast3.Name)
+                    and _.id == variable and isinstance(_.ctx, typed_ast3.Load) else _
+                    for _ in value])
+            elif isinstance(value, typed_ast3.Name) and value.id == variable \
+                    and isinstance(value.ctx, typed_ast3.Load):
+                setattr(node, field, _offset_variable(variable, offset))
+    return statements
+
+
+class LoopNestTransformation(Transformation):
+
+    """Base class for transformations of nests of loops over range().
+
+    Subclasses implement transform_loop(), which is tried on every loop, from the outermost ones,
+    and/or transform_statements(), which is tried on every sequence of statements before loops
+    in it. Functions in which anything was transformed are statically typed again.
+    """
+
+    def __init__(self, **config):
+        super().__init__(**config)
+        self._names = set()  # type: t.Set[str]
+
+    def apply(self, tree: typed_ast3.AST) -> typed_ast3.AST:
+        self._names = {node.id for node in typed_ast3.walk(tree)
+                       if isinstance(node, typed_ast3.Name)}
+        self._names |= {node.arg for node in typed_ast3.walk(tree)
+                        if isinstance(node, typed_ast3.arg)}
+        tree, _ = self._transform_node(tree)
+        return tree
+
+    def fresh_name(self, prefix: str) -> str:
+        """Create a name that is not used anywhere in the transformed tree."""
+        name = prefix
+        index = 0
+        while name in self._names:
+            index += 1
+            name = '{}{}'.format(prefix, index)
+        self._names.add(name)
+        return name
+
+    def transform_loop(self, loop: typed_ast3.For) -> t.Optional[t.List[typed_ast3.stmt]]:
+        """Return statements that replace the loop, or None if the loop is not transformed."""
+        return None
+
+    def transform_statements(self, statements: t.List[typed_ast3.AST]
+                             ) -> t.Optional[t.List[typed_ast3.AST]]:
+        """Return statements that replace given ones, or None if they are not transformed."""
+        return None
+
+    def _transform_node(self, node: typed_ast3.AST) -> t.Tuple[typed_ast3.AST, bool]:
+        changed = False
+        for field in node._fields:
+            values = getattr(node, field, None)
+            if not isinstance(values, list):
+                continue
+            transformed_values = self.transform_statements(values)
+            if transformed_values is not None:
+                values = transformed_values
+                changed = True
+            transformed_values = []
+            for value in values:
+                if not isinstance(value, typed_ast3.AST):
+                    transformed_values.append(value)
+                    continue
+                if isinstance(value, typed_ast3.For):
+                    transformed = self.transform_loop(value)
+                    if transformed is not None:
+                        transformed_values += transformed
+                        changed = True
+                        continue
+                value, value_changed = self._transform_node(value)
+                transformed_values.append(value)
+                changed = changed or value_changed
+            setattr(node, field, transformed_values)
+        if changed and isinstance(node, st.nodes.StaticallyTypedFunctionDef[typed_ast3]):
+            node = _retyped_function(node)
+        return node, changed
+
+
+class LoopTiling(LoopNestTransformation):
+
+    """Tile perfectly nested loops over range() that access arrays via affine subscripts.
+
+    Only nests of at least min_depth loops are tiled, and only if all the loops can be freely
+    reordered. The tile_sizes can be a single size for all loops, or a sequence of sizes for
+    the outermost loops of each nest (a size of 1 means that the loop is not tiled).
+
+    If no size is given, the largest power of 2 is used such that tiles of all accessed arrays
+    together fit in cache_size bytes, assuming 8-byte elements. In that case the innermost loop
+    is not tiled if it already walks through memory with unit stride in the given array layout
+    ("C" for row-major, "F" for column-major, or a name of the target language), because short
+    inner loops hinder vectorization.
+
+    A loop "for i in range(start, stop, step)" is tiled into "for i_tile in range(start, stop,
+    size * step)", which is moved outwards, and "for i in range(i_tile, min(i_tile + size * step,
+    stop), step)", which stays in place.
+    """
+
+    def __init__(self, tile_sizes: t.Union[int, t.Sequence[int], None] = None,
+                 cache_size: int = 32 * 1024, min_depth: int = 2, layout: str = 'C'):
+        if tile_sizes is not None and not isinstance(tile_sizes, int):
+            tile_sizes = tuple(tile_sizes)
+        array_layout(layout)
+        super().__init__(tile_sizes=tile_sizes, cache_size=cache_size, min_depth=min_depth,
+                         layout=layout)
+
+    def tile_sizes(self, loops: t.Sequence[RangeLoop],
+                   accesses: t.Sequence[ArrayAccess]) -> t.List[int]:
+        tile_sizes = self.config['tile_sizes']
+        if isinstance(tile_sizes, int):
+            return [tile_sizes] * len(loops)
+        if tile_sizes is not None:
+            return list(tile_sizes[:len(loops)]) + [1] * (len(loops) - len(tile_sizes))
+        arrays_count = len({_.array for _ in accesses})
+        arrays_rank = max(len(_.indices) for _ in accesses)
+        tile_size = 4
+        while arrays_count * (2 * tile_size) ** arrays_rank * 8 <= self.config['cache_size']:
+            tile_size *= 2
+        tile_sizes = [tile_size] * len(loops)
+        layout = array_layout(self.config['layout'])
+        strides = {stride(_, loops[-1].variable, layout) for _ in accesses}
+        if 'unit' in strides and 'strided' not in strides:
+            tile_sizes[-1] = 1
+        return tile_sizes
+
+    def transform_loop(self, loop: typed_ast3.For) -> t.Optional[t.List[typed_ast3.stmt]]:
+        loops = perfect_loop_nest(loop)
+        if len(loops) < self.config['min_depth']:
+            return None
+        accesses = array_accesses(loops[-1].node.body)
+        if not accesses:
+            return None
+        variables = [_.variable for _ in loops]
+        if not is_fully_permutable(dependence_directions(accesses, variables)):
+            _LOG.debug('not tiling loops over %s due to dependences', variables)
+            return None
+        tile_sizes = self.tile_sizes(loops, accesses)
+        if all(tile_size <= 1 for tile_size in tile_sizes):
+            return None
+        _LOG.debug('tiling loops over %s with tile sizes %s', variables, tile_sizes)
+        tile_variables = [self.fresh_name('{}_tile'.format(loop_.variable)) if tile_size > 1
+                          else None for loop_, tile_size in zip(loops, tile_sizes)]
+        body = loops[-1].node.body
+        for loop_, tile_size, tile_variable in reversed(list(zip(loops, tile_sizes,
+                                                                 tile_variables))):
+            if tile_variable is None:
+                loop_.node.body = body
+                body = [loop_.node]
+                continue
+            tile_end = typed_ast3.BinOp(
+                left=typed_ast3.Name(id=tile_variable, ctx=typed_ast3.Load()), op=typed_ast3.Add(),
+                right=typed_ast3.Num(n=tile_size * loop_.step))
+            stop = typed_ast3.Call(func=typed_ast3.Name(id='min', ctx=typed_ast3.Load()),
+                                   args=[tile_end, clone(loop_.stop)], keywords=[])
+            body = [make_range_loop(
+                loop_.variable, typed_ast3.Name(id=tile_variable, ctx=typed_ast3.Load()), stop,
+                loop_.step, body, loop_.node.type_comment)]
+        for loop_, tile_size, tile_variable in reversed(list(zip(loops, tile_sizes,
+                                                                 tile_variables))):
+            if tile_variable is not None:
+                body = [make_range_loop(tile_variable, clone(loop_.start), clone(loop_.stop),
+                                        tile_size * loop_.step, body, loop_.node.type_comment)]
+        return body
+
+
+class LoopInterchange(LoopNestTransformation):
+
+    """Reorder perfectly nested loops so that inner loops walk through arrays with unit stride.
+
+    For each loop, accesses in which its variable appears in a non-contiguous dimension (given
+    the array layout of the target, "C", "F" or a language name) and accesses in which it
+    appears only in the contiguous dimension are counted. The loop with the fewest strided and
+    the most unit-stride accesses is placed innermost, and so on outwards. Among legal orders,
+    the one that is best for the innermost loop, then for the next one, etc. is chosen, and
+    original order is kept between equally good loops. Nests deeper than max_depth are not
+    reordered.
+    """
+
+    def __init__(self, layout: str = 'C', max_depth: int = 6):
+        array_layout(layout)
+        super().__init__(layout=layout, max_depth=max_depth)
+
+    def loop_order(self, loops: t.Sequence[RangeLoop],
+                   accesses: t.Sequence[ArrayAccess]) -> t.List[int]:
+        """Find the best legal order of loops, as a list of indices of loops from the outermost."""
+        layout = array_layout(self.config['layout'])
+        costs = []
+        for loop in loops:
+            strides = [stride(access, loop.variable, layout) for access in accesses]
+            costs.append((strides.count('strided'), -strides.count('unit')))
+        directions = dependence_directions(accesses, [_.variable for _ in loops])
+        best_order = list(range(len(loops)))
+        best_key = None
+        for order in itertools.permutations(range(len(loops))):
+            permutation = [order.index(index) for index in range(len(loops))]
+            if not is_permutation_legal(directions, permutation):
+                continue
+            key = ([costs[index] for index in reversed(order)],
+                   [abs(position - index) for position, index in enumerate(order)])
+            if best_key is None or key < best_key:
+                best_order, best_key = list(order), key
+        return best_order
+
+    def transform_loop(self, loop: typed_ast3.For) -> t.Optional[t.List[typed_ast3.stmt]]:
+        loops = perfect_loop_nest(loop)
+        if not 2 <= len(loops) <= self.config['max_depth']:
+            return None
+        accesses = array_accesses(loops[-1].node.body)
+        if not accesses:
+            return None
+        order = self.loop_order(loops, accesses)
+        if order == list(range(len(loops))):
+            return None
+        _LOG.debug('reordering loops over %s into %s', [_.variable for _ in loops],
+                   [loops[index].variable for index in order])
+        body = loops[-1].node.body
+        for index in reversed(order):
+            loops[index].node.body = body
+            body = [loops[index].node]
+        return body
+
+
+class LoopUnrolling(LoopNestTransformation):
+
+    """Unroll loops over range(), or unroll outer loops of perfect nests and jam the copies.
+
+    Loops are selected via comment directives placed directly before them, i.e.
+    "# transpyle: unroll(4)" or "# transpyle: unroll_and_jam(2)" in Python and similarly in
+    Fortran, with the factor optional. Directives are consumed by the transformation. If the
+    factor is given in the configuration, additionally all innermost loops are unrolled, or, if
+    jam is True, all outer loops of perfect nests are unrolled and jammed. Directives can be
+    ignored by setting directives to False.
+
+    A loop "for i in range(start, stop, step)" is unrolled into a loop over range(start, end,
+    factor * step) with factor copies of its body, where i is replaced by i + k * step in the
+    k-th copy, and a remainder loop over range(end, stop, step) which has the original body.
+    The end of the unrolled loop is computed in place if the bounds are not constant.
+
+    Unrolling is not applied to loops that assign to their variable or contain break or
+    continue statements. Unroll-and-jam is applied only if moving the unrolled loop to the
+    innermost position would be legal according to dependence analysis.
+    """
+
+    directive_pattern = re.compile(
+        r'^\s*transpyle:\s*(?P<kind>unroll|unroll_and_jam)\s*(\(\s*(?P<factor>[0-9]+)\s*\))?\s*$')
+
+    def __init__(self, factor: t.Optional[int] = None, jam: bool = False,
+                 directives: bool = True, default_factor: int = 4):
+        for factor_ in (factor, default_factor):
+            if factor_ is not None and factor_ < 1:
+                raise ValueError('unrolling factor must be positive, but {} given'.format(factor_))
+        super().__init__(factor=factor, jam=jam, directives=directives,
+                         default_factor=default_factor)
+        self._directives = {}  # type: t.Dict[typed_ast3.For, t.Tuple[bool, int]]
+
+    def apply(self, tree: typed_ast3.AST) -> typed_ast3.AST:
+        self._directives = {}
+        if self.config['directives']:
+            self._consume_directives(tree)
+        return super().apply(tree)
+
+    def _consume_directives(self, tree: typed_ast3.AST) -> None:
+        for node in typed_ast3.walk(tree):
+            for field in node._fields:
+                values = getattr(node, field, None)
+                if not isinstance(values, list):
+                    continue
+                for i, value in reversed(list(enumerate(values[:-1]))):
+                    if not isinstance(value, horast_nodes.Comment) \
+                            or not isinstance(values[i + 1], typed_ast3.For):
+                        continue
+                    match = self.directive_pattern.fullmatch(value.value.s)
+                    if match is None:
+                        continue
+                    factor = match.group('factor')
+                    factor = self.config['default_factor'] if factor is None else int(factor)
+                    self._directives[values[i + 1]] = (match.group('kind') == 'unroll_and_jam',
+                                                       factor)
+                    del values[i]
+
+    def transform_loop(self, loop: typed_ast3.For) -> t.Optional[t.List[typed_ast3.stmt]]:
+        if loop in self._directives:
+            jam, factor = self._directives[loop]
+            loops = perfect_loop_nest(loop)
+            if not loops or not self._can_unroll(loops[0]):
+                _LOG.warning('cannot unroll loop marked by a directive:\n%s',
+                             horast.unparse(loop).strip())
+                return None
+        else:
+            jam, factor = self.config['jam'], self.config['factor']
+            if factor is None:
+                return None
+            loops = perfect_loop_nest(loop)
+            if not loops or not self._can_unroll(loops[0]):
+                return None
+            if jam and len(loops) < 2 or not jam and any(
+                    isinstance(_, (typed_ast3.For, typed_ast3.While))
+                    for _ in typed_ast3.walk(loop) if _ is not loop):
+                return None
+        if factor == 1:
+            return None
+        if not jam or len(loops) < 2:
+            return self._unroll(loops[:1], factor)
+        accesses = array_accesses(loops[-1].node.body)
+        if not accesses:
+            return None
+        directions = dependence_directions(accesses, [_.variable for _ in loops])
+        if not is_permutation_legal(directions, [len(loops) - 1] + list(range(len(loops) - 1))):
+            _LOG.debug('not unrolling and jamming loop over %s due to dependences',
+                       loops[0].variable)
+            return None
+        return self._unroll(loops, factor)
+
+    @staticmethod
+    def _can_unroll(loop: RangeLoop) -> bool:
+        for node in itertools.chain.from_iterable(typed_ast3.walk(_) for _ in loop.node.body):
+            if isinstance(node, (typed_ast3.Break, typed_ast3.Continue)):
+                return False
+            if isinstance(node, typed_ast3.Name) and node.id == loop.variable \
+                    and not isinstance(node.ctx, typed_ast3.Load):
+                return False
+        return True
+
+    @staticmethod
+    def _unrolled_end(loop: RangeLoop, factor: int) -> typed_ast3.expr:
+        """Create expression for the end of the unrolled loop, start + n * factor * step."""
+        start, stop, step = loop.start, loop.stop, loop.step
+        if all(isinstance(_, typed_ast3.Num) and isinstance(_.n, int) for _ in (start, stop)):
+            count = max(stop.n - start.n + step - 1, 0) // (factor * step)
+            return typed_ast3.Num(n=start.n + count * factor * step)
+        starts_from_zero = isinstance(start, typed_ast3.Num) and start.n == 0
+        distance = clone(stop)
+        if isinstance(start, typed_ast3.Num) and start.n != step - 1:
+            distance = typed_ast3.BinOp(left=distance, op=typed_ast3.Sub(),
+                                        right=typed_ast3.Num(n=start.n - step + 1))
+        elif not isinstance(start, typed_ast3.Num):
+            distance = typed_ast3.BinOp(left=distance, op=typed_ast3.Sub(), right=clone(start))
+            if step > 1:
+                distance = typed_ast3.BinOp(left=distance, op=typed_ast3.Add(),
+                                            right=typed_ast3.Num(n=step - 1))
+        end = typed_ast3.BinOp(
+            left=typed_ast3.BinOp(
+                left=typed_ast3.Call(func=typed_ast3.Name(id='max', ctx=typed_ast3.Load()),
+                                     args=[distance, typed_ast3.Num(n=0)], keywords=[]),
+                op=typed_ast3.FloorDiv(), right=typed_ast3.Num(n=factor * step)),
+            op=typed_ast3.Mult(), right=typed_ast3.Num(n=factor * step))
+        if not starts_from_zero:
+            end = typed_ast3.BinOp(left=clone(start), op=typed_ast3.Add(), right=end)
+        return end
+
+    def _unroll(self, loops: t.Sequence[RangeLoop],
+                factor: int) -> t.Optional[t.List[typed_ast3.stmt]]:
+        """Unroll the first of given perfectly nested loops and jam copies into the last one."""
+        outer = loops[0]
+        end = self._unrolled_end(outer, factor)
+        if isinstance(end, typed_ast3.Num) and isinstance(outer.start, typed_ast3.Num) \
+                and end.n == outer.start.n:
+            _LOG.debug('loop over %s has fewer than %i iterations', outer.variable, factor)
+            return None
+        _LOG.debug('unrolling loop over %s by %i%s', outer.variable, factor,
+                   ' and jamming' if len(loops) > 1 else '')
+        remainder = None
+        if not isinstance(end, typed_ast3.Num) or not isinstance(outer.stop, typed_ast3.Num) \
+                or end.n < outer.stop.n:
+            remainder = make_range_loop(
+                outer.variable, clone(end), clone(outer.stop), outer.step,
+                [clone(_) for _ in outer.node.body], outer.node.type_comment)
+        body = loops[-1].node.body
+        loops[-1].node.body = list(itertools.chain.from_iterable(
+            substitute_offset(body, outer.variable, copy * outer.step)
+            for copy in range(factor)))
+        unrolled = make_range_loop(outer.variable, clone(outer.start), end,
+                                   factor * outer.step, outer.node.body, outer.node.type_comment)
+        return [unrolled] if remainder is None else [unrolled, remainder]
+
+
+def _nest_with_body(loops: t.Sequence[RangeLoop],
+                    body: t.List[typed_ast3.stmt]) -> typed_ast3.For:
+    """Copy a perfect loop nest, with the body of the innermost loop replaced."""
+    nest = clone(loops[0].node)
+    innermost = nest
+    for _ in loops[1:]:
+        innermost = innermost.body[0]
+    innermost.body = body
+    return nest
+
+
+def _bounds_names(loops: t.Sequence[RangeLoop]) -> t.Set[str]:
+    return {_.id for loop in loops for bound in (loop.start, loop.stop)
+            for _ in typed_ast3.walk(bound) if isinstance(_, typed_ast3.Name)}
+
+
+class LoopFusion(LoopNestTransformation):
+
+    """Merge adjacent perfect loop nests over the same iteration space into one nest.
+
+    Nests are fused if they have the same depth, the same loop variables and the same bounds,
+    their bodies can be analysed by dependence analysis, and no access in the second body
+    depends on an access in the first body from a later iteration. Any number of adjacent
+    nests can be fused into one.
+    """
+
+    @staticmethod
+    def _fused(loops1: t.Sequence[RangeLoop], loops2: t.Sequence[RangeLoop]
+               ) -> t.Optional[t.List[typed_ast3.stmt]]:
+        if not loops1 or len(loops1) != len(loops2):
+            return None
+        for loop1, loop2 in zip(loops1, loops2):
+            if loop1.variable != loop2.variable or loop1.step != loop2.step \
+                    or not structurally_equal(loop1.start, loop2.start) \
+                    or not structurally_equal(loop1.stop, loop2.stop):
+                return None
+        body1, body2 = loops1[-1].node.body, loops2[-1].node.body
+        accesses1, accesses2 = array_accesses(body1), array_accesses(body2)
+        if accesses1 is None or accesses2 is None or array_accesses(body1 + body2) is None:
+            return None
+        written = {_.array for _ in accesses1 if _.is_write}
+        if written & _bounds_names(loops2):
+            return None
+        variables = [_.variable for _ in loops1]
+        if not is_fusion_legal(accesses1, accesses2, variables):
+            _LOG.debug('not fusing loops over %s due to dependences', variables)
+            return None
+        _LOG.debug('fusing loops over %s', variables)
+        return body1 + body2
+
+    def transform_statements(self, statements: t.List[typed_ast3.AST]
+                             ) -> t.Optional[t.List[typed_ast3.AST]]:
+        transformed = []
+        changed = False
+        loops = []  # type: t.List[RangeLoop]
+        for statement in statements:
+            if loops and isinstance(statement, typed_ast3.For):
+                statement_loops = perfect_loop_nest(statement)
+                body = self._fused(loops, statement_loops)
+                if body is not None:
+                    loops[-1].node.body = body
+                    changed = True
+                    continue
+            transformed.append(statement)
+            loops = perfect_loop_nest(statement) if isinstance(statement, typed_ast3.For) else []
+        return transformed if changed else None
+
+
+class LoopDistribution(LoopNestTransformation):
+
+    """Split perfect loop nests into a sequence of nests over the same iteration space.
+
+    The body of the innermost loop is divided at every point where it is legal, i.e. where the
+    resulting nests could be fused back into the original one, so the order of statements is
+    preserved. Comments stay with the statements that follow them. Nests whose bodies cannot
+    be analysed by dependence analysis are not split.
+    """
+
+    def transform_loop(self, loop: typed_ast3.For) -> t.Optional[t.List[typed_ast3.stmt]]:
+        loops = perfect_loop_nest(loop)
+        if not loops or array_accesses(loops[-1].node.body) is None:
+            return None
+        parts = [[]]  # type: t.List[t.List[typed_ast3.stmt]]
+        for statement in loops[-1].node.body:
+            parts[-1].append(statement)
+            if not isinstance(statement, horast_nodes.Comment):
+                parts.append([])
+        if not parts[-1]:
+            parts.pop()
+        elif len(parts) > 1:
+            parts[-2] += parts.pop()
+        if len(parts) < 2:
+            return None
+        parts_accesses = [array_accesses(part) for part in parts]
+        written = {_.array for accesses in parts_accesses for _ in accesses if _.is_write}
+        if written & _bounds_names(loops):
+            return None
+        variables = [_.variable for _ in loops]
+        groups = [parts[0]]
+        for index in range(1, len(parts)):
+            if is_fusion_legal(list(itertools.chain.from_iterable(parts_accesses[:index])),
+                               list(itertools.chain.from_iterable(parts_accesses[index:])),
+                               variables):
+                groups.append([])
+            groups[-1] += parts[index]
+        if len(groups) == 1:
+            return None
+        _LOG.debug('distributing loops over %s into %i nests', variables, len(groups))
+        return [_nest_with_body(loops, group) for group in groups]
+
+
+def loops_with_directives(tree: typed_ast3.AST) -> t.Set[typed_ast3.For]:
+    """Find loops which are directly preceded by an OpenMP directive."""
+    loops = set()  # type: t.Set[typed_ast3.For]
+    for node in typed_ast3.walk(tree):
+        for values in (getattr(node, field, None) for field in node._fields):
+            if isinstance(values, list):
+                loops.update(value for previous, value in zip(values, values[1:])
+                             if isinstance(value, typed_ast3.For)
+                             and openmp_directive(previous) is not None)
+    return loops
+
+
+class LoopParallelization(LoopNestTransformation):
+
+    """Mark loops that carry no dependences with OpenMP "parallel for" directives.
+
+    In each perfect nest of loops over range(), the outermost loop that carries no dependence
+    is parallelized, provided that all scalars assigned in the body of the nest are either
+    reduction variables or are assigned before they are read in each iteration. The latter are
+    private, or lastprivate if they are used outside of the loop nest.
+
+    Loops that are already preceded by an OpenMP directive, and loops nested in them, are
+    left as they are.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._names_counts = collections.Counter()  # type: t.Dict[str, int]
+        self._marked_loops = set()  # type: t.Set[typed_ast3.For]
+
+    def apply(self, tree: typed_ast3.AST) -> typed_ast3.AST:
+        self._names_counts = collections.Counter(
+            _.id for _ in typed_ast3.walk(tree) if isinstance(_, typed_ast3.Name))
+        self._marked_loops = loops_with_directives(tree)
+        return super().apply(tree)
+
+    def parallel_loop(self, loops: t.Sequence[RangeLoop]
+                      ) -> t.Optional[t.Tuple[int, OpenMpDirective]]:
+        """Find the outermost parallel loop of a perfect nest and create a directive for it."""
+        body = loops[-1].node.body
+        accesses = array_accesses(body, scalar_writes=True)
+        scalars = loop_scalars(body)
+        if accesses is None or scalars is None:
+            return None
+        directions = dependence_directions(accesses, [_.variable for _ in loops])
+        levels = [level for level in range(len(loops)) if is_loop_parallel(directions, level)]
+        if not levels:
+            return None
+        names_counts = collections.Counter(
+            _.id for _ in typed_ast3.walk(loops[0].node) if isinstance(_, typed_ast3.Name))
+        private = sorted(_ for _ in scalars.private
+                         if self._names_counts[_] == names_counts[_])
+        last_private = sorted(scalars.private - set(private))
+        clauses = ['{}({})'.format(name, ', '.join(variables))
+                   for name, variables in (('private', private), ('lastprivate', last_private))
+                   if variables]
+        reductions = collections.defaultdict(list)
+        for variable, operator in sorted(scalars.reductions.items()):
+            reductions[operator].append(variable)
+        clauses += ['reduction({}:{})'.format(operator, ', '.join(variables))
+                    for operator, variables in sorted(reductions.items())]
+        return levels[0], OpenMpDirective('parallel for', clauses)
+
+    def transform_loop(self, loop: typed_ast3.For) -> t.Optional[t.List[typed_ast3.stmt]]:
+        if loop in self._marked_loops:
+            return [loop]
+        loops = perfect_loop_nest(loop)
+        if not loops:
+            return None
+        parallel_loop = self.parallel_loop(loops)
+        if parallel_loop is None:
+            return None
+        level, directive = parallel_loop
+        _LOG.debug('parallelizing loop over %s: %s', loops[level].variable, directive)
+        if level == 0:
+            return [directive.to_comment(), loop]
+        loops[level - 1].node.body = [directive.to_comment(), loops[level].node]
+        return [loop]
+
+
+def _names(node: typed_ast3.AST) -> t.Set[str]:
+    return {_.id for _ in typed_ast3.walk(node) if isinstance(_, typed_ast3.Name)}
+
+
+def _with_ctx(node: typed_ast3.expr, ctx: type) -> typed_ast3.expr:
+    node = clone(node)
+    node.ctx = ctx()
+    return node
+
+
+def affine_to_expression(affine: AffineExpression,
+                         base: t.Optional[typed_ast3.expr] = None) -> typed_ast3.expr:
+    """Create expression "base + affine", with the terms of affine expression in sorted order."""
+    expression = None if base is None else clone(base)
+    terms = [(coefficient, typed_ast3.Name(id=variable, ctx=typed_ast3.Load()))
+             for variable, coefficient in sorted(affine.coefficients.items())]
+    if affine.constant != 0 or not terms and expression is None:
+        terms.append((1 if affine.constant >= 0 else -1, typed_ast3.Num(n=abs(affine.constant))))
+    for coefficient, term in terms:
+        if abs(coefficient) != 1:
+            term = typed_ast3.BinOp(left=typed_ast3.Num(n=abs(coefficient)), op=typed_ast3.Mult(),
+                                    right=term)
+        if expression is None:
+            expression = term if coefficient > 0 else typed_ast3.UnaryOp(
+                op=typed_ast3.USub(), operand=term)
+        else:
+            expression = typed_ast3.BinOp(
+                left=expression, op=typed_ast3.Add() if coefficient > 0 else typed_ast3.Sub(),
+                right=term)
+    return expression
+
+
+def _shifted(bound: typed_ast3.expr, offset: AffineExpression) -> typed_ast3.expr:
+    bound_affine = affine_expression(bound)
+    if bound_affine is not None:
+        return affine_to_expression(bound_affine + offset)
+    return affine_to_expression(offset, bound)
+
+
+def loop_only_names(tree: typed_ast3.AST) -> t.Set[str]:
+    """Find names which are used only in loops over them, i.e. not read after any loop ends."""
+    names_counts = collections.Counter(
+        _.id for _ in typed_ast3.walk(tree) if isinstance(_, typed_ast3.Name))
+    loops_names_counts = collections.Counter()  # type: t.Dict[str, int]
+    for loop in typed_ast3.walk(tree):
+        if isinstance(loop, typed_ast3.For) and isinstance(loop.target, typed_ast3.Name):
+            loops_names_counts[loop.target.id] += sum(
+                1 for _ in typed_ast3.walk(loop)
+                if isinstance(_, typed_ast3.Name) and _.id == loop.target.id)
+    return {name for name, count in names_counts.items() if loops_names_counts[name] == count}
+
+
+def array_section(subscript: typed_ast3.Subscript, loops: t.Sequence[RangeLoop],
+                  inclusive: bool = False) -> t.Optional[typed_ast3.Subscript]:
+    """Create section of an array which is accessed via given subscript by given loops.
+
+    Each dimension of the subscript may depend on at most one of the loops, and only like
+    "variable + offset". Upper bounds of created slices are inclusive (like in Fortran) if
+    requested. Return None if the subscript cannot be converted.
+    """
+    if not isinstance(subscript.slice, typed_ast3.Index):
+        return None
+    index = subscript.slice.value
+    dims = index.elts if isinstance(index, typed_ast3.Tuple) else [index]
+    loops_by_variable = {loop.variable: loop for loop in loops}
+    used_variables = set()  # type: t.Set[str]
+    sliced_dims = []
+    for dim in dims:
+        variables = _names(dim) & set(loops_by_variable)
+        if not variables:
+            sliced_dims.append(typed_ast3.Index(value=clone(dim)))
+            continue
+        variable, = variables if len(variables) == 1 else (None,)
+        affine = affine_expression(dim)
+        if variable is None or variable in used_variables or affine is None \
+                or affine.coefficients.get(variable) != 1:
+            return None
+        used_variables.add(variable)
+        loop = loops_by_variable[variable]
+        offset = affine - AffineExpression({variable: 1})
+        stop_offset = offset - AffineExpression(constant=1) if inclusive else offset
+        sliced_dims.append(typed_ast3.Slice(
+            lower=_shifted(loop.start, offset), upper=_shifted(loop.stop, stop_offset),
+            step=None if loop.step == 1 else typed_ast3.Num(n=loop.step)))
+    slice_ = sliced_dims[0] if len(sliced_dims) == 1 else typed_ast3.ExtSlice(dims=sliced_dims)
+    return typed_ast3.Subscript(value=clone(subscript.value), slice=slice_, ctx=typed_ast3.Load())
+
+
+def add_numpy_import(tree: typed_ast3.AST) -> None:
+    """Insert "import numpy as np" at the beginning of a module, unless np is imported already."""
+    if isinstance(tree, typed_ast3.Module) and not any(
+            isinstance(_, (typed_ast3.Import, typed_ast3.ImportFrom))
+            and any((alias.asname or alias.name) == 'np' for alias in _.names)
+            for _ in tree.body):
+        tree.body.insert(0, typed_ast3.Import(names=[typed_ast3.alias(name='numpy', asname='np')]))
+
+
+class ReductionSubstitution(LoopNestTransformation):
+
+    """Replace loops that reduce an array expression to a scalar by operations on whole arrays.
+
+    A loop over range() whose body is a single statement like "s += e", "s = s * e" or
+    "s = max(s, e)", where s does not depend on the loop and e is an element-wise expression
+    in which the loop variable appears only in affine subscripts like "a[y, i + 1]", is
+    replaced depending on the target language:
+
+    * in Python and Fortran, by a single statement that applies np.sum(), np.prod(), np.max(),
+      np.min() or np.dot() (i.e. Fortran intrinsics sum, product, maxval, minval and
+      dot_product) to array sections, with upper bounds of sections inclusive in Fortran;
+    * in C and C++, the loop is kept and marked with "simd reduction" OpenMP directive, but only
+      if s is a scalar variable.
+
+    Loops whose variable is used outside of loops over it, and loops already preceded by an
+    OpenMP directive, are left as they are.
+    """
+
+    def __init__(self, target: str = 'Python 3'):
+        language = Language.find(target)
+        if language is None:
+            raise ValueError('"{}" is not a language name'.format(target))
+        super().__init__(target=target)
+        name = language.lowercase_name
+        self._mode = 'fortran' if name.startswith('fortran') \
+            else 'openmp' if name.startswith('c') else 'numpy'
+        self._loop_only_names = set()  # type: t.Set[str]
+        self._marked_loops = set()  # type: t.Set[typed_ast3.For]
+        self._substituted = False
+
+    def apply(self, tree: typed_ast3.AST) -> typed_ast3.AST:
+        self._marked_loops = loops_with_directives(tree)
+        self._loop_only_names = loop_only_names(tree)
+        self._substituted = False
+        tree = super().apply(tree)
+        if self._substituted and self._mode == 'numpy':
+            add_numpy_import(tree)
+        return tree
+
+    @staticmethod
+    def reduction_parts(statement: typed_ast3.stmt
+                        ) -> t.Optional[t.Tuple[typed_ast3.expr, str, typed_ast3.expr]]:
+        """Split a reduction statement into target, operator and reduced expression.
+
+        Operator is one of "+", "-", "*", "max" and "min".
+        """
+        operators = {typed_ast3.Add: '+', typed_ast3.Sub: '-', typed_ast3.Mult: '*'}
+        if isinstance(statement, typed_ast3.AugAssign):
+            operator = operators.get(type(statement.op))
+            target, operands = statement.target, [statement.value]
+        elif isinstance(statement, typed_ast3.Assign) and len(statement.targets) == 1:
+            target, value = statement.targets[0], statement.value
+            if isinstance(value, typed_ast3.BinOp):
+                operator, operands = operators.get(type(value.op)), [value.left, value.right]
+            elif isinstance(value, typed_ast3.Call) and isinstance(value.func, typed_ast3.Name) \
+                    and value.func.id in ('max', 'min') and len(value.args) == 2 \
+                    and not value.keywords:
+                operator, operands = value.func.id, list(value.args)
+            else:
+                return None
+            if operator != '-' and structurally_equal(operands[1], _with_ctx(
+                    target, typed_ast3.Load)):
+                operands.reverse()
+            if not structurally_equal(operands[0], _with_ctx(target, typed_ast3.Load)):
+                return None
+            operands = operands[1:]
+        else:
+            return None
+        if operator is None or not isinstance(target, (typed_ast3.Name, typed_ast3.Subscript)):
+            return None
+        target_name = target.id if isinstance(target, typed_ast3.Name) else None
+        if target_name is None and isinstance(target.value, typed_ast3.Name):
+            target_name = target.value.id
+        if target_name is None or target_name in {
+                _.id for _ in typed_ast3.walk(operands[0]) if isinstance(_, typed_ast3.Name)}:
+            return None
+        return target, operator, operands[0]
+
+    def vectorized(self, expression: typed_ast3.expr,
+                   loop: RangeLoop) -> t.Optional[typed_ast3.expr]:
+        """Create element-wise expression on array sections equivalent to the loop over given one.
+
+        Return None if the expression is not element-wise in the loop variable.
+        """
+        if loop.variable not in _names(expression):
+            if isinstance(expression, (typed_ast3.Name, typed_ast3.Num, typed_ast3.Subscript)):
+                return clone(expression)
+            return None
+        if isinstance(expression, typed_ast3.Subscript):
+            return array_section(expression, [loop], self._mode == 'fortran')
+        if isinstance(expression, typed_ast3.BinOp) and isinstance(expression.op, (
+                typed_ast3.Add, typed_ast3.Sub, typed_ast3.Mult, typed_ast3.Div)):
+            left = self.vectorized(expression.left, loop)
+            right = self.vectorized(expression.right, loop)
+            if left is None or right is None:
+                return None
+            return typed_ast3.BinOp(left=left, op=type(expression.op)(), right=right)
+        if isinstance(expression, typed_ast3.UnaryOp) and isinstance(expression.op, (
+                typed_ast3.UAdd, typed_ast3.USub)):
+            operand = self.vectorized(expression.operand, loop)
+            return None if operand is None else typed_ast3.UnaryOp(
+                op=type(expression.op)(), operand=operand)
+        if isinstance(expression, typed_ast3.Call) \
+                and isinstance(expression.func, typed_ast3.Name) and expression.func.id == 'abs' \
+                and len(expression.args) == 1 and not expression.keywords:
+            argument = self.vectorized(expression.args[0], loop)
+            return None if argument is None else typed_ast3.Call(
+                func=clone(expression.func), args=[argument], keywords=[])
+        return None
+
+    def _reduced(self, operator: str, operand: typed_ast3.expr,
+                 loop: RangeLoop) -> t.Optional[typed_ast3.expr]:
+        functions = {'+': 'sum', '-': 'sum', '*': 'prod', 'max': 'max', 'min': 'min'}
+        args = [operand]
+        if operator in ('+', '-') and isinstance(operand, typed_ast3.BinOp) \
+                and isinstance(operand.op, typed_ast3.Mult) \
+                and loop.variable in _names(operand.left) \
+                and loop.variable in _names(operand.right):
+            function, args = 'dot', [operand.left, operand.right]
+        else:
+            function = functions[operator]
+        args = [self.vectorized(_, loop) for _ in args]
+        if any(_ is None for _ in args):
+            return None
+        return typed_ast3.Call(func=typed_ast3.Attribute(
+            value=typed_ast3.Name(id='np', ctx=typed_ast3.Load()), attr=function,
+            ctx=typed_ast3.Load()), args=args, keywords=[])
+
+    def transform_loop(self, loop: typed_ast3.For) -> t.Optional[t.List[typed_ast3.stmt]]:
+        range_ = range_loop(loop)
+        if loop in self._marked_loops or range_ is None or len(loop.body) != 1:
+            return None
+        parts = self.reduction_parts(loop.body[0])
+        if parts is None:
+            return None
+        target, operator, operand = parts
+        if range_.variable in _names(target) or range_.variable not in _names(operand):
+            return None
+        if self._mode == 'openmp':
+            if not isinstance(target, typed_ast3.Name) \
+                    or self.vectorized(operand, range_) is None:
+                return None
+            directive = OpenMpDirective('simd', ['reduction({}:{})'.format(
+                '+' if operator == '-' else operator, target.id)])
+            _LOG.debug('marking reduction loop over %s: %s', range_.variable, directive)
+            return [directive.to_comment(), loop]
+        if range_.variable not in self._loop_only_names:
+            return None
+        reduced = self._reduced(operator, operand, range_)
+        if reduced is None:
+            return None
+        _LOG.debug('substituting reduction loop over %s', range_.variable)
+        self._substituted = True
+        if operator in ('+', '-', '*'):
+            op_type = {'+': typed_ast3.Add, '-': typed_ast3.Sub, '*': typed_ast3.Mult}[operator]
+            return [typed_ast3.AugAssign(target=_with_ctx(target, typed_ast3.Store),
+                                         op=op_type(), value=reduced)]
+        statement = typed_ast3.Assign(
+            targets=[_with_ctx(target, typed_ast3.Store)],
+            value=typed_ast3.Call(func=typed_ast3.Name(id=operator, ctx=typed_ast3.Load()),
+                                  args=[_with_ctx(target, typed_ast3.Load), reduced],
+                                  keywords=[]),
+            type_comment=None)
+        if all(isinstance(_, typed_ast3.Num) and isinstance(_.n, int)
+               for _ in (range_.start, range_.stop)) and range_.stop.n > range_.start.n:
+            return [statement]
+        return [typed_ast3.If(
+            test=typed_ast3.Compare(left=clone(range_.stop), ops=[typed_ast3.Gt()],
+                                    comparators=[clone(range_.start)]),
+            body=[statement], orelse=[])]
@@ -1,11 +1,10 @@
 """Preliminary implementation of inlining."""
 
 import collections.abc
-import copy
 import functools
+import itertools
+import linecache
 import logging
-import pathlib
-import tempfile
 import types
 import typing as t
 
@@ -15,8 +14,9 @@ import static_typing as st
 import typed_ast.ast3 as typed_ast3
 import typed_astunparse
 
-from ..general import Language, CodeReader, Parser, CodeWriter
+from ..general import Language, CodeReader, Parser, Transformation
 from ..general.misc import flatten_syntax
+from ..pair import clone, NodePass, FusedVisitor, FusedTransformer
 
 _LOG = logging.getLogger(__name__)
 
@@ -28,34 +28,62 @@ VALID_CONTEXTS = {
 VALID_CONTEXTS_TUPLE = tuple(VALID_CONTEXTS.keys())
 
 
-class Replacer(st.ast_manipulation.RecursiveAstTransformer[typed_ast3]):
+class Replacer(NodePass):
 
-    def __init__(self, replacer):
-        super().__init__()
+    """Replace nodes of given type using a function, which returns either the same or a new node.
+
+    Many replacers can be applied in a single traversal using FusedTransformer.
+    """
+
+    def __init__(self, replacer, node_type: type = typed_ast3.AST,
+                 skipped_types: t.Tuple[type, ...] = ()):
         self._replacer = replacer
+        self._node_type = node_type
+        self.skipped_types = skipped_types
 
-    def visit_node(self, node):
-        return self._replacer(node)
+    def handler(self, node_type: type):
+        if issubclass(node_type, self._node_type):
+            return self._replacer
+        return None
 
     def __repr__(self):
         return 'Replacer({})'.format(self._replacer)
 
 
-class ReturnFinder(st.ast_manipulation.RecursiveAstVisitor[typed_ast3]):
+class ReturnFinder(NodePass):
+
+    skipped_types = (typed_ast3.expr,)
 
     def __init__(self):
-        super().__init__()
         self.found = []
 
-    def visit_node(self, node):
-        if isinstance(node, typed_ast3.Return):
-            self.found.append(node)
+    def visit_Return(self, node):  # pylint: disable=invalid-name
+        self.found.append(node)
 
 
-def replace_name(arg, value, name):
-    if isinstance(name, typed_ast3.Name) and name.id == arg:
-        return value
-    return name
+class ArgumentsReplacer(NodePass):
+
+    """Substitute all parameters of a function with arguments of a call in a single pass.
+
+    Substitution is simultaneous, i.e. substituted arguments are not substituted again,
+    and each occurrence of a parameter gets its own copy of the argument.
+    """
+
+    visits_replacements = False
+
+    def __init__(self, args_mapping: t.Mapping[str, typed_ast3.AST]):
+        self._args_mapping = args_mapping
+
+    def visit_Name(self, node):  # pylint: disable=invalid-name
+        try:
+            return clone(self._args_mapping[node.id])
+        except KeyError:
+            return node
+
+    def __repr__(self):
+        return 'ArgumentsReplacer({})'.format(
+            {arg: typed_astunparse.unparse(value).strip()
+             for arg, value in self._args_mapping.items()})
 
 
 def delete_declaration(declaration):
@@ -83,15 +111,17 @@ def names_equivalent(arg: str, value: typed_ast3.AST):
     if isinstance(value, typed_ast3.Subscript):
         _LOG.warning('ignoring indices when checking name equivalence')
         return names_equivalent(arg, value.value)
-    # import ipdb; ipdb.set_trace()
+    if isinstance(value, typed_ast3.expr):
+        return False
     raise NotImplementedError('cannot check name equivalence of {}'.format(type(value)))
 
 
 def create_name_replacers(values, replacements):
     args_mapping = {arg: value for arg, value in zip(values, replacements)
                     if not names_equivalent(arg, value)}
-    return [Replacer(functools.partial(replace_name, arg, value))
-            for arg, value in args_mapping.items()]
+    if not args_mapping:
+        return []
+    return [ArgumentsReplacer(args_mapping)]
 
 
 def convert_return_to_assign(target, return_statement):
@@ -100,11 +130,10 @@ def convert_return_to_assign(target, return_statement):
     return return_statement
 
 
-class CallInliner(st.ast_manipulation.RecursiveAstTransformer[typed_ast3]):
+class CallInliner(NodePass):
 
     def __init__(self, inlined_function: st.nodes.StaticallyTypedFunctionDef[typed_ast3],
                  verbose: bool = True):
-        super().__init__(fields_first=False)
         assert isinstance(inlined_function, typed_ast3.FunctionDef), type(inlined_function)
         assert inlined_function.body
 
@@ -123,13 +152,14 @@ class CallInliner(st.ast_manipulation.RecursiveAstTransformer[typed_ast3]):
 
         self._inlined_function = inlined_function
         self._inlined_args = [arg.arg for arg in inlined_function.args.args]
+        self._template = [st.augment(clone(stmt), eval_=False) for stmt in inlined_function.body]
         self._verbose = verbose
 
         self._valid_inlining_contexts = {typed_ast3.Return}
 
         last_statement = self._inlined_function.body[-1]
         return_finder = ReturnFinder()
-        return_finder.visit(self._inlined_function)
+        FusedVisitor([return_finder]).visit(self._inlined_function)
         _LOG.warning('last statement is: %s', last_statement)
         if len(self._inlined_function.body) == 1 and isinstance(last_statement, typed_ast3.Return):
             self._valid_inlining_contexts |= {t.Any}
@@ -164,7 +194,8 @@ class CallInliner(st.ast_manipulation.RecursiveAstTransformer[typed_ast3]):
         assert isinstance(assign, typed_ast3.AnnAssign) or len(assign.targets) == 1
 
         target = getattr(assign, 'target', getattr(assign, 'targets', [None])[0])
-        return_replacer = Replacer(functools.partial(convert_return_to_assign, target))
+        return_replacer = Replacer(functools.partial(convert_return_to_assign, target),
+                                   typed_ast3.Return, (typed_ast3.expr,))
 
         replacers = []
         replacers += create_name_replacers(self._inlined_args, call.args)
@@ -177,7 +208,7 @@ class CallInliner(st.ast_manipulation.RecursiveAstTransformer[typed_ast3]):
         assert self._is_valid_target_for_inlining(call)
 
         replacers = []
-        replacers.append(Replacer(delete_declaration))
+        replacers.append(Replacer(delete_declaration, typed_ast3.stmt, (typed_ast3.expr,)))
         replacers += create_name_replacers(self._inlined_args, call.args)
 
         return self._inline_call(call, replacers)
@@ -187,13 +218,12 @@ class CallInliner(st.ast_manipulation.RecursiveAstTransformer[typed_ast3]):
         # inlined_call = typed_ast3.parse(template_code).body[0]
         call_code = typed_astunparse.unparse(call).strip()
         inlined_statements = []
+        transformer = FusedTransformer(replacers)
         if self._verbose:
             inlined_statements.append(horast_nodes.Comment(
                 value=typed_ast3.Str(' inlined {}'.format(call_code), ''), eol=False))
-        for stmt in self._inlined_function.body:
-            stmt = st.augment(copy.deepcopy(stmt), eval_=False)
-            for replacer in replacers:
-                stmt = replacer.visit(stmt)
+        for stmt in self._template:
+            stmt = transformer.visit(clone(stmt))
             if stmt is not None:
                 inlined_statements.append(stmt)
         if self._verbose:
@@ -208,25 +238,10 @@ class CallInliner(st.ast_manipulation.RecursiveAstTransformer[typed_ast3]):
         return inlined_statements
 
     def visit(self, node):
-        node = super().visit(node)
+        node = FusedTransformer([self]).visit(node)
         flatten_syntax[typed_ast3](node)
         return node
 
-    def generic_visit(self, node):
-        """Copied implementation from parent class - get rid of it at some point."""
-        if not self._fields_first:
-            _LOG.debug('visiting node %s', node)
-            node = self.visit_node(node)
-            if not hasattr(node, '_fields'):
-                return node
-        _LOG.debug('visiting all fields of node %s', node)
-        for name, value in typed_ast3.iter_fields(node):
-            setattr(node, name, self.generic_visit_field(node, name, value))
-        if self._fields_first:
-            _LOG.debug('visiting node %s', node)
-            node = self.visit_node(node)
-        return node
-
     def _is_target_for_inlining(self, call) -> bool:
         return isinstance(call, typed_ast3.Call) and isinstance(call.func, typed_ast3.Name) \
             and call.func.id == self._inlined_function.name
@@ -240,38 +255,43 @@ class CallInliner(st.ast_manipulation.RecursiveAstTransformer[typed_ast3]):
                 .format(len(self._inlined_args), self._inlined_args, len(call.args), call.args))
         return True
 
-    def visit_node(self, node):
-        # _LOG.warning('visiting %s', node)
-        if isinstance(node, typed_ast3.Return) and self._is_target_for_inlining(node.value):
+    def visit_Return(self, node):  # pylint: disable=invalid-name
+        if self._is_target_for_inlining(node.value):
             return self._inline_call_in_return(node)
-        if isinstance(node, (typed_ast3.Assign, typed_ast3.AnnAssign)) \
-                and self._is_target_for_inlining(node.value):
+        return node
+
+    def visit_Assign(self, node):  # pylint: disable=invalid-name
+        if self._is_target_for_inlining(node.value):
             if typed_ast3.Assign not in self._valid_inlining_contexts:
                 raise NotImplementedError('{} cannot be inlined inside {}'
                                           ' -- return supported only at the end of the function'
                                           .format(self._inlined_function.name, type(node)))
             return self._inline_call_in_assign(node)
-        if isinstance(node, typed_ast3.Expr) and self._is_target_for_inlining(node.value):
+        return node
+
+    visit_AnnAssign = visit_Assign
+
+    def visit_Expr(self, node):  # pylint: disable=invalid-name
+        if self._is_target_for_inlining(node.value):
             if typed_ast3.Expr not in self._valid_inlining_contexts:
                 raise NotImplementedError('{} cannot be inlined inside {}'
                                           ' -- returns not supported'
                                           .format(self._inlined_function.name, type(node)))
             return self._inline_call_in_expr(node)
+        return node
+
+    def visit_Call(self, node):  # pylint: disable=invalid-name
         if self._is_target_for_inlining(node):
             if t.Any not in self._valid_inlining_contexts:
                 raise NotImplementedError('{} cannot be inlined in arbitrary context'
                                           ' -- only one-liners are supported'
                                           .format(self._inlined_function.name))
             replacers = create_name_replacers(self._inlined_args, node.args)
-            replacers.append(Replacer(lambda return_: return_.value
-                                      if isinstance(return_, typed_ast3.Return) else return_))
+            replacers.append(Replacer(lambda return_: return_.value, typed_ast3.Return,
+                                      (typed_ast3.expr,)))
             return self._inline_call(node, replacers)
         return node
 
-    def visit_field(self, node, name: str, value: t.Any):
-        # _LOG.warning('visiting %s=%s in %s', name, value, node)
-        return value
-
 
 def inline_syntax(target: typed_ast3.FunctionDef, inlined_function: typed_ast3.FunctionDef,
                   globals_=None, *args, **kwargs) -> typed_ast3.FunctionDef:
@@ -285,13 +305,81 @@ def inline_syntax(target: typed_ast3.FunctionDef, inlined_function: typed_ast3.F
     return target
 
 
+class InliningTransformation(Transformation):
+
+    """Inline calls to selected functions in all other functions defined in the module.
+
+    Configuration:
+    inlined -- name or names of inlined functions
+    targets -- names of functions in which calls are inlined, by default all functions
+    verbose -- whether to surround inlined code with comments
+    """
+
+    def __init__(self, inlined: t.Union[str, t.Sequence[str]] = (),
+                 targets: t.Optional[t.Sequence[str]] = None, verbose: bool = True):
+        if isinstance(inlined, str):
+            inlined = (inlined,)
+        super().__init__(inlined=tuple(inlined),
+                         targets=None if targets is None else tuple(targets), verbose=verbose)
+
+    def apply(self, tree: typed_ast3.Module) -> typed_ast3.Module:
+        functions = {stmt.name: stmt for stmt in tree.body
+                     if isinstance(stmt, typed_ast3.FunctionDef)}
+        inlined_names = self.config['inlined']
+        target_names = self.config['targets']
+        inliners = []
+        for name in inlined_names:
+            if name not in functions:
+                raise KeyError('inlined function "{}" not found in the module'.format(name))
+            inlined_function = functions[name]
+            if not isinstance(inlined_function, st.nodes.StaticallyTypedFunctionDef[typed_ast3]):
+                inlined_function = st.augment(inlined_function)
+            inliners.append(CallInliner(inlined_function, verbose=self.config['verbose']))
+        transformer = FusedTransformer(inliners)
+        for i, stmt in enumerate(tree.body):
+            if not isinstance(stmt, typed_ast3.FunctionDef) or stmt.name in inlined_names \
+                    or target_names is not None and stmt.name not in target_names:
+                continue
+            if not any(isinstance(node, typed_ast3.Call) and isinstance(node.func, typed_ast3.Name)
+                       and node.func.id in inlined_names for node in typed_ast3.walk(stmt)):
+                continue
+            if not isinstance(stmt, st.nodes.StaticallyTypedFunctionDef[typed_ast3]):
+                stmt = st.augment(stmt)
+            stmt = transformer.visit(stmt)
+            flatten_syntax[typed_ast3](stmt)
+            tree.body[i] = stmt
+        return tree
+
+
+INLINED_FUNCTIONS_CACHE_SIZE = 64
+
+_INLINED_FUNCTIONS = collections.OrderedDict() \
+    # type: t.MutableMapping[tuple, t.Tuple[object, types.FunctionType, str]]
+
+_INLINED_FILENAMES = itertools.count()
+
+
 def inline(target_function, inlined_function, globals_=None) -> object:
     """Inline all calls to given inlined function within the target.
 
     Can be used as decorator.
+
+    Code of the resulting function is registered in linecache (under a pseudo-filename) instead
+    of being written to a file, so that it can be read by subsequent transpiler passes. Results
+    are memoized by the target, the inlined function and the identity of globals, and only
+    INLINED_FUNCTIONS_CACHE_SIZE most recently used results are kept. Code of evicted results
+    is removed from linecache.
     """
     assert isinstance(target_function, types.FunctionType)
     assert isinstance(inlined_function, types.FunctionType)
+    key = (target_function, inlined_function, id(globals_))
+    try:
+        cached_globals, target_inlined_function, _ = _INLINED_FUNCTIONS[key]
+        if cached_globals is globals_:
+            _INLINED_FUNCTIONS.move_to_end(key)
+            return target_inlined_function
+    except KeyError:
+        pass
     language = Language.find('Python 3')
     parser = Parser.find(language)()
     target_code = CodeReader.read_function(target_function)
@@ -302,19 +390,24 @@ def inline(target_function, inlined_function, globals_=None) -> object:
                                           verbose=False)
     target_inlined_code = horast.unparse(target_inlined_syntax).lstrip()
 
-    with tempfile.NamedTemporaryFile(suffix='.py', delete=False) as output_file:
-        # TODO: this leaves garbage behind in /tmp/ but is neeeded by subsequent transpiler passes
-        code_writer = CodeWriter('.py')
-        target_inlined_path = pathlib.Path(output_file.name)
-        code_writer.write_file(target_inlined_code, target_inlined_path)
-
-    code_obj = compile(target_inlined_code, filename=str(target_inlined_path), mode='exec')
-    if globals_ is None:
-        globals_ = {'__builtins__': globals()['__builtins__']}
+    filename = '<inlined {} {}>'.format(target_function.__qualname__, next(_INLINED_FILENAMES))
+    linecache.cache[filename] = (len(target_inlined_code), None,
+                                 target_inlined_code.splitlines(keepends=True), filename)
+    code_obj = compile(target_inlined_code, filename=filename, mode='exec')
+    eval_globals = globals_
+    if eval_globals is None:
+        eval_globals = {'__builtins__': globals()['__builtins__']}
     locals_ = {}
-    eval_result = eval(code_obj, globals_, locals_)
+    eval_result = eval(code_obj, eval_globals, locals_)
     assert eval_result is None, eval_result
     assert target_function.__name__ in locals_
     target_inlined_function = locals_[target_function.__name__]
     assert isinstance(target_inlined_function, types.FunctionType)
+    if key in _INLINED_FUNCTIONS:
+        linecache.cache.pop(_INLINED_FUNCTIONS[key][2], None)
+    _INLINED_FUNCTIONS[key] = (globals_, target_inlined_function, filename)
+    _INLINED_FUNCTIONS.move_to_end(key)
+    while len(_INLINED_FUNCTIONS) > INLINED_FUNCTIONS_CACHE_SIZE:
+        _, (_, _, evicted_filename) = _INLINED_FUNCTIONS.popitem(last=False)
+        linecache.cache.pop(evicted_filename, None)
     return target_inlined_function
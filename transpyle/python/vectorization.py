@@ -0,0 +1,374 @@
+"""Vectorization of loop nests in generalized AST into operations on NumPy array sections.
+
+A perfect nest of loops over range() is replaced by statements that operate on whole array
+sections if every statement of its body is one of:
+
+* assignment (possibly augmented) to an element of an array, in which all loop variables appear
+  in distinct dimensions of the subscript like "variable + offset", e.g. "a[i, j + 1] = ...";
+* assignment to a scalar which is private to an iteration and is not used outside of the nest,
+  which becomes an array;
+* if statement (with optional else) whose branches contain only assignments to array elements,
+  which becomes a mask and assignments that use np.where().
+
+Assigned expressions must be element-wise, i.e. loop variables may appear only in affine
+subscripts as above, as operands of arithmetic, comparison and logical operators, and as
+arguments of functions that have element-wise NumPy counterparts (like abs(), max() or
+math.sqrt()). Loop variables used directly become np.arange(), and array sections in which
+loop variables appear in a different order than in the assigned arrays are transposed.
+
+Vectorization is legal if the body can be distributed into one loop nest per statement, and if
+no statement reads an element that the same statement writes in an earlier iteration. Loops
+generated from Fortran forall construct (marked with "is_forall" Fortran metadata) have array
+assignment semantics already, so dependences are not checked for them, and their index variables
+are local to the construct.
+
+Indices are assumed not to wrap around, i.e. to be non-negative in all iterations.
+"""
+
+import collections
+import functools
+import itertools
+import logging
+import typing as t
+
+import horast.nodes as horast_nodes
+import typed_ast.ast3 as typed_ast3
+
+from ..pair import clone
+from .dependence import \
+    RangeLoop, ArrayAccess, perfect_loop_nest, forall_loop_nest, array_accesses, loop_scalars, \
+    is_fusion_legal
+from .loop_transformations import \
+    LoopNestTransformation, ReductionSubstitution, add_numpy_import, array_section, \
+    loop_only_names, loops_with_directives
+
+_LOG = logging.getLogger(__name__)
+
+NUMPY_UFUNCS = {
+    'abs', 'absolute', 'arccos', 'arcsin', 'arctan', 'arctan2', 'ceil', 'conj', 'cos', 'cosh',
+    'exp', 'floor', 'fmod', 'hypot', 'log', 'log10', 'logical_and', 'logical_not', 'logical_or',
+    'maximum', 'minimum', 'power', 'sign', 'sin', 'sinh', 'sqrt', 'tan', 'tanh', 'where'}
+
+MATH_TO_NUMPY = {
+    'acos': 'arccos', 'asin': 'arcsin', 'atan': 'arctan', 'atan2': 'arctan2', 'ceil': 'ceil',
+    'cos': 'cos', 'cosh': 'cosh', 'exp': 'exp', 'fabs': 'abs', 'floor': 'floor', 'fmod': 'fmod',
+    'hypot': 'hypot', 'log': 'log', 'log10': 'log10', 'sin': 'sin', 'sinh': 'sinh',
+    'sqrt': 'sqrt', 'tan': 'tan', 'tanh': 'tanh'}
+
+BUILTINS_TO_NUMPY = {'abs': 'abs', 'max': 'maximum', 'min': 'minimum', 'pow': 'power'}
+
+ELEMENT_WISE_OPERATORS = (
+    typed_ast3.Add, typed_ast3.Sub, typed_ast3.Mult, typed_ast3.Div, typed_ast3.FloorDiv,
+    typed_ast3.Mod, typed_ast3.Pow)
+
+ELEMENT_WISE_COMPARISONS = (
+    typed_ast3.Eq, typed_ast3.NotEq, typed_ast3.Lt, typed_ast3.LtE, typed_ast3.Gt, typed_ast3.GtE)
+
+
+def _names(node: typed_ast3.AST) -> t.Set[str]:
+    return {_.id for _ in typed_ast3.walk(node) if isinstance(_, typed_ast3.Name)}
+
+
+def _numpy_call(function: str, *args: typed_ast3.expr) -> typed_ast3.Call:
+    return typed_ast3.Call(func=typed_ast3.Attribute(
+        value=typed_ast3.Name(id='np', ctx=typed_ast3.Load()), attr=function,
+        ctx=typed_ast3.Load()), args=list(args), keywords=[])
+
+
+def _is_view(expression: typed_ast3.expr) -> bool:
+    """Check if vectorized expression can be a view of an existing array, rather than a new one."""
+    if isinstance(expression, typed_ast3.Subscript):
+        return True
+    function = getattr(expression, 'func', None)
+    return isinstance(function, typed_ast3.Attribute) and function.attr == 'transpose'
+
+
+def _numpy_function(function: typed_ast3.expr) -> t.Optional[str]:
+    """Get name of NumPy function that applies a given function element-wise, if there is one."""
+    if isinstance(function, typed_ast3.Name):
+        return BUILTINS_TO_NUMPY.get(function.id)
+    if not isinstance(function, typed_ast3.Attribute) \
+            or not isinstance(function.value, typed_ast3.Name):
+        return None
+    if function.value.id in ('np', 'numpy') and function.attr in NUMPY_UFUNCS:
+        return function.attr
+    if function.value.id == 'math':
+        return MATH_TO_NUMPY.get(function.attr)
+    return None
+
+
+def section_axes(subscript: typed_ast3.Subscript, variables: t.Iterable[str]) -> t.List[str]:
+    """List loop variables which appear in dimensions of a subscript, in order of dimensions."""
+    variables = set(variables)
+    index = subscript.slice.value
+    dims = index.elts if isinstance(index, typed_ast3.Tuple) else [index]
+    return [variable for dim in dims for variable in sorted(_names(dim) & variables)]
+
+
+def _assignment_target(statement: typed_ast3.stmt) -> t.Optional[typed_ast3.expr]:
+    if isinstance(statement, typed_ast3.Assign) and len(statement.targets) == 1:
+        return statement.targets[0]
+    if isinstance(statement, typed_ast3.AugAssign):
+        return statement.target
+    return None
+
+
+class LoopVectorization(LoopNestTransformation):
+
+    """Replace loop nests by element-wise operations on NumPy array sections in Python code.
+
+    Loops which reduce an array expression to a scalar are substituted first, as done by
+    ReductionSubstitution. Then, in each perfect nest of loops over range(), the whole nest is
+    vectorized if possible, or otherwise the loops nested in it are tried.
+
+    Loop nests whose variables are used outside of loops over them, and loops already preceded
+    by an OpenMP directive, are left as they are.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._names_counts = collections.Counter()  # type: t.Dict[str, int]
+        self._loop_only_names = set()  # type: t.Set[str]
+        self._marked_loops = set()  # type: t.Set[typed_ast3.For]
+        self._uses_numpy = False
+
+    def apply(self, tree: typed_ast3.AST) -> typed_ast3.AST:
+        tree = ReductionSubstitution().apply(tree)
+        self._names_counts = collections.Counter(
+            _.id for _ in typed_ast3.walk(tree) if isinstance(_, typed_ast3.Name))
+        self._loop_only_names = loop_only_names(tree)
+        self._marked_loops = loops_with_directives(tree)
+        self._uses_numpy = False
+        tree = super().apply(tree)
+        if self._uses_numpy:
+            add_numpy_import(tree)
+        return tree
+
+    def is_legal(self, loops: t.Sequence[RangeLoop]) -> bool:
+        """Check if statements in the body of a perfect loop nest can be executed one by one."""
+        variables = [_.variable for _ in loops]
+        body = loops[-1].node.body
+        is_forall = len(forall_loop_nest(loops[0].node)) == len(loops)
+        if not is_forall and any(_ not in self._loop_only_names for _ in variables):
+            return False
+        accesses = array_accesses(body, scalar_writes=True)
+        scalars = loop_scalars(body)
+        if accesses is None or scalars is None or scalars.reductions:
+            return False
+        names_counts = collections.Counter(
+            _.id for _ in typed_ast3.walk(loops[0].node) if isinstance(_, typed_ast3.Name))
+        if any(self._names_counts[_] != names_counts[_] for _ in scalars.private):
+            return False
+        written = {_.array for _ in accesses if _.is_write} | scalars.private
+        if any(_names(bound) & written for loop in loops for bound in (loop.start, loop.stop)):
+            return False
+        if is_forall:
+            return True
+        groups = []  # type: t.List[t.List[ArrayAccess]]
+        for statement in body:
+            if isinstance(statement, typed_ast3.If):
+                groups.append(array_accesses([typed_ast3.Expr(value=statement.test)]))
+                groups += [array_accesses([_], scalar_writes=True)
+                           for _ in statement.body + statement.orelse]
+            elif not isinstance(statement, horast_nodes.Comment):
+                groups.append(array_accesses([statement], scalar_writes=True))
+        for group in groups:
+            reads = [_ for _ in group if not _.is_write]
+            writes = [_ for _ in group if _.is_write]
+            if not is_fusion_legal(reads, writes, variables):
+                return False
+        return all(is_fusion_legal(list(itertools.chain.from_iterable(groups[:index])),
+                                   list(itertools.chain.from_iterable(groups[index:])),
+                                   variables)
+                   for index in range(1, len(groups)))
+
+    def transform_loop(self, loop: typed_ast3.For) -> t.Optional[t.List[typed_ast3.stmt]]:
+        if loop in self._marked_loops:
+            return [loop]
+        loops = perfect_loop_nest(loop)
+        if not loops or not self.is_legal(loops):
+            return None
+        statements = self._vectorized_body(loops)
+        if statements is None:
+            return None
+        _LOG.debug('vectorizing loops over %s', [_.variable for _ in loops])
+        self._uses_numpy = self._uses_numpy or any('np' in _names(_) for _ in statements)
+        return statements
+
+    def _vectorized_body(self, loops: t.Sequence[RangeLoop]
+                         ) -> t.Optional[t.List[typed_ast3.stmt]]:
+        body = loops[-1].node.body
+        variables = [_.variable for _ in loops]
+        targets = [_assignment_target(_) for statement in body
+                   for _ in ([statement] if not isinstance(statement, typed_ast3.If)
+                             else statement.body + statement.orelse)]
+        subscripts = [_ for _ in targets if isinstance(_, typed_ast3.Subscript)]
+        if not subscripts:
+            return None
+        axes = section_axes(subscripts[0], variables)
+        if sorted(axes) != sorted(variables) \
+                or any(section_axes(_, variables) != axes for _ in subscripts):
+            return None
+        temps = {_.id for _ in targets if isinstance(_, typed_ast3.Name)}
+        statements = []  # type: t.List[typed_ast3.stmt]
+        for statement in body:
+            if isinstance(statement, horast_nodes.Comment):
+                statements.append(clone(statement))
+                continue
+            if isinstance(statement, typed_ast3.Pass):
+                continue
+            if isinstance(statement, typed_ast3.If):
+                vectorized = self._masked_statements(statement, loops, axes, temps)
+            else:
+                vectorized = self._vectorized_statement(statement, loops, axes, temps)
+                vectorized = None if vectorized is None else [vectorized]
+            if vectorized is None:
+                return None
+            statements += vectorized
+        return statements
+
+    def _vectorized_statement(self, statement: typed_ast3.stmt, loops: t.Sequence[RangeLoop],
+                              axes: t.Sequence[str], temps: t.Set[str]
+                              ) -> t.Optional[typed_ast3.stmt]:
+        target = _assignment_target(statement)
+        if isinstance(target, typed_ast3.Name):
+            target = typed_ast3.Name(id=target.id, ctx=typed_ast3.Store())
+        elif isinstance(target, typed_ast3.Subscript) and not _names(target) & temps:
+            target = array_section(target, loops)
+        else:
+            return None
+        value = self._vectorized(statement.value, loops, axes, temps)
+        if target is None or value is None:
+            return None
+        if isinstance(target, typed_ast3.Name) and _is_view(value):
+            # temporary must not share memory with the array it was read from
+            value = _numpy_call('array', value)
+        target.ctx = typed_ast3.Store()
+        if isinstance(statement, typed_ast3.AugAssign):
+            return typed_ast3.AugAssign(target=target, op=type(statement.op)(), value=value)
+        return typed_ast3.Assign(targets=[target], value=value, type_comment=None)
+
+    def _masked_statements(self, statement: typed_ast3.If, loops: t.Sequence[RangeLoop],
+                           axes: t.Sequence[str], temps: t.Set[str]
+                           ) -> t.Optional[t.List[typed_ast3.stmt]]:
+        mask = self._vectorized(statement.test, loops, axes, temps)
+        if mask is None:
+            return None
+        mask_name = self.fresh_name('mask')
+        statements = [typed_ast3.Assign(
+            targets=[typed_ast3.Name(id=mask_name, ctx=typed_ast3.Store())], value=mask,
+            type_comment=None)]  # type: t.List[typed_ast3.stmt]
+        for branch, is_body in ((statement.body, True), (statement.orelse, False)):
+            for branch_statement in branch:
+                if isinstance(branch_statement, horast_nodes.Comment):
+                    statements.append(clone(branch_statement))
+                    continue
+                if isinstance(branch_statement, typed_ast3.Pass):
+                    continue
+                target = _assignment_target(branch_statement)
+                if not isinstance(target, typed_ast3.Subscript) or _names(target) & temps:
+                    return None
+                value = branch_statement.value
+                if isinstance(branch_statement, typed_ast3.AugAssign):
+                    value = typed_ast3.BinOp(left=clone(target), op=type(branch_statement.op)(),
+                                             right=value)
+                    value.left.ctx = typed_ast3.Load()
+                section = array_section(target, loops)
+                value = self._vectorized(value, loops, axes, temps)
+                if section is None or value is None:
+                    return None
+                mask = typed_ast3.Name(id=mask_name, ctx=typed_ast3.Load())
+                value = _numpy_call('where', mask, value, clone(section)) if is_body \
+                    else _numpy_call('where', mask, clone(section), value)
+                section.ctx = typed_ast3.Store()
+                statements.append(typed_ast3.Assign(targets=[section], value=value,
+                                                    type_comment=None))
+        return statements
+
+    def _vectorized(self, expression: typed_ast3.expr, loops: t.Sequence[RangeLoop],
+                    axes: t.Sequence[str], temps: t.Set[str]) -> t.Optional[typed_ast3.expr]:
+        """Create element-wise expression on array sections equivalent to the loop nest over it.
+
+        Dimensions of the result are aligned with given loop variables, so that it can be
+        broadcast to a section of an assigned array. Names of scalars in temps refer to
+        results of other vectorized expressions. Return None if the expression is not
+        element-wise.
+        """
+        loops_by_variable = {_.variable: _ for _ in loops}
+        names = _names(expression)
+        if not names & (set(loops_by_variable) | temps):
+            return clone(expression)
+        if isinstance(expression, typed_ast3.Name):
+            if expression.id in temps:
+                return clone(expression)
+            loop = loops_by_variable[expression.id]
+            args = [clone(loop.start), clone(loop.stop)]
+            if loop.step != 1:
+                args.append(typed_ast3.Num(n=loop.step))
+            return self._aligned(_numpy_call('arange', *args), [expression.id], axes)
+        if isinstance(expression, typed_ast3.Subscript):
+            if names & temps or _names(expression.value) & set(loops_by_variable):
+                return None
+            section = array_section(expression, loops)
+            if section is None:
+                return None
+            return self._aligned(section, section_axes(expression, loops_by_variable), axes)
+        vectorized = functools.partial(self._vectorized, loops=loops, axes=axes, temps=temps)
+        if isinstance(expression, typed_ast3.BinOp) \
+                and isinstance(expression.op, ELEMENT_WISE_OPERATORS):
+            left, right = vectorized(expression.left), vectorized(expression.right)
+            if left is None or right is None:
+                return None
+            return typed_ast3.BinOp(left=left, op=type(expression.op)(), right=right)
+        if isinstance(expression, typed_ast3.UnaryOp):
+            operand = vectorized(expression.operand)
+            if operand is None:
+                return None
+            if isinstance(expression.op, typed_ast3.Not):
+                return _numpy_call('logical_not', operand)
+            return typed_ast3.UnaryOp(op=type(expression.op)(), operand=operand)
+        if isinstance(expression, typed_ast3.Compare) and len(expression.ops) == 1 \
+                and isinstance(expression.ops[0], ELEMENT_WISE_COMPARISONS):
+            left, right = vectorized(expression.left), vectorized(expression.comparators[0])
+            if left is None or right is None:
+                return None
+            return typed_ast3.Compare(left=left, ops=[type(expression.ops[0])()],
+                                      comparators=[right])
+        if isinstance(expression, typed_ast3.BoolOp):
+            values = [vectorized(_) for _ in expression.values]
+            if any(_ is None for _ in values):
+                return None
+            function = 'logical_and' if isinstance(expression.op, typed_ast3.And) \
+                else 'logical_or'
+            return functools.reduce(functools.partial(_numpy_call, function), values)
+        if isinstance(expression, typed_ast3.IfExp):
+            args = [vectorized(_) for _ in (expression.test, expression.body, expression.orelse)]
+            return None if any(_ is None for _ in args) else _numpy_call('where', *args)
+        if isinstance(expression, typed_ast3.Call) and not expression.keywords:
+            function = _numpy_function(expression.func)
+            args = [vectorized(_) for _ in expression.args]
+            if function is None or any(_ is None for _ in args) \
+                    or function in ('maximum', 'minimum') and len(args) != 2:
+                return None
+            return _numpy_call(function, *args)
+        return None
+
+    @staticmethod
+    def _aligned(node: typed_ast3.expr, variables: t.Sequence[str],
+                 axes: t.Sequence[str]) -> typed_ast3.expr:
+        """Reorder and extend dimensions of an array so that it corresponds to given axes."""
+        order = sorted(variables, key=list(axes).index)
+        if order != list(variables):
+            permutation = [variables.index(_) for _ in order]
+            args = [node]
+            if permutation != list(reversed(range(len(variables)))):
+                args.append(typed_ast3.Tuple(elts=[typed_ast3.Num(n=_) for _ in permutation],
+                                             ctx=typed_ast3.Load()))
+            node = _numpy_call('transpose', *args)
+        if order == list(axes[len(axes) - len(order):]):
+            return node
+        dims = [typed_ast3.Slice(lower=None, upper=None, step=None) if _ in order
+                else typed_ast3.Index(value=typed_ast3.NameConstant(value=None))
+                for _ in axes[axes.index(order[0]):]]
+        return typed_ast3.Subscript(value=node, slice=typed_ast3.ExtSlice(dims=dims),
+                                    ctx=typed_ast3.Load())